@@ -0,0 +1,87 @@
+"""Microbenchmark of the realtime event serialization path.
+
+Publishes a synthetic response (transcript and audio deltas) through an `EventPubSub` and measures how many events per second a single session's sender can serialize, comparing the previous approach (re-validating every event and calling `model_dump_json`) with the fast path (`EventPubSub.encode`).
+"""
+
+import asyncio
+from collections.abc import Callable
+import logging
+import os
+import time
+
+from pydantic_settings import BaseSettings
+
+from speaches.realtime.pubsub import EventPubSub
+from speaches.types.realtime import (
+    SERVER_EVENT_TYPES,
+    Event,
+    ResponseAudioDeltaEvent,
+    ResponseAudioTranscriptDeltaEvent,
+    server_event_type_adapter,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Config(BaseSettings):
+    log_level: str = "info"
+    events: int = 50_000
+    """
+    Number of events published per run.
+    """
+    audio_delta_ms: int = 100
+    """
+    Duration of the audio carried by each `response.audio.delta` event.
+    """
+    transcript_deltas_per_audio_delta: int = 4
+    transports: int = 1
+    """
+    Number of transports (subscribers) sending every event, e.g. a WebSocket and an event recorder.
+    """
+
+
+def create_events(config: Config) -> list[Event]:
+    audio = os.urandom(24000 * 2 * config.audio_delta_ms // 1000)
+    events: list[Event] = []
+    while len(events) < config.events:
+        events.extend(
+            ResponseAudioTranscriptDeltaEvent(item_id="item_1", response_id="resp_1", delta="Hello ")
+            for _ in range(config.transcript_deltas_per_audio_delta)
+        )
+        events.append(ResponseAudioDeltaEvent.from_audio_bytes(audio, item_id="item_1", response_id="resp_1"))
+    return events[: config.events]
+
+
+def legacy_serialize(_pubsub: EventPubSub, event: Event) -> str:
+    return server_event_type_adapter.validate_python(event).model_dump_json()
+
+
+def fast_serialize(pubsub: EventPubSub, event: Event) -> str:
+    return pubsub.encode(event)
+
+
+async def run(config: Config, events: list[Event], serialize: Callable[[EventPubSub, Event], str]) -> float:
+    pubsub = EventPubSub()
+    subscriptions = [pubsub.subscribe(*SERVER_EVENT_TYPES) for _ in range(config.transports)]
+    start = time.perf_counter()
+    for event in events:
+        pubsub.publish_nowait(event)
+        for subscription in subscriptions:
+            serialize(pubsub, subscription.get_nowait())
+    return len(events) / (time.perf_counter() - start)
+
+
+async def main(config: Config) -> None:
+    events = create_events(config)
+    logger.info(f"Serializing {len(events)} events to {config.transports} transport(s)")
+    legacy_events_per_second = await run(config, events, legacy_serialize)
+    logger.info(f"validate_python + model_dump_json: {legacy_events_per_second:,.0f} events/sec")
+    fast_events_per_second = await run(config, events, fast_serialize)
+    logger.info(f"EventPubSub.encode: {fast_events_per_second:,.0f} events/sec")
+    logger.info(f"Speedup: {fast_events_per_second / legacy_events_per_second:.2f}x")
+
+
+if __name__ == "__main__":
+    config = Config()
+    logging.basicConfig(level=config.log_level.upper(), format="%(message)s")
+    asyncio.run(main(config))
@@ -0,0 +1,240 @@
+"""Replays recorded realtime sessions against `/v1/realtime` and reports per-turn latency distributions.
+
+Sessions are recorded by the server when `REALTIME__RECORDINGS_DIRECTORY` is set (see `speaches.realtime.recorder`). To take the LLM out of the measurements, this script serves a stub OpenAI compatible chat completion endpoint, which streams a canned reply with a fixed delay. Start the server pointed at it, e.g.:
+
+    CHAT_COMPLETION_BASE_URL=http://localhost:11435/v1 uvicorn --factory speaches.main:create_app
+
+and then run:
+
+    RECORDINGS='["recordings/sess_123.jsonl.gz"]' python scripts/realtime_replay.py
+
+Latencies are measured on the client, from when `input_audio_buffer.speech_stopped` (or `input_audio_buffer.committed`, if the buffer was committed by the client) was received. If the server sends `speaches.turn.timings` events (`REALTIME__TURN_TIMINGS_EVENT=true`), the server side timings are reported as well.
+"""
+
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncGenerator
+import gzip
+import json
+import logging
+from pathlib import Path
+import statistics
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic_settings import BaseSettings
+import uvicorn
+from websockets.asyncio.client import ClientConnection, connect
+
+logger = logging.getLogger(__name__)
+
+STUB_REPLY = "Sure! Here's a short answer to your question. Let me know if there's anything else I can help you with."
+
+
+class Config(BaseSettings):
+    log_level: str = "info"
+    recordings: list[Path] = []
+    """
+    Session recordings to replay. Each one is replayed over its own WebSocket connection, one after another.
+    """
+    speaches_ws_url: str = "ws://localhost:8000"
+    model: str | None = None
+    """
+    Model passed to `/v1/realtime`. Defaults to the one the session was recorded with.
+    """
+    speed: float = 1.0
+    """
+    Playback speed relative to the recording. For example, 2.0 replays the session twice as fast. 0 sends the events as fast as possible.
+    """
+    tail_timeout_seconds: float = 10.0
+    """
+    How long to keep waiting for pending responses after the last recorded event has been sent.
+    """
+    stub_llm: bool = True
+    """
+    Whether to serve the stub chat completion endpoint.
+    """
+    stub_llm_port: int = 11435
+    stub_llm_first_token_delay_ms: int = 200
+    stub_llm_token_delay_ms: int = 20
+
+
+def create_stub_llm_app(config: Config) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: dict[str, Any]) -> StreamingResponse:
+        async def generate() -> AsyncGenerator[str]:
+            await asyncio.sleep(config.stub_llm_first_token_delay_ms / 1000)
+            for i, token in enumerate(STUB_REPLY.split(" ")):
+                if i > 0:
+                    await asyncio.sleep(config.stub_llm_token_delay_ms / 1000)
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": f"{token} "}}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    return app
+
+
+def read_recording(file_path: Path) -> tuple[dict[str, Any], list[tuple[float, str]]]:
+    events: list[tuple[float, str]] = []
+    with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        try:
+            for line in f:
+                record = json.loads(line)
+                events.append((record["t"], json.dumps(record["event"])))
+        except EOFError:
+            # NOTE: the recording wasn't closed properly (e.g. the server was killed). Everything but the tail is still usable
+            logger.warning(f"Recording '{file_path}' is truncated")
+    return header, events
+
+
+class TurnLatencies:
+    """Collects the client observed timings of every turn of a session."""
+
+    def __init__(self) -> None:
+        self.turns: dict[str, dict[str, float]] = {}
+        self.response_turns: dict[str, str] = {}
+        self.server_timings: list[dict[str, float]] = []
+        self._turn_without_response: str | None = None
+
+    def on_event(self, event: dict[str, Any], received_at: float) -> None:  # noqa: C901
+        match event["type"]:
+            case "input_audio_buffer.speech_stopped":
+                self.turns[event["item_id"]] = {"start": received_at}
+            case "input_audio_buffer.committed":
+                turn = self.turns.setdefault(event["item_id"], {"start": received_at})
+                turn.setdefault("committed", received_at)
+                self._turn_without_response = event["item_id"]
+            case "conversation.item.input_audio_transcription.completed":
+                if event["item_id"] in self.turns:
+                    self.turns[event["item_id"]].setdefault("transcription_completed", received_at)
+            case "response.created":
+                if self._turn_without_response is not None:
+                    self.response_turns[event["response"]["id"]] = self._turn_without_response
+                    self.turns[self._turn_without_response].setdefault("response_created", received_at)
+                    self._turn_without_response = None
+            case "response.text.delta" | "response.audio_transcript.delta":
+                self._mark_response(event["response_id"], "first_text", received_at)
+            case "response.audio.delta":
+                self._mark_response(event["response_id"], "first_audio", received_at)
+            case "response.done":
+                self._mark_response(event["response"]["id"], "response_done", received_at)
+            case "speaches.turn.timings":
+                self.server_timings.append(event["timings_ms"])
+            case "error":
+                logger.warning(f"Received an error: {event['error']}")
+
+    def _mark_response(self, response_id: str, stage: str, received_at: float) -> None:
+        item_id = self.response_turns.get(response_id)
+        if item_id is not None:
+            self.turns[item_id].setdefault(stage, received_at)
+
+    @property
+    def pending_responses(self) -> int:
+        return sum(1 for item_id in self.response_turns.values() if "response_done" not in self.turns[item_id])
+
+
+async def receive_events(ws: ClientConnection, turn_latencies: TurnLatencies) -> None:
+    async for message in ws:
+        if isinstance(message, bytes):
+            continue
+        turn_latencies.on_event(json.loads(message), time.perf_counter())
+
+
+async def replay(config: Config, file_path: Path, turn_latencies: TurnLatencies) -> None:
+    header, events = read_recording(file_path)
+    model = config.model or header["model"]
+    logger.info(f"Replaying {len(events)} events of session '{header['session_id']}' with model '{model}'")
+    async with connect(f"{config.speaches_ws_url}/v1/realtime?model={model}", max_size=None) as ws:
+        receiver_task = asyncio.create_task(receive_events(ws, turn_latencies))
+        start = time.perf_counter()
+        for t, event in events:
+            if config.speed > 0:
+                delay = t / config.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await ws.send(event)
+        logger.info(f"Sent all of the events in {time.perf_counter() - start:.2f} seconds")
+
+        deadline = time.perf_counter() + config.tail_timeout_seconds
+        # NOTE: gives the server a moment to detect the end of the last turn
+        await asyncio.sleep(1)
+        while turn_latencies.pending_responses > 0 and time.perf_counter() < deadline:  # noqa: ASYNC110
+            await asyncio.sleep(0.1)
+        receiver_task.cancel()
+
+
+def log_distribution(name: str, values_ms: list[float]) -> None:
+    if len(values_ms) == 0:
+        return
+    values_ms = sorted(values_ms)
+    p50, p90, p99 = (
+        (statistics.quantiles(values_ms, n=100, method="inclusive")[q - 1] for q in (50, 90, 99))
+        if len(values_ms) > 1
+        else (values_ms[0],) * 3
+    )
+    logger.info(
+        f"{name:<32} n={len(values_ms):<4} min={values_ms[0]:>8.1f} p50={p50:>8.1f} p90={p90:>8.1f} p99={p99:>8.1f} max={values_ms[-1]:>8.1f}"
+    )
+
+
+def report(turn_latencies: TurnLatencies) -> None:
+    client_latencies: defaultdict[str, list[float]] = defaultdict(list)
+    for turn in turn_latencies.turns.values():
+        for stage, timestamp in turn.items():
+            if stage != "start":
+                client_latencies[stage].append((timestamp - turn["start"]) * 1000)
+    logger.info(f"Client observed latencies (ms, from the end of speech) across {len(turn_latencies.turns)} turns:")
+    for stage in ("committed", "transcription_completed", "response_created", "first_text", "first_audio"):
+        log_distribution(stage, client_latencies[stage])
+    log_distribution("response_done", client_latencies["response_done"])
+
+    if len(turn_latencies.server_timings) > 0:
+        server_latencies: defaultdict[str, list[float]] = defaultdict(list)
+        for timings in turn_latencies.server_timings:
+            for stage, latency_ms in timings.items():
+                server_latencies[stage].append(latency_ms)
+        logger.info(
+            f"Server side latencies (ms, from the start of the turn) across {len(turn_latencies.server_timings)} turns:"
+        )
+        for stage, latencies in server_latencies.items():
+            log_distribution(stage, latencies)
+
+
+async def main(config: Config) -> None:
+    stub_llm_server = None
+    stub_llm_task = None
+    if config.stub_llm:
+        stub_llm_server = uvicorn.Server(
+            uvicorn.Config(create_stub_llm_app(config), port=config.stub_llm_port, log_level="warning")
+        )
+        stub_llm_task = asyncio.create_task(stub_llm_server.serve())
+        logger.info(f"Serving the stub LLM at http://localhost:{config.stub_llm_port}/v1")
+
+    turn_latencies = TurnLatencies()
+    try:
+        for file_path in config.recordings:
+            await replay(config, file_path, turn_latencies)
+    finally:
+        if stub_llm_server is not None and stub_llm_task is not None:
+            stub_llm_server.should_exit = True
+            await stub_llm_task
+    report(turn_latencies)
+
+
+if __name__ == "__main__":
+    config = Config()
+    logging.basicConfig(level=config.log_level.upper(), format="%(message)s")
+    asyncio.run(main(config))
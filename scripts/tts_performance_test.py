@@ -35,6 +35,10 @@ class Config(BaseSettings):
     """
     Maximum number of concurrent requests made to the API.
     """
+    early_first_chunk_modes: list[bool] = [False, True]
+    """
+    Values of the `early_first_chunk` request field to run the performance test with. The time to the first audio of each is reported, so they can be compared.
+    """
 
 
 def limit_concurrency[**P, R](
@@ -74,11 +78,12 @@ async def main(config: Config) -> None:
         voice=config.voice_id,  # type: ignore  # noqa: PGH003
     )
 
-    async def create_speech() -> None:
+    async def create_speech(early_first_chunk: bool) -> dict[str, float]:
         async with oai_client.audio.speech.with_streaming_response.create(
             input=config.input_text,
             model=config.speech_model_id,
             voice=config.voice_id,  # type: ignore  # noqa: PGH003
+            extra_body={"early_first_chunk": early_first_chunk},
         ) as res:
             chunk_times: list[float] = []
             start = time.perf_counter()
@@ -93,16 +98,23 @@ async def main(config: Config) -> None:
                 "total_time": time.perf_counter() - start,
             }
             logger.debug(stats)
+            return stats
 
     create_speech_with_limited_concurrency = limit_concurrency(create_speech, config.concurrency)
 
-    start = time.perf_counter()
-
-    async with asyncio.TaskGroup() as tg:
-        tasks = [tg.create_task(create_speech_with_limited_concurrency()) for _ in range(config.iterations)]
-        start = time.perf_counter()
-        await asyncio.gather(*tasks)
-        logger.info(f"All tasks completed in {time.perf_counter() - start:.2f} seconds")
+    for early_first_chunk in config.early_first_chunk_modes:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(create_speech_with_limited_concurrency(early_first_chunk))
+                for _ in range(config.iterations)
+            ]
+            start = time.perf_counter()
+            all_stats = await asyncio.gather(*tasks)
+            logger.info(
+                f"early_first_chunk={early_first_chunk}: all tasks completed in {time.perf_counter() - start:.2f} seconds. "
+                f"Average time to first token: {sum(stats['time_to_first_token'] for stats in all_stats) / len(all_stats):.3f} seconds, "
+                f"average total time: {sum(stats['total_time'] for stats in all_stats) / len(all_stats):.3f} seconds"
+            )
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import io
 import logging
 from typing import TYPE_CHECKING, BinaryIO
@@ -10,12 +11,16 @@ import soundfile as sf
 from speaches.config import SAMPLES_PER_SECOND
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterable
+
     from numpy.typing import NDArray
 
     from speaches.routers.speech import ResponseFormat
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_WIDTH = 2  # 16-bit
+
 
 # aip 'Write a function `resample_audio` which would take in RAW PCM 16-bit signed, little-endian audio data represented as bytes (`audio_bytes`) and resample it (either downsample or upsample) from `sample_rate` to `target_sample_rate` using numpy'
 def resample_audio(audio_bytes: bytes, sample_rate: int, target_sample_rate: int) -> bytes:
@@ -51,6 +56,68 @@ def convert_audio_format(
     return converted_audio_bytes_buffer.getvalue()
 
 
+async def packetize_audio(  # noqa: C901
+    audio_stream: AsyncIterable[bytes],
+    *,
+    sample_rate: int,
+    packet_duration_ms: int,
+    max_hold_ms: int | None = None,
+) -> AsyncGenerator[bytes]:
+    """Re-chunk a stream of raw 16-bit mono PCM audio into packets of `packet_duration_ms` of audio.
+
+    Audio which doesn't fill a whole packet is held back waiting for more audio. Once it has been held for `max_hold_ms` (e.g. because the audio is produced slower than realtime), it's yielded as a smaller packet rather than stalling playback. The last packet may be smaller as well. An exception raised by `audio_stream` is re-raised once the audio preceding it has been yielded.
+    """
+    packet_size = sample_rate * packet_duration_ms // 1000 * SAMPLE_WIDTH
+    assert packet_size > 0, (sample_rate, packet_duration_ms)
+    loop = asyncio.get_running_loop()
+    # NOTE: the stream is read by a separate task, so that waiting for the next chunk can time out without interrupting the stream
+    chunks = asyncio.Queue[bytes | Exception | None]()
+
+    async def read_chunks() -> None:
+        try:
+            async for chunk in audio_stream:
+                chunks.put_nowait(chunk)
+        except Exception as e:  # noqa: BLE001
+            chunks.put_nowait(e)
+        else:
+            chunks.put_nowait(None)
+
+    reader_task = asyncio.create_task(read_chunks())
+    buffer = bytearray()
+    hold_deadline: float | None = None
+    try:
+        while True:
+            try:
+                timeout = None if hold_deadline is None else max(hold_deadline - loop.time(), 0)
+                chunk = await asyncio.wait_for(chunks.get(), timeout)
+            except TimeoutError:
+                # NOTE: a trailing partial sample is kept until the rest of it arrives
+                size = len(buffer) - len(buffer) % SAMPLE_WIDTH
+                if size > 0:
+                    yield bytes(buffer[:size])
+                    del buffer[:size]
+                hold_deadline = None
+                continue
+            if not isinstance(chunk, bytes):
+                if len(buffer) > 0:
+                    yield bytes(buffer)
+                if chunk is not None:
+                    raise chunk
+                return
+            buffer += chunk
+            packets_yielded = False
+            while len(buffer) >= packet_size:
+                yield bytes(buffer[:packet_size])
+                del buffer[:packet_size]
+                packets_yielded = True
+            if len(buffer) == 0 or max_hold_ms is None:
+                hold_deadline = None
+            elif hold_deadline is None or packets_yielded:
+                hold_deadline = loop.time() + max_hold_ms / 1000
+    finally:
+        reader_task.cancel()
+
+
 def audio_samples_from_file(file: BinaryIO) -> NDArray[np.float32]:
     audio_and_sample_rate = sf.read(
         file,
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Any, Literal
 
 from pydantic import BaseModel, Field, SecretStr
@@ -17,6 +18,8 @@ type Quantization = Literal[
     "int8", "int8_float16", "int8_bfloat16", "int8_float32", "int16", "float16", "bfloat16", "float32", "default"
 ]
 
+type OverflowPolicy = Literal["drop_oldest", "drop_newest", "block"]
+
 
 class WhisperConfig(BaseModel):
     """See https://github.com/SYSTRAN/faster-whisper/blob/master/faster_whisper/transcribe.py#L599."""
@@ -54,6 +57,67 @@ class OrtOptions(BaseModel):
     """
 
 
+class RealtimeConfig(BaseModel):
+    event_history_size: int = Field(default=0, ge=-1)
+    """
+    Number of the most recent events kept in memory for each realtime session. The history is only used for debugging (dumping the session's events to a file).
+    -1: Keep every event. WARN: memory usage will grow for the entire duration of the session.
+    0: Don't keep any events.
+    """
+    subscriber_queue_size: int = Field(default=1024, ge=0)
+    """
+    Maximum number of events that can be buffered for a single lossy subscriber (e.g. the session recorder). 0 means unbounded.
+    The subscribers delivering events to the client (the websocket and WebRTC transports) and the event dispatcher must not miss any events, so their queues are always unbounded.
+    """
+    subscriber_overflow_policy: OverflowPolicy = "drop_oldest"
+    """
+    What happens when a lossy subscriber's queue is full.
+    "drop_oldest": discard the oldest undelivered event.
+    "drop_newest": discard the event being published.
+    "block": make the publisher wait until there's room in the queue.
+    """
+    datachannel_deflate_min_size: int | None = Field(default=1024, ge=0)
+    """
+    Events sent over a WebRTC data channel using the binary transport that are at least this big (in bytes) are compressed with deflate. `None` disables the compression.
+    """
+    retained_input_audio_buffers: int = Field(default=0, ge=0)
+    """
+    Number of the most recently transcribed input audio buffers whose audio is kept in memory (e.g. for debugging). The audio of older buffers is freed once they have been transcribed.
+    """
+    max_session_memory_bytes: int | None = Field(default=None, ge=1)
+    """
+    Approximate limit on the memory held by a single session (input audio, event history and conversation items). The limit is checked periodically. When it's exceeded, the event history and the retained input audio are freed first, and if the session is still over the limit, it's closed with an error. `None` disables the limit.
+    """
+    session_idle_timeout_seconds: int | None = Field(default=600, ge=1)
+    """
+    Sessions that haven't received any client events (or audio) for this many seconds are closed. `None` disables the reaping of idle sessions.
+    """
+    max_chat_history_chars: int | None = Field(default=None, ge=1)
+    """
+    Maximum number of characters of conversation history (message text and function call arguments) sent to the LLM with each response. When exceeded, the oldest messages are left out. The most recent message is always sent. `None` sends the entire conversation.
+    """
+    recordings_directory: Path | None = None
+    """
+    If set, the client events (including the input audio) of every realtime session are recorded to `<recordings_directory>/<session_id>.jsonl.gz`. Recordings can be replayed with `scripts/realtime_replay.py`.
+    """
+    turn_timings_event: bool = False
+    """
+    Whether to send the custom `speaches.turn.timings` server event once a turn is done. The event contains the latency of each stage of the turn (speech stopped, committed, transcription, LLM first token, first TTS audio, first audio sent, response done). The latencies are recorded as metrics regardless of this setting.
+    """
+    audio_packet_duration_ms: int | None = Field(default=100, ge=1)
+    """
+    Duration of the audio in each `response.audio.delta` event (which also feed the audio track of WebRTC sessions). The synthesized audio is re-chunked to it, so that clients receive evenly sized deltas rather than one delta per piece of audio produced by the speech model. `None` sends the audio as it's synthesized.
+    """
+    audio_packet_max_hold_ms: int | None = Field(default=50, ge=0)
+    """
+    How long audio that doesn't fill a whole `response.audio.delta` event is held back waiting for more audio before it's sent as a smaller delta. `None` holds it until the audio is done.
+    """
+    early_first_chunk: bool = True
+    """
+    Whether a short leading fragment of the first sentence of a response is synthesized on its own (see the `early_first_chunk` field of `/v1/audio/speech`), so that the time to the first audio doesn't grow with the length of the first sentence.
+    """
+
+
 # TODO: document `alias` behaviour within the docstring
 class Config(BaseSettings):
     """Configuration for the application. Values can be set via environment variables.
@@ -111,5 +175,67 @@ class Config(BaseSettings):
     # TODO: document the below configuration options
     chat_completion_base_url: str = "http://localhost:11434/v1"
     chat_completion_api_key: SecretStr = SecretStr("cant-be-empty")
+    chat_completion_max_connections: int = Field(default=100, ge=1)
+    """
+    Maximum number of concurrent connections to the chat completion API. A single client (and connection pool) is shared by all of the chat completion requests and realtime sessions. Requests beyond this limit wait for a connection to free up (see the `speaches.upstream.connection.wait_duration` metric).
+    """
+    chat_completion_max_keepalive_connections: int = Field(default=20, ge=0)
+    """
+    Maximum number of idle connections to the chat completion API kept open for reuse, which saves the TCP and TLS handshakes of subsequent requests.
+    """
+    chat_completion_keepalive_expiry_seconds: float = Field(default=60.0, ge=0)
+    """
+    How long an idle connection to the chat completion API is kept open for.
+    """
+    chat_completion_http2: bool = False
+    """
+    Whether to use HTTP/2 (when the chat completion API supports it), which multiplexes concurrent requests over a single connection. Requires the `h2` package (`pip install httpx[http2]`).
+    """
+    chat_completion_timeout_seconds: float = Field(default=600.0, gt=0)
+    """
+    Timeout for reading from (and writing to) the chat completion API, as well as for acquiring a connection from the pool.
+    """
+    chat_completion_connect_timeout_seconds: float = Field(default=5.0, gt=0)
+    """
+    Timeout for establishing a connection to the chat completion API.
+    """
+    chat_transcript_store_path: Path | None = None
+    """
+    If set, the transcripts of the audio generated by `/v1/chat/completions` are stored in a SQLite database at this path instead of in memory. Follow-up requests reference the generated audio by its id, so the transcripts need to be shared when running multiple worker processes (e.g. `uvicorn --workers`).
+    """
+    chat_transcript_store_size: int = Field(default=4096, ge=1)
+    """
+    Maximum number of transcripts of generated audio that are kept. The oldest ones are evicted first.
+    """
+    chat_transcript_ttl_seconds: int = Field(default=60 * 60, ge=1)
+    """
+    How long the transcript of generated audio is kept for. This is also the `expires_at` of the audio returned to the client.
+    """
+    chat_transcription_concurrency: int = Field(default=4, ge=1)
+    """
+    Maximum number of `input_audio` content parts of a `/v1/chat/completions` request being transcribed at the same time. Transcripts are cached (keyed by the audio's hash and the transcription model), so audio parts of a replayed chat history are only transcribed once.
+    """
+    chat_speech_synthesis_concurrency: int = Field(default=2, ge=1)
+    """
+    Maximum number of sentences of an audio chat completion (`/v1/chat/completions` with the `audio` modality) being synthesized, or waiting to be sent, at the same time. Synthesis of upcoming sentences overlaps with the streaming of the current one.
+    """
+    chat_audio_packet_duration_ms: int | None = Field(default=100, ge=1)
+    """
+    Duration of the audio in each `delta.audio` chunk of a streamed audio chat completion. The synthesized audio is re-chunked to it, so that clients receive evenly sized chunks rather than one chunk per piece of audio produced by the speech model (which can be anything from a few milliseconds to a whole sentence). `None` sends the audio as it's synthesized.
+    """
+    chat_audio_packet_max_hold_ms: int | None = Field(default=50, ge=0)
+    """
+    How long audio that doesn't fill a whole `delta.audio` chunk is held back waiting for more audio before it's sent as a smaller chunk. `None` holds it until the audio is done.
+    """
+    chat_early_first_chunk: bool = True
+    """
+    Whether a short leading fragment of the first sentence of an audio chat completion is synthesized on its own (see the `early_first_chunk` field of `/v1/audio/speech`), so that the time to the first audio doesn't grow with the length of the first sentence.
+    """
+    speech_stream_synthesis_concurrency: int = Field(default=2, ge=1)
+    """
+    Maximum number of text chunks of a streaming speech session (`/v1/audio/speech/stream`) being synthesized, or waiting to be sent, at the same time.
+    """
 
     unstable_ort_opts: OrtOptions = OrtOptions()
+
+    realtime: RealtimeConfig = RealtimeConfig()
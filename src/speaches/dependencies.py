@@ -23,6 +23,15 @@ from speaches.config import Config
 from speaches.executors.kokoro.model_manager import KokoroModelManager
 from speaches.executors.piper.model_manager import PiperModelManager
 from speaches.executors.whisper.model_manager import WhisperModelManager
+from speaches.realtime.session_registry import SessionRegistry
+from speaches.services.speech import HttpSpeechService, LocalSpeechService, SpeechService
+from speaches.services.transcription import (
+    HttpTranscriptionService,
+    LocalTranscriptionService,
+    TranscriptionService,
+)
+from speaches.transcript_store import InMemoryTranscriptStore, SqliteTranscriptStore, TranscriptStore
+from speaches.upstream import create_upstream_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -109,14 +118,22 @@ AudioFileDependency = Annotated[NDArray[float32], Depends(audio_file_dependency)
 
 
 @lru_cache
-def get_completion_client() -> AsyncCompletions:
+def get_upstream_client() -> AsyncOpenAI:
+    """The client for the chat completion API. It's shared by the whole application so that its connection pool is too."""
     config = get_config()
-    oai_client = AsyncOpenAI(
+    http_client = create_upstream_http_client(config)
+    return AsyncOpenAI(
         base_url=config.chat_completion_base_url,
         api_key=config.chat_completion_api_key.get_secret_value(),
         max_retries=0,
+        timeout=http_client.timeout,
+        http_client=http_client,
     )
-    return oai_client.chat.completions
+
+
+@lru_cache
+def get_completion_client() -> AsyncCompletions:
+    return get_upstream_client().chat.completions
 
 
 CompletionClientDependency = Annotated[AsyncCompletions, Depends(get_completion_client)]
@@ -178,3 +195,51 @@ def get_transcription_client() -> AsyncTranscriptions:
 
 
 TranscriptionClientDependency = Annotated[AsyncTranscriptions, Depends(get_transcription_client)]
+
+
+@lru_cache
+def get_transcription_service() -> TranscriptionService:
+    config = get_config()
+    if config.loopback_host_url is None:
+        return LocalTranscriptionService(
+            get_model_manager(),
+            config.whisper,
+            vad_filter=config._unstable_vad_filter,  # noqa: SLF001
+        )
+    return HttpTranscriptionService(get_transcription_client())
+
+
+TranscriptionServiceDependency = Annotated[TranscriptionService, Depends(get_transcription_service)]
+
+
+@lru_cache
+def get_speech_service() -> SpeechService:
+    config = get_config()
+    if config.loopback_host_url is None:
+        return LocalSpeechService(get_kokoro_model_manager(), get_piper_model_manager())
+    return HttpSpeechService(get_speech_client())
+
+
+SpeechServiceDependency = Annotated[SpeechService, Depends(get_speech_service)]
+
+
+@lru_cache
+def get_session_registry() -> SessionRegistry:
+    config = get_config()
+    return SessionRegistry(config.realtime)
+
+
+SessionRegistryDependency = Annotated[SessionRegistry, Depends(get_session_registry)]
+
+
+@lru_cache
+def get_transcript_store() -> TranscriptStore:
+    config = get_config()
+    if config.chat_transcript_store_path is None:
+        return InMemoryTranscriptStore(config.chat_transcript_store_size, config.chat_transcript_ttl_seconds)
+    return SqliteTranscriptStore(
+        config.chat_transcript_store_path, config.chat_transcript_store_size, config.chat_transcript_ttl_seconds
+    )
+
+
+TranscriptStoreDependency = Annotated[TranscriptStore, Depends(get_transcript_store)]
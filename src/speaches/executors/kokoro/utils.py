@@ -1,3 +1,4 @@
+import asyncio
 from collections.abc import AsyncGenerator, Generator
 import logging
 from pathlib import Path
@@ -6,6 +7,7 @@ from typing import Literal
 
 import huggingface_hub
 from kokoro_onnx import Kokoro
+from kokoro_onnx.trim import trim as trim_audio
 import numpy as np
 from pydantic import BaseModel, computed_field
 
@@ -222,7 +224,13 @@ async def generate_audio(
     start = time.perf_counter()
     try:
         # 直接调用，不指定语言参数（因为 espeak 不支持我们的语言代码）
-        async for audio_data, _ in kokoro_tts.create_stream(text, voice, speed=speed):
+        phonemes = kokoro_tts.tokenizer.phonemize(text, "en-us")
+        voice_style = kokoro_tts.get_voice_style(voice)
+        # NOTE: `Kokoro.create_stream` isn't used as it synthesizes all of the batches in a background task that keeps running after the consumer has stopped iterating (e.g. when a realtime response gets cancelled). Synthesizing one batch at a time means that the compute stops at the next batch boundary instead.
+        for batch in kokoro_tts._split_phonemes(phonemes):  # noqa: SLF001
+            audio_data, _ = await asyncio.to_thread(kokoro_tts._create_audio, batch, voice_style, speed)  # noqa: SLF001
+            # trim leading and trailing silence for a more natural sound concatenation
+            audio_data, _ = trim_audio(audio_data)
             assert isinstance(audio_data, np.ndarray) and audio_data.dtype == np.float32 and isinstance(sample_rate, int)
             normalized_audio_data = (audio_data * np.iinfo(np.int16).max).astype(np.int16)
             audio_bytes = normalized_audio_data.tobytes()
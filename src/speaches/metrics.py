@@ -0,0 +1,216 @@
+"""Application metrics.
+
+Every instrument keeps an in-process aggregate (see `snapshot`), which is served by `GET /api/metrics`. When the `opentelemetry` extra is installed, the measurements are additionally recorded through the OpenTelemetry metrics API, so that they get exported when the server is run with `opentelemetry-instrument`. Without a configured meter provider the OpenTelemetry instruments are no-ops.
+
+Instruments are meant to be recorded to from the event loop thread.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+import math
+from typing import Any
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+METER_NAME = "speaches"
+# NOTE: tuned for latencies in milliseconds
+DEFAULT_HISTOGRAM_BOUNDARIES = (
+    5.0,
+    10.0,
+    25.0,
+    50.0,
+    75.0,
+    100.0,
+    150.0,
+    200.0,
+    300.0,
+    500.0,
+    750.0,
+    1000.0,
+    1500.0,
+    2000.0,
+    3000.0,
+    5000.0,
+    10000.0,
+)
+
+type Attributes = Mapping[str, str]
+type AttributesKey = tuple[tuple[str, str], ...]
+
+
+def _attributes_key(attributes: Attributes | None) -> AttributesKey:
+    return tuple(sorted(attributes.items())) if attributes else ()
+
+
+def _attributes_label(key: AttributesKey) -> str:
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+class Counter:
+    def __init__(self, name: str, *, unit: str = "1", description: str = "") -> None:
+        self.name = name
+        self.unit = unit
+        self.description = description
+        self._values: defaultdict[AttributesKey, float] = defaultdict(float)
+        self._otel_counter = (
+            otel_metrics.get_meter(METER_NAME).create_counter(name, unit=unit, description=description)
+            if otel_metrics is not None
+            else None
+        )
+
+    def add(self, amount: float = 1, attributes: Attributes | None = None) -> None:
+        self._values[_attributes_key(attributes)] += amount
+        if self._otel_counter is not None:
+            self._otel_counter.add(amount, attributes)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": "counter",
+            "unit": self.unit,
+            "values": {_attributes_label(key): value for key, value in self._values.items()},
+        }
+
+
+class UpDownCounter:
+    """A counter that can also be decremented, e.g. to track the number of requests in progress."""
+
+    def __init__(self, name: str, *, unit: str = "1", description: str = "") -> None:
+        self.name = name
+        self.unit = unit
+        self.description = description
+        self._values: defaultdict[AttributesKey, float] = defaultdict(float)
+        self._otel_counter = (
+            otel_metrics.get_meter(METER_NAME).create_up_down_counter(name, unit=unit, description=description)
+            if otel_metrics is not None
+            else None
+        )
+
+    def add(self, amount: float, attributes: Attributes | None = None) -> None:
+        self._values[_attributes_key(attributes)] += amount
+        if self._otel_counter is not None:
+            self._otel_counter.add(amount, attributes)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": "up_down_counter",
+            "unit": self.unit,
+            "values": {_attributes_label(key): value for key, value in self._values.items()},
+        }
+
+
+class _HistogramAggregate:
+    def __init__(self, boundaries: tuple[float, ...]) -> None:
+        self.bucket_counts = [0] * (len(boundaries) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        *,
+        unit: str = "ms",
+        description: str = "",
+        boundaries: tuple[float, ...] = DEFAULT_HISTOGRAM_BOUNDARIES,
+    ) -> None:
+        self.name = name
+        self.unit = unit
+        self.description = description
+        self.boundaries = boundaries
+        self._aggregates: dict[AttributesKey, _HistogramAggregate] = {}
+        self._otel_histogram = (
+            otel_metrics.get_meter(METER_NAME).create_histogram(name, unit=unit, description=description)
+            if otel_metrics is not None
+            else None
+        )
+
+    def record(self, value: float, attributes: Attributes | None = None) -> None:
+        key = _attributes_key(attributes)
+        aggregate = self._aggregates.get(key)
+        if aggregate is None:
+            aggregate = self._aggregates[key] = _HistogramAggregate(self.boundaries)
+        aggregate.bucket_counts[bisect_left(self.boundaries, value)] += 1
+        aggregate.count += 1
+        aggregate.sum += value
+        aggregate.min = min(aggregate.min, value)
+        aggregate.max = max(aggregate.max, value)
+        if self._otel_histogram is not None:
+            self._otel_histogram.record(value, attributes)
+
+    def _quantile(self, aggregate: _HistogramAggregate, q: float) -> float:
+        """Estimate the quantile by linearly interpolating within the bucket it falls into."""
+        rank = q * aggregate.count
+        cumulative_count = 0
+        for i, bucket_count in enumerate(aggregate.bucket_counts):
+            if bucket_count == 0:
+                continue
+            if cumulative_count + bucket_count >= rank:
+                lower = self.boundaries[i - 1] if i > 0 else aggregate.min
+                upper = self.boundaries[i] if i < len(self.boundaries) else aggregate.max
+                lower, upper = max(lower, aggregate.min), min(upper, aggregate.max)
+                return lower + (upper - lower) * (rank - cumulative_count) / bucket_count
+            cumulative_count += bucket_count
+        return aggregate.max
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": "histogram",
+            "unit": self.unit,
+            "values": {
+                _attributes_label(key): {
+                    "count": aggregate.count,
+                    "sum": aggregate.sum,
+                    "min": aggregate.min,
+                    "max": aggregate.max,
+                    "p50": self._quantile(aggregate, 0.5),
+                    "p90": self._quantile(aggregate, 0.9),
+                    "p99": self._quantile(aggregate, 0.99),
+                }
+                for key, aggregate in self._aggregates.items()
+            },
+        }
+
+
+_instruments: dict[str, Counter | UpDownCounter | Histogram] = {}
+
+
+def counter(name: str, *, unit: str = "1", description: str = "") -> Counter:
+    """Get the counter with the given name, creating it if it doesn't exist yet."""
+    instrument = _instruments.get(name)
+    if instrument is None:
+        instrument = _instruments[name] = Counter(name, unit=unit, description=description)
+    assert isinstance(instrument, Counter), instrument
+    return instrument
+
+
+def up_down_counter(name: str, *, unit: str = "1", description: str = "") -> UpDownCounter:
+    """Get the up-down counter with the given name, creating it if it doesn't exist yet."""
+    instrument = _instruments.get(name)
+    if instrument is None:
+        instrument = _instruments[name] = UpDownCounter(name, unit=unit, description=description)
+    assert isinstance(instrument, UpDownCounter), instrument
+    return instrument
+
+
+def histogram(
+    name: str, *, unit: str = "ms", description: str = "", boundaries: tuple[float, ...] = DEFAULT_HISTOGRAM_BOUNDARIES
+) -> Histogram:
+    """Get the histogram with the given name, creating it if it doesn't exist yet."""
+    instrument = _instruments.get(name)
+    if instrument is None:
+        instrument = _instruments[name] = Histogram(name, unit=unit, description=description, boundaries=boundaries)
+    assert isinstance(instrument, Histogram), instrument
+    return instrument
+
+
+def snapshot() -> dict[str, dict[str, Any]]:
+    """The current values of all of the instruments that have been recorded to at least once."""
+    instrument_snapshots = {name: instrument.snapshot() for name, instrument in sorted(_instruments.items())}
+    return {name: value for name, value in instrument_snapshots.items() if len(value["values"]) > 0}
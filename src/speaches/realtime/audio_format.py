@@ -0,0 +1,87 @@
+"""Conversion between the realtime API's audio formats and PCM16.
+
+G.711 μ-law and A-law are converted with lookup tables (256 entries for decoding, 65536 for encoding), so each conversion is a single vectorized `numpy` indexing operation. The tables follow the reference implementation of the ITU-T G.711 codec.
+"""
+
+import numpy as np
+from numpy.typing import NDArray
+
+from speaches.types.realtime import AudioFormat, PcmSampleRate
+
+# NOTE: G.711 audio is always 8kHz
+G711_SAMPLE_RATE = 8000
+
+
+def _create_ulaw_decoding_table() -> NDArray[np.int16]:
+    ulaw = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = (((ulaw & 0x0F) << 3) + 0x84) << ((ulaw & 0x70) >> 4)
+    return np.where(ulaw & 0x80, 0x84 - magnitude, magnitude - 0x84).astype(np.int16)
+
+
+def _create_alaw_decoding_table() -> NDArray[np.int16]:
+    alaw = np.arange(256, dtype=np.int32) ^ 0x55
+    segment = (alaw & 0x70) >> 4
+    magnitude = (alaw & 0x0F) << 4
+    magnitude = np.where(segment == 0, magnitude + 8, (magnitude + 0x108) << np.maximum(segment - 1, 0))
+    return np.where(alaw & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+def _create_ulaw_encoding_table() -> NDArray[np.uint8]:
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + (0x84 >> 2)
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), magnitude)
+    ulaw = np.where(segment >= 8, 0x7F, (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F))
+    return (ulaw ^ mask).astype(np.uint8)
+
+
+def _create_alaw_encoding_table() -> NDArray[np.uint8]:
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    magnitude = np.where(pcm >= 0, pcm, -pcm - 1)
+    segment = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), magnitude)
+    alaw = np.where(
+        segment >= 8,
+        0x7F,
+        (segment << 4) | (np.where(segment < 2, magnitude >> 1, magnitude >> np.maximum(segment, 1)) & 0x0F),
+    )
+    return (alaw ^ mask).astype(np.uint8)
+
+
+ULAW_DECODING_TABLE = _create_ulaw_decoding_table()
+ALAW_DECODING_TABLE = _create_alaw_decoding_table()
+# NOTE: indexed by the PCM16 sample offset by 32768 (i.e. the sample reinterpreted as `uint16` with the sign bit flipped)
+ULAW_ENCODING_TABLE = _create_ulaw_encoding_table()
+ALAW_ENCODING_TABLE = _create_alaw_encoding_table()
+
+
+def audio_format_sample_rate(audio_format: AudioFormat, pcm16_sample_rate: PcmSampleRate) -> int:
+    """Sample rate of audio in the given format. `pcm16_sample_rate` only applies to `pcm16`."""
+    return pcm16_sample_rate if audio_format == "pcm16" else G711_SAMPLE_RATE
+
+
+def audio_format_sample_width(audio_format: AudioFormat) -> int:
+    """Number of bytes per sample of audio in the given format."""
+    return 2 if audio_format == "pcm16" else 1
+
+
+def decode_audio(audio_bytes: bytes | memoryview, audio_format: AudioFormat) -> NDArray[np.int16]:
+    """Decode audio in the given format into PCM16 samples. `pcm16` audio isn't copied."""
+    match audio_format:
+        case "pcm16":
+            return np.frombuffer(audio_bytes, dtype=np.int16)
+        case "g711_ulaw":
+            return ULAW_DECODING_TABLE[np.frombuffer(audio_bytes, dtype=np.uint8)]
+        case "g711_alaw":
+            return ALAW_DECODING_TABLE[np.frombuffer(audio_bytes, dtype=np.uint8)]
+
+
+def encode_audio(pcm16_audio: bytes, audio_format: AudioFormat) -> bytes:
+    """Encode PCM16 audio into the given format."""
+    match audio_format:
+        case "pcm16":
+            return pcm16_audio
+        case "g711_ulaw":
+            return ULAW_ENCODING_TABLE[np.frombuffer(pcm16_audio, dtype=np.uint16) ^ 0x8000].tobytes()
+        case "g711_alaw":
+            return ALAW_ENCODING_TABLE[np.frombuffer(pcm16_audio, dtype=np.uint16) ^ 0x8000].tobytes()
@@ -0,0 +1,66 @@
+"""Binary WebSocket frames carrying raw audio. Enabled by connecting to `/v1/realtime` with `binary_audio=true`.
+
+Audio is sent as raw bytes in the session's input/output audio format (e.g. 16-bit little-endian mono PCM at 24kHz for the default `pcm16` format) instead of base64 encoded audio inside of JSON events. Every frame has the following layout:
+
+    | kind (u8) | id length (u8) | id (ascii) | ... | audio |
+
+- `INPUT_AUDIO_BUFFER_APPEND` (client -> server): one id, the `event_id` (may be empty). Equivalent to `input_audio_buffer.append`.
+- `RESPONSE_AUDIO_DELTA` (server -> client): two ids, the `response_id` followed by the `item_id`. Equivalent to `response.audio.delta`.
+
+All the other events are still sent as JSON text frames.
+"""
+
+from speaches.types.realtime import InputAudioBufferAppendEvent, ResponseAudioDeltaEvent
+
+INPUT_AUDIO_BUFFER_APPEND = 0x01
+RESPONSE_AUDIO_DELTA = 0x02
+
+MAX_ID_LENGTH = 255
+
+
+def _encode_id(id_: str) -> bytes:
+    encoded = id_.encode("ascii")
+    if len(encoded) > MAX_ID_LENGTH:
+        raise ValueError(f"Id '{id_}' is longer than {MAX_ID_LENGTH} bytes")
+    return bytes((len(encoded),)) + encoded
+
+
+def _decode_id(data: memoryview, offset: int) -> tuple[str, int]:
+    if offset >= len(data):
+        msg = "Truncated binary frame header"
+        raise ValueError(msg)
+    length = data[offset]
+    start = offset + 1
+    if start + length > len(data):
+        msg = "Truncated binary frame header"
+        raise ValueError(msg)
+    return bytes(data[start : start + length]).decode("ascii"), start + length
+
+
+def encode_input_audio_buffer_append_frame(audio: bytes, event_id: str = "") -> bytes:
+    return bytes((INPUT_AUDIO_BUFFER_APPEND,)) + _encode_id(event_id) + audio
+
+
+def decode_input_audio_buffer_append_frame(data: bytes) -> InputAudioBufferAppendEvent:
+    """Parse a client binary frame. The returned event references the audio in `data` without copying it."""
+    view = memoryview(data)
+    if len(view) == 0 or view[0] != INPUT_AUDIO_BUFFER_APPEND:
+        raise ValueError(f"Unsupported binary frame kind. Expected {INPUT_AUDIO_BUFFER_APPEND}")
+    event_id, offset = _decode_id(view, 1)
+    # NOTE: the audio's length is validated against the session's `input_audio_format` by the `input_audio_buffer.append` handler
+    return InputAudioBufferAppendEvent.from_audio_bytes(view[offset:], event_id=event_id or None)
+
+
+def encode_response_audio_delta_frame(event: ResponseAudioDeltaEvent) -> bytes:
+    return (
+        bytes((RESPONSE_AUDIO_DELTA,)) + _encode_id(event.response_id) + _encode_id(event.item_id) + event.audio_bytes
+    )
+
+
+def decode_response_audio_delta_frame(data: bytes) -> ResponseAudioDeltaEvent:
+    view = memoryview(data)
+    if len(view) == 0 or view[0] != RESPONSE_AUDIO_DELTA:
+        raise ValueError(f"Unsupported binary frame kind. Expected {RESPONSE_AUDIO_DELTA}")
+    response_id, offset = _decode_id(view, 1)
+    item_id, offset = _decode_id(view, offset)
+    return ResponseAudioDeltaEvent.from_audio_bytes(bytes(view[offset:]), item_id=item_id, response_id=response_id)
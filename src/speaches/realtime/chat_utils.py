@@ -2,7 +2,6 @@ import logging
 
 from openai.types.chat import (
     ChatCompletionAssistantMessageParam,
-    ChatCompletionAudioParam,
     ChatCompletionMessageParam,
     ChatCompletionMessageToolCallParam,
     ChatCompletionStreamOptionsParam,
@@ -25,8 +24,6 @@ logger = logging.getLogger(__name__)
 def create_completion_params(
     model_id: str, messages: list[ChatCompletionMessageParam], response: Response
 ) -> CompletionCreateParamsStreaming:
-    assert response.output_audio_format == "pcm16"  # HACK
-
     max_tokens = None if response.max_response_output_tokens == "inf" else response.max_response_output_tokens
     kwargs = {}
     if len(response.tools) > 0:
@@ -55,11 +52,7 @@ def create_completion_params(
             *messages,
         ],
         stream=True,
-        modalities=response.modalities,
-        audio=ChatCompletionAudioParam(
-            voice=response.voice,  # pyright: ignore[reportArgumentType]
-            format=response.output_audio_format,
-        ),
+        # NOTE: `modalities` and `audio` aren't set as the upstream model only generates text. The audio is synthesized locally.
         temperature=response.temperature,
         max_tokens=max_tokens,
         stream_options=ChatCompletionStreamOptionsParam(include_usage=True),
@@ -67,7 +60,7 @@ def create_completion_params(
     )
 
 
-def conversation_item_to_chat_message(  # noqa: PLR0911
+def conversation_item_to_chat_message(  # noqa: C901, PLR0911
     item: ConversationItem,
 ) -> ChatCompletionMessageParam | None:
     match item.type:
@@ -94,7 +87,11 @@ def conversation_item_to_chat_message(  # noqa: PLR0911
                         return None
                     return ChatCompletionUserMessageParam(role="user", content=content.transcript)
         case "function_call":
-            assert item.call_id and item.name and item.arguments and item.status == "completed", item
+            if item.status != "completed":
+                # NOTE: e.g. the response generating the function call was cancelled
+                logger.warning(f"Item {item} is not completed. Skipping.")
+                return None
+            assert item.call_id and item.name and item.arguments, item
             return ChatCompletionAssistantMessageParam(
                 role="assistant",
                 tool_calls=[
@@ -117,9 +114,34 @@ def conversation_item_to_chat_message(  # noqa: PLR0911
             )
 
 
-def items_to_chat_messages(items: list[ConversationItem]) -> list[ChatCompletionMessageParam]:
-    return [
-        chat_message
-        for chat_message in (conversation_item_to_chat_message(item) for item in items)
-        if chat_message is not None
-    ]
+def chat_message_size(message: ChatCompletionMessageParam) -> int:
+    """Number of characters of the message's text content and tool call arguments."""
+    size = 0
+    content = message.get("content")
+    if isinstance(content, str):
+        size += len(content)
+    if message["role"] == "assistant":
+        for tool_call in message.get("tool_calls", []):
+            if tool_call["type"] == "function":
+                size += len(tool_call["function"]["name"]) + len(tool_call["function"]["arguments"])
+    return size
+
+
+def truncate_chat_messages(
+    messages: list[ChatCompletionMessageParam], sizes: list[int], max_chars: int
+) -> list[ChatCompletionMessageParam]:
+    """Drop the oldest messages until the total size of the rest is within `max_chars`. The most recent message is always kept."""
+    assert len(messages) == len(sizes)
+    if len(messages) == 0:
+        return messages
+    start = len(messages) - 1
+    total_size = sizes[start]
+    while start > 0 and total_size + sizes[start - 1] <= max_chars:
+        start -= 1
+        total_size += sizes[start]
+    # NOTE: a tool message can't be sent without the assistant message containing its tool call
+    while start < len(messages) - 1 and messages[start]["role"] == "tool":
+        start += 1
+    if start > 0:
+        logger.debug(f"Truncated {start} of the {len(messages)} chat messages to fit in {max_chars} characters")
+    return messages[start:]
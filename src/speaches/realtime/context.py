@@ -1,33 +1,66 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
+import time
 from typing import TYPE_CHECKING
 
-from openai.resources.audio import AsyncTranscriptions
 from openai.resources.chat.completions import AsyncCompletions
 
+from speaches.config import RealtimeConfig
 from speaches.realtime.conversation_event_router import Conversation
 from speaches.realtime.input_audio_buffer import InputAudioBuffer
 from speaches.realtime.pubsub import EventPubSub
+from speaches.realtime.session_registry import Transport
+from speaches.realtime.turn_timings import TurnTracker
+from speaches.services.speech import SpeechService
+from speaches.services.transcription import TranscriptionService
 from speaches.types.realtime import Session
 
 if TYPE_CHECKING:
+    from speaches.realtime.recorder import SessionRecorder
     from speaches.realtime.response_event_router import ResponseHandler
+    from speaches.realtime.speculation import SpeculativeTurn
 
 
 class SessionContext:
     def __init__(
         self,
-        transcription_client: AsyncTranscriptions,
+        transcription_service: TranscriptionService,
         completion_client: AsyncCompletions,
+        speech_service: SpeechService,
         session: Session,
+        realtime_config: RealtimeConfig,
+        transport: Transport = "websocket",
     ) -> None:
-        self.transcription_client = transcription_client
+        self.transcription_service = transcription_service
         self.completion_client = completion_client
+        self.speech_service = speech_service
 
         self.session = session
+        self.transport: Transport = transport
+        self.created_at = time.monotonic()
+        self.last_activity_at = self.created_at
+        """When the client last sent an event (or audio). Used to detect idle sessions."""
 
-        self.pubsub = EventPubSub()
-        self.conversation = Conversation(self.pubsub)
+        self.realtime_config = realtime_config
+        self.pubsub = EventPubSub(
+            history_size=realtime_config.event_history_size,
+            max_queue_size=realtime_config.subscriber_queue_size,
+            overflow_policy=realtime_config.subscriber_overflow_policy,
+        )
+        self.conversation = Conversation(self.pubsub, max_chat_history_chars=realtime_config.max_chat_history_chars)
+        self.turn_tracker = TurnTracker(self.pubsub, emit_event=realtime_config.turn_timings_event)
         self.response: ResponseHandler | None = None
+        self.speculative_turn: SpeculativeTurn | None = None
+        self.recorder: SessionRecorder | None = None
 
         input_audio_buffer = InputAudioBuffer(self.pubsub)
         self.input_audio_buffers = OrderedDict[str, InputAudioBuffer]({input_audio_buffer.id: input_audio_buffer})
+        self.transcribed_input_audio_buffer_ids = deque[str]()
+        """IDs of the transcribed input audio buffers whose audio is still kept in memory, oldest first."""
+
+    def cancel_background_work(self) -> None:
+        """Cancel the response being generated and any speculative work. Called once the session's connection has been closed."""
+        if self.response is not None:
+            self.response.cancel("client_cancelled")
+        if self.speculative_turn is not None:
+            self.speculative_turn.cancel()
+            self.speculative_turn = None
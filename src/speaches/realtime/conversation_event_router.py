@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 from collections import OrderedDict
 import logging
 from typing import TYPE_CHECKING
 
 from openai.types.beta.realtime.error_event import Error
 
+from speaches.realtime.chat_utils import chat_message_size, conversation_item_to_chat_message, truncate_chat_messages
 from speaches.realtime.event_router import EventRouter
 from speaches.realtime.response_event_router import ResponseHandler
 from speaches.realtime.utils import generate_conversation_id
@@ -24,6 +26,7 @@ from speaches.types.realtime import (
 
 if TYPE_CHECKING:
     from openai.types.beta.realtime import ConversationItemTruncateEvent
+    from openai.types.chat import ChatCompletionMessageParam
 
     from speaches.realtime.context import SessionContext
     from speaches.realtime.pubsub import EventPubSub
@@ -35,10 +38,32 @@ event_router = EventRouter()
 
 
 class Conversation:
-    def __init__(self, pubsub: EventPubSub) -> None:
+    def __init__(self, pubsub: EventPubSub, *, max_chat_history_chars: int | None = None) -> None:
         self.id = generate_conversation_id()
         self.items = OrderedDict[str, ConversationItem]()
         self.pubsub = pubsub
+        self.max_chat_history_chars = max_chat_history_chars
+        # NOTE: chat messages (and their sizes) of items that can no longer change, so that each item is only converted once
+        self._chat_messages: dict[str, tuple[ChatCompletionMessageParam, int]] = {}
+
+    def chat_messages(self, *pending_items: ConversationItem) -> list[ChatCompletionMessageParam]:
+        """Chat messages of the conversation's items, followed by the ones of `pending_items` (items about to be added to the conversation). The oldest messages are dropped if they don't fit into `max_chat_history_chars`."""
+        messages: list[ChatCompletionMessageParam] = []
+        sizes: list[int] = []
+        for item in (*self.items.values(), *pending_items):
+            cached = self._chat_messages.get(item.id)
+            if cached is None:
+                message = conversation_item_to_chat_message(item)
+                if message is None:
+                    continue
+                cached = (message, chat_message_size(message))
+                if item.id in self.items:
+                    self._chat_messages[item.id] = cached
+            messages.append(cached[0])
+            sizes.append(cached[1])
+        if self.max_chat_history_chars is None:
+            return messages
+        return truncate_chat_messages(messages, sizes, self.max_chat_history_chars)
 
     def create_item(self, item: ConversationItem, previous_item_id: str | None = None) -> None:
         # TODO: handle `previous_item_id == "root"`. See https://platform.openai.com/docs/api-reference/realtime-client-events/conversation/item/create#realtime-client-events/conversation/item/create-previous_item_id
@@ -83,6 +108,7 @@ class Conversation:
         else:
             # TODO: What should be done if this a conversation that's being currently genererated?
             del self.items[item_id]
+            self._chat_messages.pop(item_id, None)
             self.pubsub.publish_nowait(ConversationItemDeletedEvent(item_id=item_id))
 
 
@@ -110,25 +136,44 @@ def handle_conversation_item_delete_event(ctx: SessionContext, event: Conversati
 
 @event_router.register("conversation.item.input_audio_transcription.completed")
 async def handle_conversation_item_input_audio_transcription_completed_event(
-    ctx: SessionContext, _event: ConversationItemInputAudioTranscriptionCompletedEvent
+    ctx: SessionContext, event: ConversationItemInputAudioTranscriptionCompletedEvent
 ) -> None:
+    ctx.turn_tracker.mark_item("transcription_completed", event.item_id)
+    speculative_turn = ctx.speculative_turn
+    if speculative_turn is not None and speculative_turn.item_id == event.item_id:
+        ctx.speculative_turn = None
+    else:
+        speculative_turn = None
+
     if ctx.session.turn_detection is None or not ctx.session.turn_detection.create_response:
+        if speculative_turn is not None:
+            speculative_turn.cancel()
         return
 
     if ctx.response is not None:
-        ctx.response.stop()
+        ctx.response.cancel("turn_detected")
 
     ctx.response = ResponseHandler(
         completion_client=ctx.completion_client,
+        speech_service=ctx.speech_service,
         model=ctx.session.model,
-        configuration=Response(
-            conversation="auto", input=list(ctx.conversation.items.values()), **ctx.session.model_dump()
-        ),
+        speech_model=ctx.session.speech_model,
+        configuration=Response.from_session(ctx.session),
         conversation=ctx.conversation,
         pubsub=ctx.pubsub,
+        speculative_turn=speculative_turn,
+        turn_tracker=ctx.turn_tracker,
+        audio_packet_duration_ms=ctx.realtime_config.audio_packet_duration_ms,
+        audio_packet_max_hold_ms=ctx.realtime_config.audio_packet_max_hold_ms,
+        early_first_chunk=ctx.realtime_config.early_first_chunk,
     )
+    ctx.turn_tracker.attach_response(ctx.response.id, event.item_id)
     ctx.pubsub.publish_nowait(ResponseCreatedEvent(response=ctx.response.response))
-    ctx.response.start()
-    assert ctx.response.task is not None
-    await ctx.response.task
-    ctx.response = None
+    response = ctx.response
+    response.start()
+    assert response.task is not None
+    # NOTE: `asyncio.wait` is used so that the response getting cancelled doesn't cancel this handler. Errors are logged by `task_done_callback`
+    await asyncio.wait([response.task])
+    # NOTE: a newer response may have replaced this one in the meantime
+    if ctx.response is response:
+        ctx.response = None
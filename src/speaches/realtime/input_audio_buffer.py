@@ -1,18 +1,15 @@
 from __future__ import annotations
 
 import asyncio
-from io import BytesIO
 import logging
 import time
 from typing import TYPE_CHECKING
 
 import numpy as np
-from openai import NotGiven
 from openai.types.beta.realtime.conversation_item_input_audio_transcription_completed_event import (
     UsageTranscriptTextUsageDuration,
 )
 from pydantic import BaseModel
-import soundfile as sf
 
 from speaches.realtime.utils import generate_item_id, task_done_callback
 from speaches.types.realtime import (
@@ -25,10 +22,11 @@ from speaches.types.realtime import (
 
 if TYPE_CHECKING:
     from numpy.typing import NDArray
-    from openai.resources.audio import AsyncTranscriptions
 
     from speaches.realtime.conversation_event_router import Conversation
     from speaches.realtime.pubsub import EventPubSub
+    from speaches.realtime.speculation import SpeculativeTurn
+    from speaches.services.transcription import TranscriptionService
 
 SAMPLE_RATE = 16000
 MS_SAMPLE_RATE = 16
@@ -92,16 +90,18 @@ class InputAudioBufferTranscriber:
         self,
         *,
         pubsub: EventPubSub,
-        transcription_client: AsyncTranscriptions,
+        transcription_service: TranscriptionService,
         input_audio_buffer: InputAudioBuffer,
         session: Session,
         conversation: Conversation,
+        speculative_turn: SpeculativeTurn | None = None,
     ) -> None:
         self.pubsub = pubsub
-        self.transcription_client = transcription_client
+        self.transcription_service = transcription_service
         self.input_audio_buffer = input_audio_buffer
         self.session = session
         self.conversation = conversation
+        self.speculative_turn = speculative_turn
 
         self.task: asyncio.Task[None] | None = None
         self.events = asyncio.Queue[ServerEvent]()
@@ -116,22 +116,17 @@ class InputAudioBufferTranscriber:
         )
         self.conversation.create_item(item)
 
-        file = BytesIO()
-        sf.write(
-            file,
-            self.input_audio_buffer.data_w_vad_applied,
-            samplerate=16000,
-            subtype="PCM_16",
-            endian="LITTLE",
-            format="wav",
-        )
         start = time.perf_counter()
-        transcript = await self.transcription_client.create(
-            file=file,
-            model=self.session.input_audio_transcription.model,
-            response_format="text",
-            language=self.session.input_audio_transcription.language or NotGiven(),
-        )
+        transcript = None
+        if self.speculative_turn is not None:
+            # NOTE: the user hasn't said anything since the speculative turn was started, so its transcript can be used as is
+            transcript = await self.speculative_turn.take_transcript()
+        if transcript is None:
+            transcript = await self.transcription_service.transcribe(
+                self.input_audio_buffer.data_w_vad_applied,
+                model=self.session.input_audio_transcription.model,
+                language=self.session.input_audio_transcription.language,
+            )
         logger.info(f"Transcription generation took {time.perf_counter() - start:.2f} seconds")
         content_item.transcript = transcript
         self.pubsub.publish_nowait(
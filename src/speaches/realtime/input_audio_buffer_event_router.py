@@ -1,6 +1,5 @@
-import base64
-from io import BytesIO
 import logging
+import time
 from typing import Literal
 
 from faster_whisper.transcribe import get_speech_timestamps
@@ -10,15 +9,18 @@ from numpy.typing import NDArray
 import openai
 from openai.types.beta.realtime.error_event import Error
 
-from speaches.audio import audio_samples_from_file
+from speaches.realtime.audio_format import audio_format_sample_rate, audio_format_sample_width, decode_audio
 from speaches.realtime.context import SessionContext
 from speaches.realtime.event_router import EventRouter
 from speaches.realtime.input_audio_buffer import (
     MAX_VAD_WINDOW_SIZE_SAMPLES,
     MS_SAMPLE_RATE,
+    SAMPLE_RATE,
     InputAudioBuffer,
     InputAudioBufferTranscriber,
 )
+from speaches.realtime.session_registry import release_input_audio_buffer
+from speaches.realtime.speculation import SpeculativeTurn
 from speaches.types.realtime import (
     InputAudioBufferAppendEvent,
     InputAudioBufferClearedEvent,
@@ -118,21 +120,98 @@ def vad_detection_flow(
     return None
 
 
-# Client Events
+def is_end_of_turn_candidate(input_audio_buffer: InputAudioBuffer, turn_detection: TurnDetection) -> bool:
+    """Whether the last `speculative_silence_duration_ms` of the buffer are silent, i.e. the user may have finished speaking."""
+    assert turn_detection.speculative_silence_duration_ms is not None
+    # NOTE: only the tail of the buffer is looked at, which keeps this check much cheaper than `vad_detection_flow`
+    audio_window = input_audio_buffer.data[-turn_detection.silence_duration_ms * MS_SAMPLE_RATE :]
+    min_silence_samples = turn_detection.speculative_silence_duration_ms * MS_SAMPLE_RATE
+    if len(audio_window) < min_silence_samples:
+        return False
+    speech_timestamps = get_speech_timestamps(
+        audio_window,
+        vad_options=VadOptions(
+            threshold=turn_detection.threshold,
+            min_silence_duration_ms=turn_detection.speculative_silence_duration_ms,
+            speech_pad_ms=0,
+        ),
+    )
+    return len(speech_timestamps) == 0 or len(audio_window) - speech_timestamps[-1]["end"] >= min_silence_samples
+
+
+def update_speculative_turn(
+    ctx: SessionContext, input_audio_buffer: InputAudioBuffer, turn_detection: TurnDetection
+) -> None:
+    """Start a speculative turn on an end-of-turn candidate, or cancel it if the user has resumed speaking."""
+    if (
+        turn_detection.speculative_silence_duration_ms is None
+        or turn_detection.speculative_silence_duration_ms >= turn_detection.silence_duration_ms
+        # NOTE: only while the user is speaking
+        or input_audio_buffer.vad_state.audio_start_ms is None
+        or input_audio_buffer.vad_state.audio_end_ms is not None
+    ):
+        return
+
+    speculative_turn = ctx.speculative_turn
+    if speculative_turn is not None and speculative_turn.item_id != input_audio_buffer.id:
+        speculative_turn = None
+    if is_end_of_turn_candidate(input_audio_buffer, turn_detection):
+        if speculative_turn is None:
+            logger.debug(
+                f"End of turn candidate detected at {input_audio_buffer.duration_ms}ms. Starting a speculative turn"
+            )
+            if ctx.speculative_turn is not None:
+                ctx.speculative_turn.cancel()
+            ctx.speculative_turn = SpeculativeTurn(
+                transcription_service=ctx.transcription_service,
+                completion_client=ctx.completion_client,
+                session=ctx.session,
+                conversation=ctx.conversation,
+                input_audio_buffer=input_audio_buffer,
+            )
+    elif speculative_turn is not None:
+        logger.debug("The user resumed speaking. Cancelling the speculative turn")
+        speculative_turn.cancel()
+        ctx.speculative_turn = None
 
 
-@event_router.register("input_audio_buffer.append")
-def handle_input_audio_buffer_append(ctx: SessionContext, event: InputAudioBufferAppendEvent) -> None:
-    audio_chunk = audio_samples_from_file(BytesIO(base64.b64decode(event.audio)))
-    # convert the audio data from 24kHz (sample rate defined in the API spec) to 16kHz (sample rate used by the VAD and for transcription)
-    audio_chunk = resample_audio_data(audio_chunk, 24000, 16000)
+def append_input_audio(ctx: SessionContext, audio_chunk: NDArray[np.float32]) -> None:
+    """Append 16kHz audio to the current input audio buffer and run the turn detection on it."""
     input_audio_buffer_id = next(reversed(ctx.input_audio_buffers))
     input_audio_buffer = ctx.input_audio_buffers[input_audio_buffer_id]
     input_audio_buffer.append(audio_chunk)
+    ctx.last_activity_at = time.monotonic()
     if ctx.session.turn_detection is not None:
         vad_event = vad_detection_flow(input_audio_buffer, ctx.session.turn_detection)
         if vad_event is not None:
+            if isinstance(vad_event, InputAudioBufferSpeechStoppedEvent):
+                ctx.turn_tracker.mark_item("speech_stopped", input_audio_buffer.id)
             ctx.pubsub.publish_nowait(vad_event)
+        else:
+            update_speculative_turn(ctx, input_audio_buffer, ctx.session.turn_detection)
+
+
+# Client Events
+
+
+@event_router.register("input_audio_buffer.append")
+def handle_input_audio_buffer_append(ctx: SessionContext, event: InputAudioBufferAppendEvent) -> None:
+    sample_width = audio_format_sample_width(ctx.session.input_audio_format)
+    if len(event.audio_bytes) % sample_width != 0:
+        ctx.pubsub.publish_nowait(
+            create_invalid_request_error(
+                message=f"Invalid audio: '{ctx.session.input_audio_format}' audio has {sample_width} bytes per sample, but {len(event.audio_bytes)} bytes were received.",
+                event_id=event.event_id,
+            )
+        )
+        return
+    # NOTE: `pcm16` audio isn't copied when decoded, so audio received in a binary frame is read straight from the WebSocket message
+    audio_chunk = decode_audio(event.audio_bytes, ctx.session.input_audio_format).astype(np.float32) / 32768.0
+    sample_rate = audio_format_sample_rate(ctx.session.input_audio_format, ctx.session.input_audio_sample_rate)
+    # convert the audio data to 16kHz (sample rate used by the VAD and for transcription)
+    if sample_rate != SAMPLE_RATE:
+        audio_chunk = resample_audio_data(audio_chunk, sample_rate, SAMPLE_RATE)
+    append_input_audio(ctx, audio_chunk)
 
 
 @event_router.register("input_audio_buffer.commit")
@@ -158,7 +237,10 @@ def handle_input_audio_buffer_commit(ctx: SessionContext, _event: InputAudioBuff
 
 @event_router.register("input_audio_buffer.clear")
 def handle_input_audio_buffer_clear(ctx: SessionContext, _event: InputAudioBufferClearEvent) -> None:
-    ctx.input_audio_buffers.popitem()
+    input_audio_buffer_id, _ = ctx.input_audio_buffers.popitem()
+    if ctx.speculative_turn is not None and ctx.speculative_turn.item_id == input_audio_buffer_id:
+        ctx.speculative_turn.cancel()
+        ctx.speculative_turn = None
     # OpenAI's doesn't send an error if the buffer is already empty.
     ctx.pubsub.publish_nowait(InputAudioBufferClearedEvent())
     input_audio_buffer = InputAudioBuffer(ctx.pubsub)
@@ -182,14 +264,19 @@ def handle_input_audio_buffer_speech_stopped(ctx: SessionContext, event: InputAu
 
 @event_router.register("input_audio_buffer.committed")
 async def handle_input_audio_buffer_committed(ctx: SessionContext, event: InputAudioBufferCommittedEvent) -> None:
+    ctx.turn_tracker.mark_item("committed", event.item_id)
     input_audio_buffer = ctx.input_audio_buffers[event.item_id]
+    speculative_turn = ctx.speculative_turn
+    if speculative_turn is not None and (speculative_turn.item_id != event.item_id or speculative_turn.promoted):
+        speculative_turn = None
 
     transcriber = InputAudioBufferTranscriber(
         pubsub=ctx.pubsub,
-        transcription_client=ctx.transcription_client,
+        transcription_service=ctx.transcription_service,
         input_audio_buffer=input_audio_buffer,
         session=ctx.session,
         conversation=ctx.conversation,
+        speculative_turn=speculative_turn,
     )
     transcriber.start()
     assert transcriber.task is not None
@@ -203,4 +290,9 @@ async def handle_input_audio_buffer_committed(ctx: SessionContext, event: InputA
                 message=e.message,
             )
         )
+    except ValueError as e:
+        ctx.pubsub.publish_nowait(create_invalid_request_error(message=str(e)))
+    finally:
+        # NOTE: the transcriber is the last user of the buffer's audio. It's released even if the transcription failed unexpectedly
+        release_input_audio_buffer(ctx, event.item_id)
     await transcriber.task
@@ -10,13 +10,16 @@ import httpx_ws
 from openai.types.beta.realtime.error_event import Error
 from pydantic import ValidationError
 
+from speaches.realtime.binary_frames import decode_input_audio_buffer_append_frame, encode_response_audio_delta_frame
 from speaches.realtime.pubsub import EventPubSub
+from speaches.realtime.turn_timings import TurnTracker
 from speaches.realtime.utils import task_done_callback
 from speaches.types.realtime import (
     CLIENT_EVENT_TYPES,
     SERVER_EVENT_TYPES,
     ErrorEvent,
     Event,
+    ResponseAudioDeltaEvent,
     client_event_type_adapter,
     server_event_type_adapter,
 )
@@ -37,14 +40,11 @@ class BaseMessageManager(abc.ABC):
     async def sender(self, ws: Any) -> None: ...  # noqa: ANN401
 
     async def wait_for(self, event_type: str) -> Event:
-        q = self.event_pubsub.subscribe()
+        subscription = self.event_pubsub.subscribe(event_type)
         try:
-            while True:
-                event = await q.get()
-                if event.type == event_type:
-                    return event
+            return await subscription.get()
         finally:
-            self.event_pubsub.subscribers.remove(q)
+            self.event_pubsub.unsubscribe(subscription)
 
     async def run(self, ws: Any) -> None:  # noqa: ANN401
         async with asyncio.TaskGroup() as tg:
@@ -85,37 +85,58 @@ class WsClientMessageManager(BaseMessageManager):
             logger.info("Receiver task timed out")
 
     async def sender(self, ws: httpx_ws.AsyncWebSocketSession) -> None:
-        q = self.event_pubsub.subscribe()
+        subscription = self.event_pubsub.subscribe(*CLIENT_EVENT_TYPES, maxsize=0)
         try:
             while True:
-                event = await q.get()
-                if event.type not in CLIENT_EVENT_TYPES:
-                    continue
-                client_event = client_event_type_adapter.validate_python(event)
+                event = await subscription.get()
                 try:
                     logger.debug(f"Sending {event.type} event")
-                    await ws.send_text(client_event.model_dump_json())
+                    await ws.send_text(self.event_pubsub.encode(event))
                     logger.info(f"Sent {event.type} event")
                 except fastapi.WebSocketDisconnect:
                     logger.info("Failed to send message due to disconnect")
                     break
         finally:
-            self.event_pubsub.subscribers.remove(q)
+            self.event_pubsub.unsubscribe(subscription)
 
 
 class WsServerMessageManager(BaseMessageManager):
+    def __init__(
+        self,
+        event_pubsub: EventPubSub | None = None,
+        *,
+        binary_audio: bool = False,
+        turn_tracker: TurnTracker | None = None,
+    ) -> None:
+        super().__init__(event_pubsub)
+        self.binary_audio = binary_audio
+        """Whether audio is exchanged as binary frames. See `speaches.realtime.binary_frames`."""
+        self.turn_tracker = turn_tracker
+
     async def receiver(self, ws: fastapi.WebSocket) -> None:
         logger.info("Receiver task started")
         while True:
-            try:
-                # logger.debug("Waiting for event")
-                data = await ws.receive_text()
-            except fastapi.WebSocketDisconnect:
+            # logger.debug("Waiting for event")
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
                 logger.info("Failed to receive message due to disconnect")
                 break
+            if message.get("bytes") is not None and not self.binary_audio:
+                await ws.send_text(
+                    ErrorEvent(
+                        error=Error(
+                            type="invalid_request_error",
+                            message="Binary frames are only accepted when connected with `binary_audio=true`",
+                        )
+                    ).model_dump_json()
+                )
+                continue
             try:
-                event = client_event_type_adapter.validate_json(data)
-            except ValidationError as e:
+                if message.get("bytes") is not None:
+                    event = decode_input_audio_buffer_append_frame(message["bytes"])
+                else:
+                    event = client_event_type_adapter.validate_json(message["text"])
+            except (ValidationError, ValueError) as e:
                 logger.exception("Received an invalid client event")
                 await ws.send_text(
                     ErrorEvent(error=Error(type="invalid_request_error", message=str(e))).model_dump_json()
@@ -127,20 +148,24 @@ class WsServerMessageManager(BaseMessageManager):
 
     async def sender(self, ws: fastapi.WebSocket) -> None:
         logger.info("Sender task started")
-        q = self.event_pubsub.subscribe()
+        # NOTE: the queue is unbounded as the client must receive every server event
+        subscription = self.event_pubsub.subscribe(*SERVER_EVENT_TYPES, maxsize=0)
         try:
             while True:
                 # logger.debug("Waiting for event")
-                event = await q.get()
-                if event.type not in SERVER_EVENT_TYPES:
-                    continue
-                server_event = server_event_type_adapter.validate_python(event)
+                event = await subscription.get()
                 try:
                     logger.debug(f"Sending {event.type} event")
-                    await ws.send_text(server_event.model_dump_json())
+                    if self.binary_audio and isinstance(event, ResponseAudioDeltaEvent):
+                        await ws.send_bytes(encode_response_audio_delta_frame(event))
+                    else:
+                        # NOTE: events are published by the server itself and are already typed, so they aren't re-validated
+                        await ws.send_text(self.event_pubsub.encode(event))
+                    if self.turn_tracker is not None and isinstance(event, ResponseAudioDeltaEvent):
+                        self.turn_tracker.mark_response("first_audio_sent", event.response_id)
                     logger.info(f"Sent {event.type} event")
                 except fastapi.WebSocketDisconnect:
                     logger.info("Failed to send message due to disconnect")
                     break
         finally:
-            self.event_pubsub.subscribers.remove(q)
+            self.event_pubsub.unsubscribe(subscription)
@@ -1,61 +1,183 @@
 from asyncio import Queue
+from collections import defaultdict, deque
 from collections.abc import AsyncGenerator
 import json
 import logging
 from pathlib import Path
+from typing import Protocol
 
-from pydantic import BaseModel
+from cachetools import LRUCache
 
+from speaches.config import OverflowPolicy
 from speaches.types.realtime import CLIENT_EVENT_TYPES, SERVER_EVENT_TYPES, Event
 
+# An event is sent right after it's published, so only the most recent events need to be kept around
+ENCODED_EVENTS_CACHE_SIZE = 32
+
 logger = logging.getLogger(__name__)
 
 
-class PubSub[T: BaseModel]:
-    def __init__(self) -> None:
-        self.subscribers: set[Queue[T]] = set()
-        self.events: list[T] = []  # to store all events
+class TypedEvent(Protocol):
+    @property
+    def type(self) -> str: ...
+
+
+class Subscription[T: TypedEvent]:
+    def __init__(self, event_types: frozenset[str] | None, maxsize: int, overflow_policy: OverflowPolicy) -> None:
+        self.event_types = event_types
+        """Event types this subscriber receives. `None` means all events."""
+        self.overflow_policy = overflow_policy
+        self.queue = Queue[T](maxsize=maxsize)
+        self.dropped_events = 0
+
+    def _drop(self, event: T) -> None:
+        self.dropped_events += 1
+        if self.dropped_events == 1 or self.dropped_events % 100 == 0:
+            logger.warning(
+                f"Subscriber queue is full ({self.queue.maxsize} events), dropped {self.dropped_events} events so far. Last dropped event type: {event.type}"
+            )
+
+    def put_nowait(self, event: T) -> None:
+        if self.queue.full() and self.overflow_policy != "block":
+            if self.overflow_policy == "drop_newest":
+                self._drop(event)
+                return
+            self._drop(self.queue.get_nowait())
+        self.queue.put_nowait(event)
+
+    async def put(self, event: T) -> None:
+        if self.overflow_policy == "block":
+            await self.queue.put(event)
+        else:
+            self.put_nowait(event)
+
+    async def get(self) -> T:
+        return await self.queue.get()
+
+    def get_nowait(self) -> T:
+        return self.queue.get_nowait()
+
+    def empty(self) -> bool:
+        return self.queue.empty()
+
+
+class PubSub[T: TypedEvent]:
+    """An in-memory publish/subscribe hub.
+
+    Published events are treated as immutable and are shared (not copied) between all of the subscribers and the history.
+    """
+
+    def __init__(
+        self,
+        history_size: int = 0,
+        max_queue_size: int = 0,
+        overflow_policy: OverflowPolicy = "drop_oldest",
+    ) -> None:
+        """Args:
+        history_size: Number of the most recent events to keep in `events`. 0 disables the history, -1 keeps every event.
+        max_queue_size: Default maximum number of undelivered events per subscriber. 0 means unbounded.
+        overflow_policy: Default policy applied when a subscriber's queue is full. With "block", `publish` waits for room in the queue while `publish_nowait` raises `asyncio.QueueFull`.
+
+        """  # noqa: D205
+        self.events = deque[T](maxlen=None if history_size == -1 else history_size)
+        self.max_queue_size = max_queue_size
+        self.overflow_policy: OverflowPolicy = overflow_policy
+        self.subscribers: set[Subscription[T]] = set()
+        """Subscribers receiving every event."""
+        self.subscribers_by_type = defaultdict[str, set[Subscription[T]]](set)
+        """Subscribers receiving only specific event types, indexed by the event type."""
+
+    def _subscribers_for(self, event: T) -> list[Subscription[T]]:
+        typed_subscribers = self.subscribers_by_type.get(event.type)
+        if not typed_subscribers:
+            return list(self.subscribers)
+        return [*self.subscribers, *typed_subscribers]
 
     async def publish(self, event: T) -> None:
         self.events.append(event)
-        for subscriber in self.subscribers:
+        for subscriber in self._subscribers_for(event):
             await subscriber.put(event)
 
     def publish_nowait(self, event: T) -> None:
         self.events.append(event)
-        for subscriber in self.subscribers:
+        for subscriber in self._subscribers_for(event):
             subscriber.put_nowait(event)
 
-    def subscribe(self) -> Queue[T]:
-        subscriber = Queue[T]()
-        self.subscribers.add(subscriber)
-        return subscriber
+    def subscribe(
+        self,
+        *event_types: str,
+        maxsize: int | None = None,
+        overflow_policy: OverflowPolicy | None = None,
+    ) -> Subscription[T]:
+        """Subscribe to the given event types (or to every event if none are given).
+
+        `maxsize` and `overflow_policy` default to the values the `PubSub` was created with.
+        """
+        subscription = Subscription[T](
+            frozenset(event_types) if len(event_types) > 0 else None,
+            maxsize=self.max_queue_size if maxsize is None else maxsize,
+            overflow_policy=overflow_policy or self.overflow_policy,
+        )
+        if subscription.event_types is None:
+            self.subscribers.add(subscription)
+        else:
+            for event_type in subscription.event_types:
+                self.subscribers_by_type[event_type].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription[T]) -> None:
+        if subscription.event_types is None:
+            self.subscribers.discard(subscription)
+            return
+        for event_type in subscription.event_types:
+            typed_subscribers = self.subscribers_by_type[event_type]
+            typed_subscribers.discard(subscription)
+            if len(typed_subscribers) == 0:
+                del self.subscribers_by_type[event_type]
 
     async def poll(self) -> AsyncGenerator[T, None]:
-        subscriber = Queue[T]()
-        self.subscribers.add(subscriber)
+        # NOTE: the queue is unbounded as the consumer (the event dispatcher) must not miss any events
+        subscription = self.subscribe(maxsize=0)
         try:
             while True:
-                event = await subscriber.get()
-                yield event.model_copy()
+                yield await subscription.get()
         finally:
-            self.subscribers.remove(subscriber)
+            self.unsubscribe(subscription)
             logger.info("Subscriber removed")
 
 
 class EventPubSub(PubSub[Event]):
+    def __init__(
+        self,
+        history_size: int = 0,
+        max_queue_size: int = 0,
+        overflow_policy: OverflowPolicy = "drop_oldest",
+    ) -> None:
+        super().__init__(history_size=history_size, max_queue_size=max_queue_size, overflow_policy=overflow_policy)
+        self.encoded_events = LRUCache[str, str](maxsize=ENCODED_EVENTS_CACHE_SIZE)
+
+    def encode(self, event: Event) -> str:
+        """Serialize a published event to JSON.
+
+        Events are immutable once published, so the result is cached by `event_id` and shared between every transport (and any other consumer) sending the same event.
+        """
+        if event.event_id is None:
+            return event.model_dump_json()
+        encoded_event = self.encoded_events.get(event.event_id)
+        if encoded_event is None:
+            encoded_event = event.model_dump_json()
+            self.encoded_events[event.event_id] = encoded_event
+        return encoded_event
+
     async def subscribe_to(self, event_type: str) -> AsyncGenerator[Event, None]:
         if event_type not in SERVER_EVENT_TYPES | CLIENT_EVENT_TYPES:
             raise ValueError(f"Invalid event type: {event_type}")
-        subscriber = Queue[Event]()
-        self.subscribers.add(subscriber)
+        subscription = self.subscribe(event_type)
         try:
             while True:
-                event = await subscriber.get()
-                if event.type == event_type:  # Only yield events matching the requested type
-                    yield event.model_copy()
+                yield await subscription.get()
         finally:
-            self.subscribers.remove(subscriber)
+            self.unsubscribe(subscription)
             logger.info(f"Subscriber for event type {event_type} removed")
 
     def dump_to_file(self, file_path: Path) -> None:
@@ -0,0 +1,81 @@
+"""Recording of realtime sessions for offline replay (see `scripts/realtime_replay.py`).
+
+A recording is a gzip compressed JSON Lines file. The first line is a header (`{"version": ..., "session_id": ..., "model": ..., "created_at": ...}`), every following line is a timed client event: `{"t": <seconds since the session started>, "event": <client event>}`. Audio is always stored as a regular `input_audio_buffer.append` event with base64 encoded audio, regardless of whether it was received as JSON, in a binary WebSocket frame or over a WebRTC audio track. It's kept in the session's `input_audio_format` (which replays of the recorded `session.update` events restore), except for WebRTC audio which is stored as 24kHz PCM16.
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from speaches.audio import resample_audio
+from speaches.types.realtime import CLIENT_EVENT_TYPES, InputAudioBufferAppendEvent
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from numpy.typing import NDArray
+
+    from speaches.realtime.pubsub import EventPubSub
+    from speaches.types.realtime import Event, Session
+
+RECORDING_FORMAT_VERSION = 1
+# NOTE: the sample rate of `pcm16` audio defined in the API spec
+RECORDING_SAMPLE_RATE = 24000
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRecorder:
+    def __init__(self, pubsub: EventPubSub, recordings_directory: Path, session: Session) -> None:
+        self.pubsub = pubsub
+        self.file_path = recordings_directory / f"{session.id}.jsonl.gz"
+        recordings_directory.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.file_path, "wt", encoding="utf-8")  # noqa: SIM115
+        self._start = time.monotonic()
+        header = {
+            "version": RECORDING_FORMAT_VERSION,
+            "session_id": session.id,
+            "model": session.model,
+            "created_at": int(time.time()),
+        }
+        self._file.write(json.dumps(header) + "\n")
+
+    def record(self, event: Event) -> None:
+        if self._file.closed:
+            return
+        if isinstance(event, InputAudioBufferAppendEvent) and event.audio == "":
+            # NOTE: received in a binary frame
+            event = InputAudioBufferAppendEvent(
+                audio=base64.b64encode(event.audio_bytes).decode("utf-8"), event_id=event.event_id
+            )
+        self._file.write(f'{{"t":{time.monotonic() - self._start:.4f},"event":{event.model_dump_json()}}}\n')
+
+    def record_input_audio(self, audio: NDArray[np.float32], sample_rate: int) -> None:
+        """Record audio that didn't arrive as a client event (i.e. over a WebRTC audio track)."""
+        pcm16_audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        pcm16_audio = resample_audio(pcm16_audio, sample_rate, RECORDING_SAMPLE_RATE)
+        self.record(InputAudioBufferAppendEvent(audio=base64.b64encode(pcm16_audio).decode("utf-8")))
+
+    async def run(self) -> None:
+        """Record every client event published to the session's pubsub until cancelled."""
+        logger.info(f"Recording the session to '{self.file_path}'")
+        # NOTE: the recorder is a lossy consumer, so its queue is bounded by the session's `subscriber_queue_size` and `subscriber_overflow_policy`
+        subscription = self.pubsub.subscribe(*CLIENT_EVENT_TYPES)
+        try:
+            while True:
+                self.record(await subscription.get())
+        finally:
+            self.pubsub.unsubscribe(subscription)
+            self.close()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"Saved the session recording to '{self.file_path}'")
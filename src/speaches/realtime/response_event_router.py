@@ -3,28 +3,29 @@ from __future__ import annotations
 import asyncio
 from contextlib import contextmanager
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 import openai
 from openai.types.beta.realtime.error_event import Error
-from pydantic import BaseModel
 
-from speaches.realtime.chat_utils import (
-    create_completion_params,
-    items_to_chat_messages,
-)
+from speaches import text_utils
+from speaches.audio import packetize_audio
+from speaches.realtime.audio_format import audio_format_sample_rate, encode_audio
+from speaches.realtime.chat_utils import create_completion_params
 from speaches.realtime.event_router import EventRouter
 from speaches.realtime.session_event_router import unsupported_field_error, update_dict
 from speaches.realtime.utils import generate_response_id, task_done_callback
+from speaches.text_utils import AdaptiveChunker
 from speaches.types.realtime import (
     ConversationItemContentAudio,
     ConversationItemContentText,
     ConversationItemFunctionCall,
     ConversationItemMessage,
     ErrorEvent,
+    InputAudioBufferSpeechStartedEvent,
     RealtimeResponse,
+    RealtimeResponseStatus,
     Response,
-    # TODO: RealtimeResponseStatus,
     ResponseAudioDeltaEvent,
     ResponseAudioDoneEvent,
     ResponseAudioTranscriptDeltaEvent,
@@ -42,7 +43,6 @@ from speaches.types.realtime import (
     ResponseTextDeltaEvent,
     ResponseTextDoneEvent,
     ServerConversationItem,
-    create_server_error,
 )
 
 if TYPE_CHECKING:
@@ -54,11 +54,17 @@ if TYPE_CHECKING:
     from speaches.realtime.context import SessionContext
     from speaches.realtime.conversation_event_router import Conversation
     from speaches.realtime.pubsub import EventPubSub
+    from speaches.realtime.speculation import SpeculativeTurn
+    from speaches.realtime.turn_timings import TurnTracker
+    from speaches.services.speech import SpeechService
+    from speaches.text_utils import TextChunker
 
 logger = logging.getLogger(__name__)
 
 event_router = EventRouter()
 
+type CancellationReason = Literal["turn_detected", "client_cancelled"]
+
 # TODO: start using this error
 conversation_already_has_active_response_error = Error(
     type="invalid_request_error",
@@ -66,29 +72,36 @@ conversation_already_has_active_response_error = Error(
 )
 
 
-class ChoiceDeltaAudio(BaseModel):
-    id: str | None = None
-    transcript: str | None = None
-    data: str | None = None
-    expires_at: int | None = None
-
-
 class ResponseHandler:
     def __init__(
         self,
         *,
         completion_client: AsyncCompletions,
+        speech_service: SpeechService,
         model: str,
+        speech_model: str,
         configuration: Response,
         conversation: Conversation,
         pubsub: EventPubSub,
+        speculative_turn: SpeculativeTurn | None = None,
+        turn_tracker: TurnTracker | None = None,
+        audio_packet_duration_ms: int | None = None,
+        audio_packet_max_hold_ms: int | None = None,
+        early_first_chunk: bool = False,
     ) -> None:
         self.id = generate_response_id()
         self.completion_client = completion_client
+        self.speech_service = speech_service
         self.model = model  # NOTE: unfortunatly `Response` doesn't have a `model` field
+        self.speech_model = speech_model
         self.configuration = configuration
         self.conversation = conversation
         self.pubsub = pubsub
+        self.speculative_turn = speculative_turn
+        self.turn_tracker = turn_tracker
+        self.audio_packet_duration_ms = audio_packet_duration_ms
+        self.audio_packet_max_hold_ms = audio_packet_max_hold_ms
+        self.early_first_chunk = early_first_chunk
         self.response = RealtimeResponse(
             id=self.id,
             status="incomplete",
@@ -96,17 +109,19 @@ class ResponseHandler:
             modalities=configuration.modalities,
         )
         self.task: asyncio.Task[None] | None = None
+        self.cancellation_reason: CancellationReason | None = None
 
     @contextmanager
     def add_output_item[T: ServerConversationItem](self, item: T) -> Generator[T, None, None]:
         self.response.output.append(item)
         self.pubsub.publish_nowait(ResponseOutputItemAddedEvent(response_id=self.id, item=item))
-        yield item
-        assert item.status == "incomplete", item
-        item.status = "completed"  # TODO: do not update the status if the response was cancelled
-        self.pubsub.publish_nowait(ResponseOutputItemDoneEvent(response_id=self.id, item=item))
-        self.response.status = "completed"  # TODO: set to "cancelled" if the response was cancelled. Additionally, populate the `respones.status_details`
-        self.pubsub.publish_nowait(ResponseDoneEvent(response=self.response))
+        try:
+            yield item
+            assert item.status == "incomplete", item
+            item.status = "completed"
+        finally:
+            # NOTE: if the response gets cancelled (or fails) the item is still done, but its status remains `incomplete`
+            self.pubsub.publish_nowait(ResponseOutputItemDoneEvent(response_id=self.id, item=item))
 
     @contextmanager
     def add_item_content[T: ConversationItemContentText | ConversationItemContentAudio](
@@ -116,10 +131,12 @@ class ResponseHandler:
         self.pubsub.publish_nowait(
             ResponseContentPartAddedEvent(response_id=self.id, item_id=item.id, part=content.to_part())
         )
-        yield content
-        self.pubsub.publish_nowait(
-            ResponseContentPartDoneEvent(response_id=self.id, item_id=item.id, part=content.to_part())
-        )
+        try:
+            yield content
+        finally:
+            self.pubsub.publish_nowait(
+                ResponseContentPartDoneEvent(response_id=self.id, item_id=item.id, part=content.to_part())
+            )
 
     async def conversation_item_message_text_handler(self, chunk_stream: AsyncGenerator[ChatCompletionChunk]) -> None:
         with self.add_output_item(ConversationItemMessage(role="assistant", status="incomplete", content=[])) as item:
@@ -140,34 +157,75 @@ class ResponseHandler:
                     ResponseTextDoneEvent(item_id=item.id, response_id=self.id, text=content.text)
                 )
 
+    async def synthesize_sentences(self, sentence_chunker: TextChunker, sample_rate: int) -> AsyncGenerator[bytes]:
+        is_first_sentence = True
+        async for sentence in sentence_chunker:
+            sentence_clean = text_utils.strip_emojis(text_utils.strip_markdown_emphasis(sentence.strip())).strip()
+            if len(sentence_clean) == 0:
+                logger.warning(f"Skipping empty sentence. ORIGINAL: {sentence}")
+                continue
+            async for audio_bytes in self.speech_service.synthesize_stream(
+                sentence_clean,
+                model=self.speech_model,
+                voice=self.configuration.voice,
+                sample_rate=sample_rate,
+                # NOTE: only the first sentence affects the time to the first audio
+                early_first_chunk=self.early_first_chunk and is_first_sentence,
+            ):
+                if self.turn_tracker is not None:
+                    self.turn_tracker.mark_response("tts_first_audio", self.id)
+                yield audio_bytes
+            is_first_sentence = False
+
+    async def audio_synthesis_worker(self, item: ConversationItemMessage, sentence_chunker: TextChunker) -> None:
+        audio_format = self.configuration.output_audio_format
+        # NOTE: the audio is synthesized at the output sample rate, so it only needs to be encoded (which is a no-op for `pcm16`)
+        sample_rate = audio_format_sample_rate(audio_format, self.configuration.output_audio_sample_rate)
+        audio_stream = self.synthesize_sentences(sentence_chunker, sample_rate)
+        if self.audio_packet_duration_ms is not None:
+            # NOTE: packets span sentence boundaries, so the deltas are evenly sized regardless of how the speech model chunks its output
+            audio_stream = packetize_audio(
+                audio_stream,
+                sample_rate=sample_rate,
+                packet_duration_ms=self.audio_packet_duration_ms,
+                max_hold_ms=self.audio_packet_max_hold_ms,
+            )
+        async for audio_bytes in audio_stream:
+            self.pubsub.publish_nowait(
+                ResponseAudioDeltaEvent.from_audio_bytes(
+                    encode_audio(audio_bytes, audio_format), item_id=item.id, response_id=self.id
+                )
+            )
+            # NOTE: we explicitly don't append the audio data to the `audio` field
+
     async def conversation_item_message_audio_handler(self, chunk_stream: AsyncGenerator[ChatCompletionChunk]) -> None:
         with self.add_output_item(ConversationItemMessage(role="assistant", status="incomplete", content=[])) as item:
             self.conversation.create_item(item)
 
             with self.add_item_content(item, ConversationItemContentAudio(audio="", transcript="")) as content:
-                async for chunk in chunk_stream:
-                    assert len(chunk.choices) == 1, chunk
-                    choice = chunk.choices[0]
-
-                    audio = getattr(choice.delta, "audio", None)
-                    if audio is None:
-                        logger.warning(f"Could not extract audio from chunk: {chunk}")
-                        continue
-                    assert isinstance(audio, dict), chunk
-                    audio = ChoiceDeltaAudio(**audio)
-                    if audio.transcript is not None:
-                        self.pubsub.publish_nowait(
-                            ResponseAudioTranscriptDeltaEvent(
-                                item_id=item.id, response_id=self.id, delta=audio.transcript
-                            )
+                sentence_chunker = AdaptiveChunker()
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        audio_synthesis_task = tg.create_task(
+                            self.audio_synthesis_worker(item, sentence_chunker), name="audio_synthesis_worker"
                         )
-                        content.transcript += audio.transcript
-
-                    if audio.data is not None:
-                        self.pubsub.publish_nowait(
-                            ResponseAudioDeltaEvent(item_id=item.id, response_id=self.id, delta=audio.data)
-                        )
-                        # NOTE: we explicitly don't append the audio data to the `audio` field
+                        audio_synthesis_task.add_done_callback(task_done_callback)
+                        async for chunk in chunk_stream:
+                            assert len(chunk.choices) == 1, chunk
+                            choice = chunk.choices[0]
+
+                            if choice.delta.content is not None:
+                                sentence_chunker.add_token(choice.delta.content)
+                                self.pubsub.publish_nowait(
+                                    ResponseAudioTranscriptDeltaEvent(
+                                        item_id=item.id, response_id=self.id, delta=choice.delta.content
+                                    )
+                                )
+                                content.transcript += choice.delta.content
+                        sentence_chunker.close()
+                except* (openai.APIError, ValueError) as e:
+                    # NOTE: the task group wraps the errors in an `ExceptionGroup`. The original error is re-raised so that `generate_response` reports it to the client
+                    raise e.exceptions[0] from None
 
                 self.pubsub.publish_nowait(ResponseAudioDoneEvent(item_id=item.id, response_id=self.id))
                 self.pubsub.publish_nowait(
@@ -224,15 +282,19 @@ class ResponseHandler:
                 )
             )
 
-    async def generate_response(self) -> None:
+    async def generate_response(self) -> None:  # noqa: C901
+        chunk_stream: openai.AsyncStream[ChatCompletionChunk] | None = None
         try:
             completion_params = create_completion_params(
-                self.model,
-                list(items_to_chat_messages(self.configuration.input)),
-                self.configuration,
+                self.model, self.conversation.chat_messages(), self.configuration
             )
-            chunk_stream = await self.completion_client.create(**completion_params)
+            if self.speculative_turn is not None:
+                chunk_stream = await self.speculative_turn.take_chunk_stream(completion_params)
+            if chunk_stream is None:
+                chunk_stream = await self.completion_client.create(**completion_params)
             chunk = await anext(chunk_stream)
+            if self.turn_tracker is not None:
+                self.turn_tracker.mark_response("llm_first_token", self.id)
             if chunk.choices[0].delta.tool_calls is not None:
                 handler = self.conversation_item_function_call_handler
             elif self.configuration.modalities == ["text"]:
@@ -246,34 +308,57 @@ class ResponseHandler:
                 for chunk in chunks:
                     yield chunk
                 async for chunk in chunk_stream:
+                    # NOTE: the last chunk doesn't have any choices when `stream_options.include_usage` is set
+                    if len(chunk.choices) == 0:
+                        continue
                     yield chunk
 
             await handler(merge_chunks_and_chunk_stream(chunk, chunk_stream=chunk_stream))
-        except openai.APIError as e:
+            self.response.status = "completed"
+        except asyncio.CancelledError:
+            logger.info(f"Response '{self.id}' was cancelled ({self.cancellation_reason})")
+            self.response.status = "cancelled"
+            self.response.status_details = RealtimeResponseStatus(type="cancelled", reason=self.cancellation_reason)
+            raise
+        except (openai.APIError, ValueError) as e:
+            # NOTE: the speech service raises `ValueError`s (e.g. for an unsupported voice)
             logger.exception("Error while generating response")
+            message = e.message if isinstance(e, openai.APIError) else str(e)
             self.pubsub.publish_nowait(
-                ErrorEvent(error=Error(type="server_error", message=f"{type(e).__name__}: {e.message}"))
+                ErrorEvent(error=Error(type="server_error", message=f"{type(e).__name__}: {message}"))
             )
             raise
+        finally:
+            if self.response.status == "incomplete":
+                self.response.status = "failed"
+                self.response.status_details = RealtimeResponseStatus(type="failed")
+            self.pubsub.publish_nowait(ResponseDoneEvent(response=self.response))
+            if self.turn_tracker is not None:
+                self.turn_tracker.response_done(self.id, completed=self.response.status == "completed")
+            if chunk_stream is not None:
+                # NOTE: closing the stream closes the upstream connection, so that the LLM stops generating tokens that would be discarded
+                await chunk_stream.close()
 
     def start(self) -> None:
         assert self.task is None
         self.task = asyncio.create_task(self.generate_response())
         self.task.add_done_callback(task_done_callback)
 
-    def stop(self) -> None:
+    def cancel(self, reason: CancellationReason) -> None:
+        """Cancel the response. Cancellation propagates through the chat completion stream and the speech synthesis, and the `response.done` event is published with the `cancelled` status."""
         assert self.task is not None
+        if self.task.done() or self.cancellation_reason is not None:
+            return
+        self.cancellation_reason = reason
         self.task.cancel()
 
 
 @event_router.register("response.create")
 async def handle_response_create_event(ctx: SessionContext, event: ResponseCreateEvent) -> None:
     if ctx.response is not None:
-        ctx.response.stop()
+        ctx.response.cancel("client_cancelled")
 
-    configuration = Response(
-        conversation="auto", input=list(ctx.conversation.items.values()), **ctx.session.model_dump()
-    )
+    configuration = Response.from_session(ctx.session)
     if event.response is not None:
         if event.response.conversation is not None:
             ctx.pubsub.publish_nowait(unsupported_field_error("response.conversation"))
@@ -296,20 +381,48 @@ async def handle_response_create_event(ctx: SessionContext, event: ResponseCreat
 
     ctx.response = ResponseHandler(
         completion_client=ctx.completion_client,
+        speech_service=ctx.speech_service,
         model=ctx.session.model,
+        speech_model=ctx.session.speech_model,
         configuration=configuration,
         conversation=ctx.conversation,
         pubsub=ctx.pubsub,
+        turn_tracker=ctx.turn_tracker,
+        audio_packet_duration_ms=ctx.realtime_config.audio_packet_duration_ms,
+        audio_packet_max_hold_ms=ctx.realtime_config.audio_packet_max_hold_ms,
+        early_first_chunk=ctx.realtime_config.early_first_chunk,
     )
+    ctx.turn_tracker.attach_response(ctx.response.id)
     ctx.pubsub.publish_nowait(ResponseCreatedEvent(response=ctx.response.response))
-    ctx.response.start()
-    assert ctx.response.task is not None
-    await ctx.response.task
-    ctx.response = None
+    response = ctx.response
+    response.start()
+    assert response.task is not None
+    # NOTE: `asyncio.wait` is used so that the response getting cancelled doesn't cancel this handler. Errors are logged by `task_done_callback`
+    await asyncio.wait([response.task])
+    # NOTE: a newer response may have replaced this one in the meantime
+    if ctx.response is response:
+        ctx.response = None
 
 
 @event_router.register("response.cancel")
 def handle_response_cancel_event(ctx: SessionContext, event: ResponseCancelEvent) -> None:
-    ctx.pubsub.publish_nowait(
-        create_server_error(f"Handling of the '{event.type}' event is not implemented.", event_id=event.event_id)
-    )
+    if ctx.response is None or (event.response_id is not None and event.response_id != ctx.response.id):
+        ctx.pubsub.publish_nowait(
+            ErrorEvent(
+                error=Error(
+                    type="invalid_request_error",
+                    message="Conversation has no active response to cancel",
+                    event_id=event.event_id,
+                )
+            )
+        )
+        return
+    ctx.response.cancel("client_cancelled")
+
+
+@event_router.register("input_audio_buffer.speech_started")
+def handle_input_audio_buffer_speech_started(ctx: SessionContext, _event: InputAudioBufferSpeechStartedEvent) -> None:
+    # NOTE: barge-in. The user started speaking while the assistant is responding
+    if ctx.response is None or ctx.session.turn_detection is None or not ctx.session.turn_detection.interrupt_response:
+        return
+    ctx.response.cancel("turn_detected")
@@ -1,141 +1,134 @@
 import asyncio
-import base64
-import io
+from fractions import Fraction
 import logging
+import time
 
 from aiortc import MediaStreamTrack
+from aiortc.mediastreams import AUDIO_PTIME, MediaStreamError
 from av.audio.frame import AudioFrame
-import numpy as np
-from openai.types.beta.realtime import ResponseAudioDeltaEvent
 
-from speaches.audio import audio_samples_from_file
 from speaches.realtime.context import SessionContext
-from speaches.realtime.input_audio_buffer_event_router import resample_audio_data
+from speaches.types.realtime import ResponseAudioDeltaEvent, ResponseAudioDoneEvent, ResponseDoneEvent
 
 logger = logging.getLogger(__name__)
 
-# NOTE: without having this delay, the audio frames are not being delivered properly. Could be because they are being dropped but I'm not sure. Having the delay be slightly smaller than the frame duration seems to work well.
-FRAME_DELAY = 0.008
+# NOTE: the audio is sent at the sample rate it's produced at (`pcm16` is 24kHz mono). `aiortc`'s Opus encoder resamples it to 48kHz itself, so no resampling is done here.
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+SAMPLES_PER_FRAME = int(SAMPLE_RATE * AUDIO_PTIME)
+FRAME_SIZE = SAMPLES_PER_FRAME * SAMPLE_WIDTH
+PREBUFFER_FRAMES = 3
+"""Number of frames of audio that need to be buffered before playback (re)starts. Absorbs jitter in how fast the audio is being produced."""
 
 
 class AudioStreamTrack(MediaStreamTrack):
+    """Sends the `response.audio.delta` audio to the client.
+
+    Frames are paced by a clock derived from the frames' `pts` and the wall time the track started at. Silence is sent while there's no audio to play. Deltas are appended to a carry-over buffer, so they are played back-to-back without any padding between them.
+    """
+
     kind = "audio"
 
     def __init__(self, ctx: SessionContext) -> None:
         super().__init__()
         self.ctx = ctx
-        # self.q = ctx.pubsub.subscribe()
-        self.frame_queue = asyncio.Queue()  # Queue for AudioFrames
-        self._timestamp = 0
-        self._sample_rate = 48000
-        self._frame_duration = 0.01  # in seconds
-        self._samples_per_frame = int(self._sample_rate * self._frame_duration)
-        self._running = True
-
-        # Start the frame processing task
-        self._process_task = asyncio.create_task(self._audio_frame_generator())
+        self._buffer = bytearray()
+        """Audio waiting to be sent. Only ever contains whole samples."""
+        self._playing = False
+        self._flush_tail = False
+        """Whether the audio remaining in the buffer (less than a frame) should be sent padded with silence. Set once a response's audio is done."""
+        self._interrupted_response_id: str | None = None
+        self._response_id: str | None = None
+        self._start: float | None = None
+        self._pts = 0
+        self._silence = bytes(FRAME_SIZE)
+        # NOTE: the frame is reused as `RTCRtpSender` encodes every frame before requesting the next one
+        self._frame = AudioFrame(format="s16", layout="mono", samples=SAMPLES_PER_FRAME)
+        self._frame.sample_rate = SAMPLE_RATE
+        self._frame.time_base = Fraction(1, SAMPLE_RATE)
+
+        self._process_task = asyncio.create_task(self._audio_receiver())
 
     async def recv(self) -> AudioFrame:
-        """Receive the next audio frame."""
-        if not self._running:
-            raise MediaStreamError("Track has ended")  # noqa: EM101
+        if self.readyState != "live":
+            raise MediaStreamError
 
-        try:
-            frame = await self.frame_queue.get()
-            await asyncio.sleep(FRAME_DELAY)
-        except asyncio.CancelledError as e:
-            raise MediaStreamError("Track has ended") from e  # noqa: EM101
+        if self._start is None:
+            self._start = time.monotonic()
         else:
-            return frame
-
-    async def _audio_frame_generator(self) -> None:
-        """Process incoming numpy arrays and split them into AudioFrames."""
-        try:
-            async for event in self.ctx.pubsub.subscribe_to("response.audio.delta"):
-                assert isinstance(event, ResponseAudioDeltaEvent)
-
-                if not self._running:
-                    return
-
-                # copied from `input_audio_buffer.append` handler
-                audio_array = audio_samples_from_file(io.BytesIO(base64.b64decode(event.delta)))
-                audio_array = resample_audio_data(audio_array, 24000, 48000)
-
-                # Convert to int16 if not already
-                if audio_array.dtype != np.int16:
-                    audio_array = (audio_array * 32767).astype(np.int16)
-
-                # Split the array into frame-sized chunks
-                frames = self._split_into_frames(audio_array)
-
-                # Create AudioFrames and add them to the frame queue
-                logger.info(f"Received audio: {len(audio_array)} samples")
-                logger.info(f"Split into {len(frames)} frames")
-                for frame_data in frames:
-                    frame = self._create_frame(frame_data)
-                    self.frame_queue.put_nowait(frame)
-
-        except asyncio.CancelledError:
-            logger.warning("Audio frame generator task cancelled")
-
-    def _split_into_frames(self, audio_array: np.ndarray) -> list[np.ndarray]:
-        # Ensure the array is 1D
-        if len(audio_array.shape) > 1:
-            audio_array = audio_array.flatten()
-
-        # Calculate number of complete frames
-        n_frames = len(audio_array) // self._samples_per_frame
-
-        frames = []
-        for i in range(n_frames):
-            start = i * self._samples_per_frame
-            end = start + self._samples_per_frame
-            frame = audio_array[start:end]
-            frames.append(frame)
-
-        remaining = len(audio_array) % self._samples_per_frame
-        if remaining > 0:
-            logger.info(f"Processing remaining {remaining} samples")
-            last_frame = audio_array[-remaining:]
-            padded_frame = np.pad(last_frame, (0, self._samples_per_frame - remaining), "constant", constant_values=0)
-            logger.info(f"Padded frame range: {padded_frame.min()}, {padded_frame.max()}")
-            frames.append(padded_frame)
-
-        return frames
-
-    def _create_frame(self, frame_data: np.ndarray) -> AudioFrame:
-        """Create an AudioFrame from numpy array data.
-
-        Args:
-            frame_data: Numpy array containing exactly samples_per_frame samples
-
-        Returns:
-            AudioFrame object
-
-        """
-        frame = AudioFrame(
-            format="s16",
-            layout="mono",
-            samples=self._samples_per_frame,
+            self._pts += SAMPLES_PER_FRAME
+            wait = self._start + self._pts / SAMPLE_RATE - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        data = self._next_frame_data()
+        if data is not self._silence and self._response_id is not None:
+            self.ctx.turn_tracker.mark_response("first_audio_sent", self._response_id)
+        self._frame.pts = self._pts
+        self._frame.planes[0].update(data)
+        return self._frame
+
+    def _next_frame_data(self) -> bytes:
+        if not self._playing and (len(self._buffer) >= PREBUFFER_FRAMES * FRAME_SIZE or self._flush_tail):
+            self._playing = True
+        if not self._playing or len(self._buffer) == 0:
+            return self._silence
+
+        if len(self._buffer) >= FRAME_SIZE:
+            data = bytes(self._buffer[:FRAME_SIZE])
+            del self._buffer[:FRAME_SIZE]
+        elif self._flush_tail:
+            data = bytes(self._buffer) + self._silence[len(self._buffer) :]
+            self._buffer.clear()
+        else:
+            # NOTE: audio is being produced slower than realtime. Wait for the buffer to fill back up, keeping the partial frame for later
+            logger.debug(f"Audio buffer underrun ({len(self._buffer)} bytes buffered)")
+            self._playing = False
+            return self._silence
+
+        if len(self._buffer) == 0 and self._flush_tail:
+            self._playing = False
+            self._flush_tail = False
+        return data
+
+    def flush(self) -> None:
+        """Discard all of the audio that hasn't been sent yet. The rest of the audio of the response being played is dropped as well."""
+        logger.info(f"Flushing {len(self._buffer) // SAMPLE_WIDTH} samples of unsent audio")
+        self._interrupted_response_id = self._response_id
+        self._buffer.clear()
+        self._playing = False
+        self._flush_tail = False
+
+    async def _audio_receiver(self) -> None:
+        subscription = self.ctx.pubsub.subscribe(
+            "response.audio.delta",
+            "response.audio.done",
+            "response.done",
+            "input_audio_buffer.speech_started",
+            maxsize=0,
         )
-        frame.sample_rate = self._sample_rate
-
-        # Convert numpy array to bytes and update frame
-        frame.planes[0].update(frame_data.tobytes())
-
-        # Set timestamp
-        frame.pts = self._timestamp
-        self._timestamp += self._samples_per_frame
-
-        return frame
+        try:
+            while True:
+                event = await subscription.get()
+                if isinstance(event, ResponseAudioDeltaEvent | ResponseAudioDoneEvent):
+                    if event.response_id == self._interrupted_response_id:
+                        continue
+                    if isinstance(event, ResponseAudioDeltaEvent):
+                        self._response_id = event.response_id
+                        self._buffer += event.audio_bytes
+                        self._flush_tail = False
+                        logger.debug(f"Buffered {len(event.audio_bytes) // SAMPLE_WIDTH} samples of audio")
+                    else:
+                        self._flush_tail = True
+                elif isinstance(event, ResponseDoneEvent):
+                    if event.response.status == "cancelled" and event.response.id == self._response_id:
+                        self.flush()
+                # NOTE: the audio of a response that has already been fully generated may still be playing, so it's flushed even if there's no active response to cancel
+                elif self.ctx.session.turn_detection is not None and self.ctx.session.turn_detection.interrupt_response:
+                    self.flush()
+        finally:
+            self.ctx.pubsub.unsubscribe(subscription)
 
     def stop(self) -> None:
-        """Stop the audio track and cleanup."""
-        self._running = False
-        if hasattr(self, "_process_task"):
-            self._process_task.cancel()
+        self._process_task.cancel()
         super().stop()
-
-
-class MediaStreamError(Exception):
-    pass
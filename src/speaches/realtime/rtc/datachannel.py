@@ -0,0 +1,103 @@
+"""Binary data channel transport.
+
+Clients opt in by creating the data channel with the `speaches.binary.v1` protocol, e.g. `pc.createDataChannel("oai-events", {protocol: "speaches.binary.v1"})`. Otherwise the legacy transport, in which every event is base64 encoded and wrapped into (possibly fragmented) `full_message`/`partial_message` JSON objects, is used.
+
+In the binary transport, every event is sent as a UTF-8 JSON binary message prefixed with a single flags byte:
+
+    | flags (u8) | payload |
+
+- `FLAG_DEFLATE` (0x01): the payload is compressed with raw deflate (RFC 1951; `DecompressionStream("deflate-raw")` in browsers). Only set on the first fragment, and applies to the reassembled payload.
+- `FLAG_MORE_FRAGMENTS` (0x02): the message didn't fit into the negotiated maximum message size, and the following message(s) continue the payload. The data channel is reliable and ordered, so the fragments arrive back-to-back.
+
+Clients may send events in the same format.
+"""
+
+import zlib
+
+from aiortc.rtcsctptransport import RTCSctpTransport
+from aiortc.sdp import SessionDescription
+
+BINARY_PROTOCOL = "speaches.binary.v1"
+FLAG_DEFLATE = 0x01
+FLAG_MORE_FRAGMENTS = 0x02
+HEADER_SIZE = 1
+# https://datatracker.ietf.org/doc/html/rfc8841#section-6. Used when the offer doesn't specify `a=max-message-size`
+DEFAULT_REMOTE_MAX_MESSAGE_SIZE = 65536
+MAX_DECODED_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def negotiate_max_message_size(offer_sdp: str) -> int:
+    """The largest message that both peers can handle, based on the `a=max-message-size` attribute of the offer."""
+    local_max_message_size = RTCSctpTransport.getCapabilities().maxMessageSize
+    remote_max_message_size = DEFAULT_REMOTE_MAX_MESSAGE_SIZE
+    for media in SessionDescription.parse(offer_sdp).media:
+        if media.kind == "application" and media.sctpCapabilities is not None:
+            # NOTE: 0 means that the remote peer can handle messages of any size
+            remote_max_message_size = media.sctpCapabilities.maxMessageSize or local_max_message_size
+    return min(local_max_message_size, remote_max_message_size)
+
+
+def encode_binary_message(message: bytes, *, max_message_size: int, deflate_min_size: int | None) -> list[bytes]:
+    """Encode a message into one or more data channel messages, each of which is at most `max_message_size` bytes."""
+    flags = 0
+    if deflate_min_size is not None and len(message) >= deflate_min_size:
+        compressed_message = zlib.compress(message, wbits=-zlib.MAX_WBITS)
+        if len(compressed_message) < len(message):
+            message = compressed_message
+            flags |= FLAG_DEFLATE
+
+    fragment_size = max_message_size - HEADER_SIZE
+    if len(message) <= fragment_size:
+        return [bytes((flags,)) + message]
+
+    fragments: list[bytes] = []
+    for start in range(0, len(message), fragment_size):
+        end = start + fragment_size
+        fragment_flags = flags if start == 0 else 0
+        if end < len(message):
+            fragment_flags |= FLAG_MORE_FRAGMENTS
+        fragments.append(bytes((fragment_flags,)) + message[start:end])
+    return fragments
+
+
+class BinaryMessageDecoder:
+    """Reassembles (and decompresses) the binary messages received over a single data channel."""
+
+    def __init__(self) -> None:
+        self._fragments: list[bytes] = []
+        self._size = 0
+        self._deflated = False
+
+    def feed(self, data: bytes) -> bytes | None:
+        """Returns the decoded message once all of its fragments have been received."""
+        if len(data) < HEADER_SIZE:
+            msg = "Received an empty binary message"
+            raise ValueError(msg)
+        flags = data[0]
+        if len(self._fragments) == 0:
+            self._deflated = bool(flags & FLAG_DEFLATE)
+        self._fragments.append(data[HEADER_SIZE:])
+        self._size += len(data) - HEADER_SIZE
+        if self._size > MAX_DECODED_MESSAGE_SIZE:
+            self._reset()
+            raise ValueError(f"Message exceeds the maximum size of {MAX_DECODED_MESSAGE_SIZE} bytes")
+        if flags & FLAG_MORE_FRAGMENTS:
+            return None
+
+        message = b"".join(self._fragments)
+        deflated = self._deflated
+        self._reset()
+        if deflated:
+            decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+            try:
+                message = decompressor.decompress(message, MAX_DECODED_MESSAGE_SIZE)
+            except zlib.error as e:
+                raise ValueError(f"Failed to decompress the message: {e}") from e
+            if decompressor.unconsumed_tail:
+                raise ValueError(f"Message exceeds the maximum size of {MAX_DECODED_MESSAGE_SIZE} bytes")
+        return message
+
+    def _reset(self) -> None:
+        self._fragments = []
+        self._size = 0
+        self._deflated = False
@@ -25,6 +25,7 @@ def create_session_object_configuration(model: str) -> Session:
             prefix_padding_ms=0,
             silence_duration_ms=550,
             create_response=True,
+            interrupt_response=True,
         ),
         temperature=0.8,
         tools=[],
@@ -41,12 +41,23 @@ def unsupported_field_error(field: str) -> ErrorEvent:
     )
 
 
+# NOTE: WebRTC sessions always exchange audio through Opus encoded media tracks
+WEBRTC_AUDIO_FORMAT_FIELDS = (
+    "input_audio_format",
+    "input_audio_sample_rate",
+    "output_audio_format",
+    "output_audio_sample_rate",
+)
+
+
 @event_router.register("session.update")
 def handle_session_update_event(ctx: SessionContext, event: SessionUpdateEvent) -> None:
-    if event.session.input_audio_format != NOT_GIVEN:
-        ctx.pubsub.publish_nowait(unsupported_field_error("session.input_audio_format"))
-    if event.session.output_audio_format != NOT_GIVEN:
-        ctx.pubsub.publish_nowait(unsupported_field_error("session.output_audio_format"))
+    exclude: dict = {"turn_detection": {"prefix_padding_ms"}}
+    if ctx.transport == "webrtc":
+        for field in WEBRTC_AUDIO_FORMAT_FIELDS:
+            if getattr(event.session, field) != NOT_GIVEN:
+                ctx.pubsub.publish_nowait(unsupported_field_error(f"session.{field}"))
+            exclude[field] = True
     if (
         event.session.turn_detection is not None
         and isinstance(event.session.turn_detection, TurnDetection)
@@ -58,7 +69,7 @@ def handle_session_update_event(ctx: SessionContext, event: SessionUpdateEvent)
     session_update_dict = event.session.model_dump(
         exclude_defaults=True,
         # https://docs.pydantic.dev/latest/concepts/serialization/#advanced-include-and-exclude
-        exclude={"input_audio_format": True, "output_audio_format": True, "turn_detection": {"prefix_padding_ms"}},
+        exclude=exclude,
     )
 
     logger.debug(f"Applying session configuration update: {session_update_dict}")
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Literal
+
+import numpy as np
+from openai.types.beta.realtime.error_event import Error
+from pydantic import BaseModel, computed_field
+
+from speaches.realtime.utils import task_done_callback
+from speaches.types.realtime import ErrorEvent
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from speaches.config import RealtimeConfig
+    from speaches.realtime.context import SessionContext
+
+type Transport = Literal["websocket", "webrtc"]
+
+# NOTE: memory limits and idle timeouts are enforced with (at most) this much of a delay
+REAPER_INTERVAL_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:  # noqa: ANN401
+    """Rough estimate of the number of bytes held by `value`. Only strings, binary data and arrays (the things that actually grow during a session, such as audio and transcripts) are counted."""
+    match value:
+        case str() | bytes() | memoryview():
+            return len(value)
+        case np.ndarray():
+            return value.nbytes
+        case BaseModel():
+            size = sum(estimate_size(field_value) for field_value in value.__dict__.values())
+            if value.__pydantic_private__ is not None:
+                size += sum(estimate_size(private_value) for private_value in value.__pydantic_private__.values())
+            return size
+        case list() | tuple():
+            return sum(estimate_size(item) for item in value)
+        case dict():
+            return sum(estimate_size(item) for item in value.values())
+        case _:
+            return 0
+
+
+class SessionMemoryUsage(BaseModel):
+    """Approximate number of bytes held by a session."""
+
+    input_audio_buffers: int
+    event_history: int
+    conversation: int
+
+    @computed_field
+    @property
+    def total(self) -> int:
+        return self.input_audio_buffers + self.event_history + self.conversation
+
+
+def session_memory_usage(ctx: SessionContext) -> SessionMemoryUsage:
+    return SessionMemoryUsage(
+        input_audio_buffers=sum(buffer.data.nbytes for buffer in ctx.input_audio_buffers.values()),
+        event_history=sum(estimate_size(event) for event in ctx.pubsub.events),
+        conversation=sum(estimate_size(item) for item in ctx.conversation.items.values()),
+    )
+
+
+def release_input_audio_buffer(ctx: SessionContext, item_id: str) -> None:
+    """Free the audio of a transcribed input audio buffer. The `retained_input_audio_buffers` most recently transcribed buffers are kept."""
+    ctx.transcribed_input_audio_buffer_ids.append(item_id)
+    while len(ctx.transcribed_input_audio_buffer_ids) > ctx.realtime_config.retained_input_audio_buffers:
+        ctx.input_audio_buffers.pop(ctx.transcribed_input_audio_buffer_ids.popleft(), None)
+
+
+class SessionInfo(BaseModel):
+    id: str
+    model: str
+    transport: Transport
+    duration_seconds: float
+    idle_seconds: float
+    memory: SessionMemoryUsage
+
+
+class RegisteredSession:
+    def __init__(self, ctx: SessionContext, close: Callable[[], Awaitable[None]]) -> None:
+        self.ctx = ctx
+        self.close = close
+        """Closes the session's connection. The transport is expected to `unregister` the session once it's closed."""
+        self.closing = False
+
+
+class SessionRegistry:
+    """Keeps track of the active realtime sessions, and closes the ones that are idle or hold too much memory."""
+
+    def __init__(self, config: RealtimeConfig) -> None:
+        self.config = config
+        self.sessions: dict[str, RegisteredSession] = {}
+        self._reaper_task: asyncio.Task[None] | None = None
+
+    def register(self, ctx: SessionContext, *, close: Callable[[], Awaitable[None]]) -> None:
+        assert ctx.session.id not in self.sessions, ctx.session.id
+        self.sessions[ctx.session.id] = RegisteredSession(ctx, close)
+        # NOTE: the reaper only runs while there are active sessions
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._run_reaper(), name="session_reaper")
+            self._reaper_task.add_done_callback(task_done_callback)
+
+    def unregister(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+
+    def info(self) -> list[SessionInfo]:
+        now = time.monotonic()
+        return [
+            SessionInfo(
+                id=session.ctx.session.id,
+                model=session.ctx.session.model,
+                transport=session.ctx.transport,
+                duration_seconds=now - session.ctx.created_at,
+                idle_seconds=now - session.ctx.last_activity_at,
+                memory=session_memory_usage(session.ctx),
+            )
+            for session in self.sessions.values()
+        ]
+
+    def _exceeds_memory_limit(self, ctx: SessionContext) -> bool:
+        if self.config.max_session_memory_bytes is None:
+            return False
+        memory_usage = session_memory_usage(ctx)
+        if memory_usage.total <= self.config.max_session_memory_bytes:
+            return False
+        # NOTE: the event history and the retained input audio are only kept for debugging, so they are freed before resorting to closing the session
+        logger.warning(
+            f"Session '{ctx.session.id}' exceeds the memory limit ({memory_usage}). Freeing its event history"
+        )
+        ctx.pubsub.events.clear()
+        for item_id in ctx.transcribed_input_audio_buffer_ids:
+            ctx.input_audio_buffers.pop(item_id, None)
+        ctx.transcribed_input_audio_buffer_ids.clear()
+        return session_memory_usage(ctx).total > self.config.max_session_memory_bytes
+
+    async def reap(self) -> None:
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            if session.closing:
+                continue
+            ctx = session.ctx
+            if (
+                self.config.session_idle_timeout_seconds is not None
+                and now - ctx.last_activity_at > self.config.session_idle_timeout_seconds
+            ):
+                logger.info(
+                    f"Closing session '{ctx.session.id}' as it has been idle for {now - ctx.last_activity_at:.0f} seconds"
+                )
+                error = Error(
+                    type="invalid_request_error",
+                    code="session_idle_timeout",
+                    message="Session has been idle for too long",
+                )
+            elif self._exceeds_memory_limit(ctx):
+                logger.warning(f"Closing session '{ctx.session.id}' as it exceeds the memory limit")
+                error = Error(
+                    type="server_error",
+                    code="session_memory_limit_exceeded",
+                    message="Session exceeded the memory limit",
+                )
+            else:
+                continue
+            session.closing = True
+            ctx.pubsub.publish_nowait(ErrorEvent(error=error))
+            try:
+                await session.close()
+            except Exception:
+                logger.exception(f"Failed to close session '{ctx.session.id}'")
+                self.unregister(ctx.session.id)
+
+    async def _run_reaper(self) -> None:
+        while len(self.sessions) > 0:
+            await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+            await self.reap()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from speaches import metrics
+from speaches.realtime.chat_utils import create_completion_params
+from speaches.realtime.input_audio_buffer import MS_SAMPLE_RATE
+from speaches.realtime.utils import task_done_callback
+from speaches.types.realtime import ConversationItemContentInputAudio, ConversationItemMessage, Response
+
+if TYPE_CHECKING:
+    import openai
+    from openai.resources.chat import AsyncCompletions
+    from openai.types.chat import ChatCompletionChunk
+    from openai.types.chat.completion_create_params import CompletionCreateParamsStreaming
+
+    from speaches.realtime.conversation_event_router import Conversation
+    from speaches.realtime.input_audio_buffer import InputAudioBuffer
+    from speaches.services.transcription import TranscriptionService
+    from speaches.types.realtime import Session
+
+logger = logging.getLogger(__name__)
+
+speculative_turns_counter = metrics.counter(
+    "speaches.realtime.speculative_turns",
+    description="Speculative turns by outcome. The hit rate is `promoted / (promoted + cancelled)`.",
+)
+speculative_completions_counter = metrics.counter(
+    "speaches.realtime.speculative_completions",
+    description="Chat completion requests of promoted speculative turns by whether they could be reused.",
+)
+speculative_lead_time_histogram = metrics.histogram(
+    "speaches.realtime.speculative_turn.lead_time",
+    description="Time between a speculative turn being started and it being promoted.",
+)
+
+
+class SpeculativeTurn:
+    """Work started on an end-of-turn candidate, before the turn detection has confirmed that the user finished speaking.
+
+    The audio spoken so far is transcribed and, if the session creates responses automatically, the chat completion request is sent. Once the turn ends, the transcriber and the response handler pick up the results instead of starting from scratch. If the user resumes speaking instead, the speculative work is cancelled.
+    """
+
+    def __init__(
+        self,
+        *,
+        transcription_service: TranscriptionService,
+        completion_client: AsyncCompletions,
+        session: Session,
+        conversation: Conversation,
+        input_audio_buffer: InputAudioBuffer,
+    ) -> None:
+        assert input_audio_buffer.vad_state.audio_start_ms is not None
+        self.item_id = input_audio_buffer.id
+        self.transcription_service = transcription_service
+        self.completion_client = completion_client
+        self.session = session
+        self.conversation = conversation
+        self.audio = input_audio_buffer.data[input_audio_buffer.vad_state.audio_start_ms * MS_SAMPLE_RATE :]
+        self.started_at = time.perf_counter()
+        self.promoted = False
+        self.completion_params: CompletionCreateParamsStreaming | None = None
+
+        self.transcription_task = asyncio.create_task(self._transcribe(), name="speculative_transcription")
+        self.transcription_task.add_done_callback(task_done_callback)
+        self.completion_task: asyncio.Task[openai.AsyncStream[ChatCompletionChunk]] | None = None
+        if session.turn_detection is not None and session.turn_detection.create_response:
+            self.completion_task = asyncio.create_task(self._create_completion(), name="speculative_completion")
+            self.completion_task.add_done_callback(task_done_callback)
+        self._close_task: asyncio.Task[None] | None = None
+
+    async def _transcribe(self) -> str:
+        return await self.transcription_service.transcribe(
+            self.audio,
+            model=self.session.input_audio_transcription.model,
+            language=self.session.input_audio_transcription.language,
+        )
+
+    async def _create_completion(self) -> openai.AsyncStream[ChatCompletionChunk]:
+        transcript = await self.transcription_task
+        # NOTE: mirrors the item that `InputAudioBufferTranscriber` adds to the conversation
+        item = ConversationItemMessage(
+            id=self.item_id,
+            role="user",
+            content=[ConversationItemContentInputAudio(transcript=transcript, type="input_audio")],
+            status="completed",
+        )
+        self.completion_params = create_completion_params(
+            self.session.model, self.conversation.chat_messages(item), Response.from_session(self.session)
+        )
+        return await self.completion_client.create(**self.completion_params)
+
+    async def take_transcript(self) -> str | None:
+        """Promote the speculative turn, returning its transcript. `None` is returned if the transcription failed."""
+        assert not self.promoted
+        self.promoted = True
+        speculative_turns_counter.add(1, {"outcome": "promoted"})
+        speculative_lead_time_histogram.record((time.perf_counter() - self.started_at) * 1000)
+        await asyncio.wait([self.transcription_task])
+        if self.transcription_task.cancelled() or self.transcription_task.exception() is not None:
+            return None
+        return self.transcription_task.result()
+
+    async def take_chunk_stream(
+        self, completion_params: CompletionCreateParamsStreaming
+    ) -> openai.AsyncStream[ChatCompletionChunk] | None:
+        """Returns the speculatively requested chat completion stream if it was requested with exactly the same parameters. Otherwise, it's closed and `None` is returned."""
+        completion_task, self.completion_task = self.completion_task, None
+        if completion_task is None:
+            return None
+        try:
+            await asyncio.wait([completion_task])
+        except asyncio.CancelledError:
+            self.completion_task = completion_task
+            self.cancel()
+            raise
+        if completion_task.cancelled() or completion_task.exception() is not None:
+            return None
+        chunk_stream = completion_task.result()
+        # NOTE: the conversation or the session may have changed since the request was sent
+        if completion_params != self.completion_params:
+            speculative_completions_counter.add(1, {"outcome": "discarded"})
+            await chunk_stream.close()
+            return None
+        speculative_completions_counter.add(1, {"outcome": "used"})
+        return chunk_stream
+
+    def cancel(self) -> None:
+        """Cancel the speculative work. Called when the user resumes speaking, or the speculative turn can't be used."""
+        if not self.promoted:
+            speculative_turns_counter.add(1, {"outcome": "cancelled"})
+        self.transcription_task.cancel()
+        completion_task, self.completion_task = self.completion_task, None
+        if completion_task is None:
+            return
+        if not completion_task.done():
+            completion_task.cancel()
+        elif not completion_task.cancelled() and completion_task.exception() is None:
+            self._close_task = asyncio.create_task(completion_task.result().close())
+            self._close_task.add_done_callback(task_done_callback)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING, Literal
+
+from speaches import metrics
+from speaches.types.realtime import TurnTimingsEvent
+
+if TYPE_CHECKING:
+    from speaches.realtime.pubsub import EventPubSub
+
+type TurnStage = Literal[
+    "speech_stopped",
+    "committed",
+    "transcription_completed",
+    "llm_first_token",
+    "tts_first_audio",
+    "first_audio_sent",
+    "response_done",
+]
+
+logger = logging.getLogger(__name__)
+
+stage_latency_histogram = metrics.histogram(
+    "speaches.realtime.turn.stage_latency",
+    description="Time from the start of a turn (`speech_stopped`, or `committed` if the input audio buffer was committed by the client) until each of its stages.",
+)
+
+
+class Turn:
+    def __init__(self, item_id: str) -> None:
+        self.item_id = item_id
+        """The ID of the user's input audio item."""
+        self.response_id: str | None = None
+        self.start = time.perf_counter()
+        self.timings_ms: dict[TurnStage, float] = {}
+        self.expects_audio_sent = False
+        self.reported = False
+
+
+class TurnTracker:
+    """Records when each stage of the session's current turn happened.
+
+    Recording a stage costs a `perf_counter` call and a histogram update, so this is always enabled. Stages of turns other than the current one (e.g. of a response that has been superseded) are ignored.
+    """
+
+    def __init__(self, pubsub: EventPubSub, *, emit_event: bool) -> None:
+        self.pubsub = pubsub
+        self.emit_event = emit_event
+        self.turn: Turn | None = None
+
+    def mark_item(self, stage: TurnStage, item_id: str) -> None:
+        """Record a stage of the user's side of the turn. A new turn is started if `item_id` differs from the current one."""
+        if self.turn is None or self.turn.item_id != item_id:
+            self.turn = Turn(item_id)
+        self._mark(self.turn, stage)
+
+    def attach_response(self, response_id: str, item_id: str | None = None) -> None:
+        """Associate a response with the current turn. Without an `item_id` the response is attached to the current turn if it doesn't have one yet."""
+        if self.turn is None or self.turn.response_id is not None:
+            return
+        if item_id is None or self.turn.item_id == item_id:
+            self.turn.response_id = response_id
+
+    def mark_response(self, stage: TurnStage, response_id: str) -> None:
+        turn = self.turn
+        if turn is not None and turn.response_id == response_id and stage not in turn.timings_ms:
+            self._mark(turn, stage)
+
+    def response_done(self, response_id: str, *, completed: bool) -> None:
+        turn = self.turn
+        if turn is None or turn.response_id != response_id:
+            return
+        # NOTE: audio of a completed response may still be waiting to be sent (e.g. buffered by the WebRTC audio track)
+        turn.expects_audio_sent = completed and "tts_first_audio" in turn.timings_ms
+        self._mark(turn, "response_done")
+
+    def _mark(self, turn: Turn, stage: TurnStage) -> None:
+        if stage in turn.timings_ms:
+            return
+        latency_ms = (time.perf_counter() - turn.start) * 1000
+        turn.timings_ms[stage] = latency_ms
+        stage_latency_histogram.record(latency_ms, {"stage": stage})
+
+        if (
+            not turn.reported
+            and "response_done" in turn.timings_ms
+            and ("first_audio_sent" in turn.timings_ms or not turn.expects_audio_sent)
+        ):
+            turn.reported = True
+            logger.info(f"Turn timings for '{turn.item_id}': {turn.timings_ms}")
+            if self.emit_event:
+                self.pubsub.publish_nowait(
+                    TurnTimingsEvent(
+                        item_id=turn.item_id,
+                        response_id=turn.response_id,
+                        timings_ms={str(stage): latency_ms for stage, latency_ms in turn.timings_ms.items()},
+                    )
+                )
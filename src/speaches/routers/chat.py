@@ -1,45 +1,61 @@
+import asyncio
 import base64
 from collections.abc import AsyncGenerator
 from datetime import UTC, datetime, timedelta
+import hashlib
 from io import BytesIO
 import logging
 import time
-from typing import Annotated, Self
+from typing import TYPE_CHECKING, Annotated, Self
 from uuid import uuid4
 
 import aiostream
 from cachetools import TTLCache
-from fastapi import APIRouter, Body, Response
+from fastapi import APIRouter, Body, HTTPException, Response
 from fastapi.responses import StreamingResponse
+from faster_whisper.audio import decode_audio
 import openai
 from openai import AsyncStream
-from openai.resources.audio import AsyncSpeech
 from openai.types.chat import (
     ChatCompletion,
     ChatCompletionAudio,
     ChatCompletionChunk,
+    ChatCompletionMessage,
+    ChatCompletionMessageToolCall,
 )
 from openai.types.chat.chat_completion import Choice
 from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice
 from openai.types.chat.chat_completion_chunk import ChoiceDelta
+from openai.types.chat.chat_completion_message_tool_call import Function
 from pydantic import Field, model_validator
 
 from speaches import text_utils
+from speaches.audio import convert_audio_format, packetize_audio
 from speaches.dependencies import (
     CompletionClientDependency,
-    SpeechClientDependency,
-    TranscriptionClientDependency,
+    ConfigDependency,
+    SpeechServiceDependency,
+    TranscriptionServiceDependency,
+    TranscriptStoreDependency,
 )
 from speaches.routers.stt import format_as_sse
-from speaches.text_utils import SentenceChunker
+from speaches.services.speech import SpeechService
+from speaches.services.transcription import TranscriptionService
+from speaches.text_utils import AdaptiveChunker, TextChunker
+from speaches.transcript_store import TranscriptStore
 from speaches.types.chat import (
     ChatCompletionAssistantMessageParam,
+    ChatCompletionContentPartInputAudioParam,
     ChatCompletionContentPartTextParam,
+    ChatCompletionStreamOptionsParam,
 )
 from speaches.types.chat import (
     CompletionCreateParamsBase as OpenAICompletionCreateParamsBase,
 )
-from speaches.utils import APIProxyError
+from speaches.utils import APIProxyError, pipelined_stream
+
+if TYPE_CHECKING:
+    from openai.types.completion_usage import CompletionUsage
 
 # Resources:
 # - https://platform.openai.com/docs/guides/audio
@@ -48,12 +64,17 @@ from speaches.utils import APIProxyError
 DEFAULT_SPEECH_MODEL = "tts-1"  # or "tts-1-hd"
 # https://platform.openai.com/docs/api-reference/audio/createTranscription#audio-createtranscription-model
 DEFAULT_TRANSCRIPTION_MODEL = "whisper-1"
+# NOTE: the sample rate of `pcm16` audio defined in the API spec
+SPEECH_SAMPLE_RATE = 24000
 AUDIO_TRANSCRIPTION_CACHE_SIZE = 4096
 AUDIO_TRANSCRIPTION_TTL_SECONDS = 60 * 60
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["voice-chat"])
-cache: TTLCache[str, str] = TTLCache(maxsize=AUDIO_TRANSCRIPTION_CACHE_SIZE, ttl=AUDIO_TRANSCRIPTION_TTL_SECONDS)
+# NOTE: maps (transcription model, hash of the audio) to the transcript of `input_audio` content parts. Clients send the whole chat history with every request, so without it the same audio would be transcribed over and over again
+input_audio_transcript_cache = TTLCache[tuple[str, str], str](
+    maxsize=AUDIO_TRANSCRIPTION_CACHE_SIZE, ttl=AUDIO_TRANSCRIPTION_TTL_SECONDS
+)
 
 
 # NOTE: OpenAI doesn't use UUIDs
@@ -67,6 +88,10 @@ def generate_chat_completion_id() -> str:
     return "chatcmpl-" + str(uuid4())
 
 
+def audio_expires_at(ttl_seconds: int) -> int:
+    return int((datetime.now(UTC) + timedelta(seconds=ttl_seconds)).timestamp())
+
+
 # TODO: support model aliasing
 class CompletionCreateParamsBase(OpenAICompletionCreateParamsBase):
     stream: bool = False
@@ -97,31 +122,45 @@ def transform_choice_delta(choice_delta: ChoiceDelta) -> ChoiceDelta:
     return choice_delta
 
 
-# FIXME: do not pass in `body`
-async def transform_choice(speech_client: AsyncSpeech, choice: Choice, body: CompletionCreateParamsBase) -> Choice:
-    assert body.audio is not None
-    # HACK: because OpenAI alternates between `pcm16`(/v1/chat/completions) and `pcm`(/v1/audio/speech)
-    audio_format = "pcm" if body.audio.format == "pcm16" else body.audio.format
-
-    if choice.message.content is None:
-        return choice
-    res = await speech_client.create(
-        input=choice.message.content,
-        model=body.speech_model,
-        voice=body.audio.voice,  # pyright: ignore[reportArgumentType]
-        response_format=audio_format,
-    )
-    audio_bytes = res.read()
-    audio_id = generate_audio_id()
-    cache[audio_id] = choice.message.content
-    choice.message.audio = ChatCompletionAudio(
-        id=audio_id,
-        data=base64.b64encode(audio_bytes).decode("utf-8"),
-        transcript=choice.message.content,
-        expires_at=int((datetime.now(UTC) + timedelta(seconds=AUDIO_TRANSCRIPTION_TTL_SECONDS)).timestamp()),
-    )
-    choice.message.content = None
-    return choice
+async def transcribe_input_audio_parts(
+    transcription_service: TranscriptionService,
+    content_parts: list[ChatCompletionContentPartInputAudioParam],
+    *,
+    model: str,
+    max_concurrency: int,
+) -> list[str]:
+    """Transcribe the audio of the content parts concurrently. Audio that has already been transcribed (either in a previous request or within `content_parts`) isn't transcribed again."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks: dict[str, asyncio.Task[str]] = {}
+
+    async def transcribe(audio_bytes: bytes, cache_key: tuple[str, str]) -> str:
+        async with semaphore:
+            # NOTE: the container format is detected while decoding, so `input_audio.format` isn't needed. Decoding is blocking, so it's offloaded to a thread
+            audio = await asyncio.to_thread(decode_audio, BytesIO(audio_bytes))
+            transcript = await transcription_service.transcribe(audio, model=model)  # pyright: ignore[reportArgumentType]
+        input_audio_transcript_cache[cache_key] = transcript
+        return transcript
+
+    transcripts: dict[str, str] = {}
+    audio_hashes: list[str] = []
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for content_part in content_parts:
+                audio_bytes = base64.b64decode(content_part.input_audio.data)
+                audio_hash = hashlib.sha256(audio_bytes).hexdigest()
+                audio_hashes.append(audio_hash)
+                if audio_hash in tasks or audio_hash in transcripts:
+                    continue
+                transcript = input_audio_transcript_cache.get((model, audio_hash))
+                if transcript is not None:
+                    transcripts[audio_hash] = transcript
+                    continue
+                tasks[audio_hash] = tg.create_task(transcribe(audio_bytes, (model, audio_hash)))
+    except* Exception as e:  # noqa: BLE001
+        # NOTE: the task group wraps the errors in an `ExceptionGroup`. The original error (e.g. an `HTTPException` or an audio decoding error) is re-raised so that it's handled the same way as if the audio had been transcribed sequentially
+        raise e.exceptions[0] from None
+    transcripts.update({audio_hash: task.result() for audio_hash, task in tasks.items()})
+    return [transcripts[audio_hash] for audio_hash in audio_hashes]
 
 
 # TODO: document minor deviations from OAI
@@ -130,34 +169,72 @@ class AudioChatStream:
     def __init__(
         self,
         chat_completion_chunk_stream: AsyncStream[ChatCompletionChunk],
-        speech_client: AsyncSpeech,
-        sentence_chunker: SentenceChunker,
+        speech_service: SpeechService,
+        sentence_chunker: TextChunker,
         body: CompletionCreateParamsBase,  # FIXME: do not pass in `body`
+        transcript_store: TranscriptStore,
+        transcript_ttl_seconds: int,
+        speech_synthesis_concurrency: int = 1,
+        audio_packet_duration_ms: int | None = None,
+        audio_packet_max_hold_ms: int | None = None,
+        early_first_chunk: bool = False,
     ) -> None:
         self.chat_completion_chunk_stream = chat_completion_chunk_stream
-        self.speech_client = speech_client
+        self.speech_service = speech_service
+        self.speech_synthesis_concurrency = speech_synthesis_concurrency
+        self.audio_packet_duration_ms = audio_packet_duration_ms
+        self.audio_packet_max_hold_ms = audio_packet_max_hold_ms
+        self.early_first_chunk = early_first_chunk
+        self.synthesized_sentences = 0
         self.sentence_chunker = sentence_chunker  # NOTE: this should be for every choice is I want to support n > 1
         self.body = body
+        self.transcript_store = transcript_store
         self.audio_id = generate_audio_id()
-        self.expires_at = int((datetime.now(UTC) + timedelta(seconds=AUDIO_TRANSCRIPTION_TTL_SECONDS)).timestamp())
-        self.chat_completion_id: str
-        self.created: int
+        self.expires_at = audio_expires_at(transcript_ttl_seconds)
+        self.transcript = ""
+        # NOTE: overwritten by the values of the upstream chunks. The fallbacks are used if none of the chunks has any choices
+        self.chat_completion_id = generate_chat_completion_id()
+        self.created = int(time.time())
+        # NOTE: the fields below are only used to assemble the non-streamed response (see `chat_completion`)
+        self.model: str | None = None
+        self.finish_reason: str | None = None
+        self.usage: CompletionUsage | None = None
+        self.tool_calls: dict[int, ChatCompletionMessageToolCall] = {}
+
+    def accumulate_tool_calls(self, choice_delta: ChoiceDelta) -> None:
+        for tool_call_delta in choice_delta.tool_calls or []:
+            tool_call = self.tool_calls.setdefault(
+                tool_call_delta.index,
+                ChatCompletionMessageToolCall(id="", type="function", function=Function(name="", arguments="")),
+            )
+            if tool_call_delta.id is not None:
+                tool_call.id = tool_call_delta.id
+            if tool_call_delta.function is not None:
+                tool_call.function.name += tool_call_delta.function.name or ""
+                tool_call.function.arguments += tool_call_delta.function.arguments or ""
 
     async def text_chat_completion_chunk_stream(self) -> AsyncGenerator[ChatCompletionChunk]:
         start = time.perf_counter()
         async for chunk in self.chat_completion_chunk_stream:
+            if chunk.usage is not None:
+                self.usage = chunk.usage
             if len(chunk.choices) == 0:
                 logger.warning(f"Received a chunk with no choices: {chunk}")
                 continue
             self.chat_completion_id = chunk.id
             self.created = chunk.created
+            self.model = chunk.model
             choice = chunk.choices[0]
+            if choice.finish_reason is not None:
+                self.finish_reason = choice.finish_reason
+            self.accumulate_tool_calls(choice.delta)
             assert self.body.modalities is not None
             if "audio" not in self.body.modalities:  # do not transform the choice if audio is not in the modalities
                 yield chunk
                 continue
             if choice.delta.content is not None:
                 self.sentence_chunker.add_token(choice.delta.content)
+                self.transcript += choice.delta.content
                 choice.delta = transform_choice_delta(choice.delta)
                 choice.delta.audio["id"] = self.audio_id  # pyright: ignore[reportAttributeAccessIssue]
                 choice.delta.audio["expires_at"] = self.expires_at  # pyright: ignore[reportAttributeAccessIssue]
@@ -165,13 +242,12 @@ class AudioChatStream:
             # if choice.finish_reason is None:
             yield chunk
         self.sentence_chunker.close()
+        if len(self.transcript) > 0:
+            # NOTE: the store may block (e.g. on SQLite I/O), so it's not accessed from the event loop thread
+            await asyncio.to_thread(self.transcript_store.set, self.audio_id, self.transcript)
         logger.info(f"Text generation took {time.perf_counter() - start:.2f} seconds")
 
-    async def audio_chat_completion_chunk_stream(self) -> AsyncGenerator[ChatCompletionChunk]:
-        assert self.body.audio is not None
-
-        start = time.perf_counter()
-        # TODO: parallelize
+    async def clean_sentences(self) -> AsyncGenerator[str]:
         async for sentence in self.sentence_chunker:
             sentence_clean = sentence.strip()
             sentence_clean = text_utils.strip_markdown_emphasis(sentence_clean)
@@ -180,14 +256,37 @@ class AudioChatStream:
             if len(sentence_clean) == 0:
                 logger.warning(f"Skipping empty sentence. ORIGINAL: {sentence}")
                 continue  # skip empty sentences
-            res = await self.speech_client.create(
-                input=sentence_clean,
-                model=self.body.speech_model,
-                voice=self.body.audio.voice,  # pyright: ignore[reportArgumentType]
-                response_format="pcm",
-                extra_body={"sample_rate": 24000},
+            yield sentence_clean
+
+    def synthesize_sentence(self, sentence: str) -> AsyncGenerator[bytes]:
+        assert self.body.audio is not None
+        self.synthesized_sentences += 1
+        return self.speech_service.synthesize_stream(
+            sentence,
+            model=self.body.speech_model,
+            voice=self.body.audio.voice,
+            sample_rate=SPEECH_SAMPLE_RATE,
+            # NOTE: the synthesis of the sentences after the first one overlaps with the playback of the preceding ones, so only the first one affects the time to the first audio
+            early_first_chunk=self.early_first_chunk and self.synthesized_sentences == 1,
+        )
+
+    def audio_stream(self) -> AsyncGenerator[bytes]:
+        # NOTE: upcoming sentences are synthesized while the audio of the current one is being consumed
+        return pipelined_stream(
+            self.clean_sentences(), self.synthesize_sentence, max_concurrency=self.speech_synthesis_concurrency
+        )
+
+    async def audio_chat_completion_chunk_stream(self) -> AsyncGenerator[ChatCompletionChunk]:
+        start = time.perf_counter()
+        audio_stream = self.audio_stream()
+        if self.audio_packet_duration_ms is not None:
+            audio_stream = packetize_audio(
+                audio_stream,
+                sample_rate=SPEECH_SAMPLE_RATE,
+                packet_duration_ms=self.audio_packet_duration_ms,
+                max_hold_ms=self.audio_packet_max_hold_ms,
             )
-            audio_bytes = res.read()
+        async for audio_bytes in audio_stream:
             audio_data = base64.b64encode(audio_bytes).decode("utf-8")
             delta = ChoiceDelta()
             delta.audio = {  # pyright: ignore[reportAttributeAccessIssue]
@@ -216,26 +315,83 @@ class AudioChatStream:
                 try:
                     async for chunk in stream:
                         yield chunk
-                except openai.APIStatusError:
+                # NOTE: `ValueError` is raised by the in-process speech service (e.g. when the model isn't installed)
+                except (openai.APIStatusError, ValueError):
                     logger.exception("Audio chat generation failed")
         else:
             async for chunk in self.text_chat_completion_chunk_stream():
                 yield chunk
 
+    async def chat_completion(self) -> ChatCompletion:
+        """Assemble a non-streamed chat completion with audio.
+
+        The chat completion is streamed from the upstream API, so that sentences are synthesized as soon as they are generated rather than after the whole answer is.
+        """
+        assert self.body.audio is not None
+        start = time.perf_counter()
+
+        async def consume_text() -> None:
+            async for _ in self.text_chat_completion_chunk_stream():
+                pass
+
+        async def collect_audio() -> bytes:
+            return b"".join([audio_bytes async for audio_bytes in self.audio_stream()])
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(consume_text())
+                audio_task = tg.create_task(collect_audio())
+        except* Exception as e:  # noqa: BLE001
+            # NOTE: the task group wraps the errors in an `ExceptionGroup`. The original error is re-raised so that the caller can handle it
+            raise e.exceptions[0] from None
+        logger.info(f"Text and audio generation took {time.perf_counter() - start:.2f} seconds")
+
+        message = ChatCompletionMessage(role="assistant")
+        if len(self.transcript) > 0:
+            audio_bytes = audio_task.result()
+            if self.body.audio.format != "pcm16":
+                audio_bytes = await asyncio.to_thread(
+                    convert_audio_format,
+                    audio_bytes,
+                    SPEECH_SAMPLE_RATE,
+                    self.body.audio.format,  # pyright: ignore[reportArgumentType]
+                )
+            message.audio = ChatCompletionAudio(
+                id=self.audio_id,
+                data=base64.b64encode(audio_bytes).decode("utf-8"),
+                transcript=self.transcript,
+                expires_at=self.expires_at,
+            )
+        if len(self.tool_calls) > 0:
+            message.tool_calls = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return ChatCompletion(
+            id=self.chat_completion_id,
+            choices=[Choice(index=0, finish_reason=self.finish_reason or "stop", message=message)],  # pyright: ignore[reportArgumentType]
+            created=self.created,
+            model=self.model or self.body.model,
+            object="chat.completion",
+            usage=self.usage,
+        )
+
 
 # TODO: maybe propagate 400 errors
 
 
 # https://platform.openai.com/docs/api-reference/chat/create
 @router.post("/v1/chat/completions", response_model=ChatCompletion | ChatCompletionChunk)
-async def handle_completions(  # noqa: C901
+async def handle_completions(  # noqa: C901, PLR0912, PLR0915
     chat_completion_client: CompletionClientDependency,
-    transcription_client: TranscriptionClientDependency,
-    speech_client: SpeechClientDependency,
+    transcription_service: TranscriptionServiceDependency,
+    speech_service: SpeechServiceDependency,
+    transcript_store: TranscriptStoreDependency,
+    config: ConfigDependency,
     body: Annotated[CompletionCreateParamsBase, Body()],
 ) -> Response | StreamingResponse:
     assert body.n is None or body.n == 1, "Multiple choices (`n` > 1) are not supported"
 
+    input_audio_parts: list[ChatCompletionContentPartInputAudioParam] = []
+    # where each of the `input_audio_parts` is located: (message index, content part index, message content)
+    input_audio_part_locations: list[tuple[int, int, list]] = []
     for i, message in enumerate(body.messages):
         if message.role == "user":
             content = message.content
@@ -243,22 +399,18 @@ async def handle_completions(  # noqa: C901
             if not isinstance(content, list):
                 continue
 
-            # TODO: parallelize
-            for j in range(len(content)):
-                content_part = content[j]
+            for j, content_part in enumerate(content):
                 if content_part.type == "input_audio":
-                    audio_bytes = base64.b64decode(content_part.input_audio.data)
-                    # TODO: how does the endpoint know the format lol?
-                    transcript = await transcription_client.create(
-                        file=BytesIO(audio_bytes),
-                        model=body.trancription_model,
-                        response_format="text",
-                    )
-                    content[j] = ChatCompletionContentPartTextParam(text=transcript, type="text")
-                    logger.info(f"Transcript for message {i} content part {j}: {transcript}")
+                    input_audio_parts.append(content_part)
+                    input_audio_part_locations.append((i, j, content))
 
         elif message.role == "assistant" and message.audio is not None:
-            transcript = cache[message.audio.id]
+            transcript = await asyncio.to_thread(transcript_store.get, message.audio.id)
+            if transcript is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Audio with id '{message.audio.id}' (message {i}) not found. It may have expired.",
+                )
             body.messages[i] = ChatCompletionAssistantMessageParam(
                 role="assistant",
                 content=transcript,
@@ -269,10 +421,26 @@ async def handle_completions(  # noqa: C901
                 function_call=message.function_call,
             )
 
+    if len(input_audio_parts) > 0:
+        transcripts = await transcribe_input_audio_parts(
+            transcription_service,
+            input_audio_parts,
+            model=body.trancription_model,
+            max_concurrency=config.chat_transcription_concurrency,
+        )
+        for (i, j, content), transcript in zip(input_audio_part_locations, transcripts, strict=True):
+            content[j] = ChatCompletionContentPartTextParam(text=transcript, type="text")
+            logger.info(f"Transcript for message {i} content part {j}: {transcript}")
+
     # NOTE: rather than doing a `model_copy` it might be better to override the fields when doing the `model_dump` and destructuring
     proxied_body = body.model_copy(deep=True)
     proxied_body.modalities = ["text"]
     proxied_body.audio = None
+    stream_audio_internally = not body.stream and body.modalities is not None and "audio" in body.modalities
+    if stream_audio_internally:
+        # NOTE: the upstream response is streamed even though the client wants a single response, so that speech synthesis overlaps text generation
+        proxied_body.stream = True
+        proxied_body.stream_options = ChatCompletionStreamOptionsParam(include_usage=True)
     # NOTE: Adding --use-one-literal-as-default breaks the `exclude_defaults=True` behavior
     try:
         chat_completion = await chat_completion_client.create(**proxied_body.model_dump(exclude_defaults=True))
@@ -332,19 +500,51 @@ async def handle_completions(  # noqa: C901
             ],
             debug=error_info,
         ) from e
-    if isinstance(chat_completion, AsyncStream):
+    if isinstance(chat_completion, AsyncStream) and stream_audio_internally:
+        audio_chat_stream = AudioChatStream(
+            chat_completion,
+            speech_service,
+            AdaptiveChunker(),
+            body,
+            transcript_store,
+            config.chat_transcript_ttl_seconds,
+            speech_synthesis_concurrency=config.chat_speech_synthesis_concurrency,
+            early_first_chunk=config.chat_early_first_chunk,
+        )
+        try:
+            audio_chat_completion = await audio_chat_stream.chat_completion()
+        except openai.APIError as e:
+            # NOTE: the upstream stream can fail after the chat completion has been created (e.g. the connection gets dropped)
+            logger.exception("Audio chat completion failed")
+            raise APIProxyError(
+                f"The language model API failed while generating the response: {e.message}",
+                status_code=e.status_code if isinstance(e, openai.APIStatusError) else 502,
+                hint="Retry your request.",
+                debug={"exception_type": type(e).__name__, "exception_message": e.message},
+            ) from e
+        finally:
+            await chat_completion.close()
+        return Response(content=audio_chat_completion.model_dump_json(), media_type="application/json")
+    elif isinstance(chat_completion, AsyncStream):
 
         async def inner() -> AsyncGenerator[str]:
-            audio_chat_stream = AudioChatStream(chat_completion, speech_client, SentenceChunker(), body)
+            audio_chat_stream = AudioChatStream(
+                chat_completion,
+                speech_service,
+                AdaptiveChunker(),
+                body,
+                transcript_store,
+                config.chat_transcript_ttl_seconds,
+                speech_synthesis_concurrency=config.chat_speech_synthesis_concurrency,
+                audio_packet_duration_ms=config.chat_audio_packet_duration_ms,
+                audio_packet_max_hold_ms=config.chat_audio_packet_max_hold_ms,
+                early_first_chunk=config.chat_early_first_chunk,
+            )
             async for chunk in audio_chat_stream:
                 yield format_as_sse(chunk.model_dump_json())
 
         return StreamingResponse(inner(), media_type="text/event-stream")
     elif isinstance(chat_completion, ChatCompletion):
-        for i in range(len(chat_completion.choices)):
-            if body.modalities is None or "audio" not in body.modalities:
-                continue
-            chat_completion.choices[i] = await transform_choice(speech_client, chat_completion.choices[i], body)
         return Response(content=chat_completion.model_dump_json(), media_type="application/json")
 
     raise ValueError(f"Unexpected chat completion type: {type(chat_completion)}")
@@ -1,10 +1,14 @@
+from typing import Any
+
 from fastapi import (
     APIRouter,
     Response,
 )
 
-from speaches.dependencies import WhisperModelManagerDependency
+from speaches import metrics
+from speaches.dependencies import SessionRegistryDependency, WhisperModelManagerDependency
 from speaches.model_aliases import ModelId
+from speaches.realtime.session_registry import SessionInfo
 
 router = APIRouter()
 
@@ -44,3 +48,17 @@ def stop_running_model(model_manager: WhisperModelManagerDependency, model_id: s
                 return Response(status_code=404, content="Model not found")
             case ValueError():
                 return Response(status_code=409, content=str(e))
+
+
+@router.get("/api/metrics", tags=["diagnostic"], summary="Get a snapshot of the in-process metrics.")
+async def get_metrics() -> dict[str, dict[str, Any]]:
+    return metrics.snapshot()
+
+
+@router.get(
+    "/api/realtime/sessions",
+    tags=["diagnostic"],
+    summary="Get a list of the active realtime sessions and their approximate memory usage.",
+)
+async def get_realtime_sessions(session_registry: SessionRegistryDependency) -> list[SessionInfo]:
+    return session_registry.info()
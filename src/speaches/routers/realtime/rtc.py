@@ -2,7 +2,7 @@ import asyncio
 import base64
 import logging
 import time
-from typing import Annotated
+from typing import TYPE_CHECKING, Annotated
 
 from aiortc import (
     RTCConfiguration,
@@ -22,41 +22,54 @@ from fastapi import (
     Response,
 )
 import numpy as np
-from openai import AsyncOpenAI
 from openai.types.beta.realtime.error_event import Error
 from pydantic import ValidationError
 
 from speaches.dependencies import (
+    CompletionClientDependency,
     ConfigDependency,
-    TranscriptionClientDependency,
+    SessionRegistryDependency,
+    SpeechServiceDependency,
+    TranscriptionServiceDependency,
 )
 from speaches.realtime.context import SessionContext
 from speaches.realtime.conversation_event_router import event_router as conversation_event_router
 from speaches.realtime.event_router import EventRouter
+from speaches.realtime.input_audio_buffer import SAMPLE_RATE as INPUT_AUDIO_SAMPLE_RATE
+from speaches.realtime.input_audio_buffer_event_router import append_input_audio
 from speaches.realtime.input_audio_buffer_event_router import (
     event_router as input_audio_buffer_event_router,
 )
+from speaches.realtime.recorder import SessionRecorder
 from speaches.realtime.response_event_router import event_router as response_event_router
 from speaches.realtime.rtc.audio_stream_track import AudioStreamTrack
+from speaches.realtime.rtc.datachannel import (
+    BINARY_PROTOCOL,
+    BinaryMessageDecoder,
+    encode_binary_message,
+    negotiate_max_message_size,
+)
 from speaches.realtime.session import create_session_object_configuration
 from speaches.realtime.session_event_router import event_router as session_event_router
-from speaches.realtime.utils import generate_event_id
+from speaches.realtime.session_registry import SessionRegistry
+from speaches.realtime.utils import generate_event_id, task_done_callback
 from speaches.routers.realtime.ws import event_listener
 from speaches.types.realtime import (
     SERVER_EVENT_TYPES,
     ErrorEvent,
+    Event,
     FullMessageEvent,
-    InputAudioBufferAppendEvent,
     PartialMessageEvent,
     SessionCreatedEvent,
     client_event_type_adapter,
-    server_event_type_adapter,
 )
 
-# NOTE: IMPORTANT! 24Khz because that's what the `input_audio_buffer.append` handler expects
-SAMPLE_RATE = 24000
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+# NOTE: audio is appended to the input audio buffer (and the VAD is ran) once at least this much audio has been received
 MIN_BUFFER_DURATION_MS = 200
-MIN_BUFFER_SIZE = int(SAMPLE_RATE * MIN_BUFFER_DURATION_MS / 1000)
+MIN_BUFFER_SIZE = int(INPUT_AUDIO_SAMPLE_RATE * MIN_BUFFER_DURATION_MS / 1000)
 
 logger = logging.getLogger(__name__)
 
@@ -79,7 +92,7 @@ MAX_FRAGMENT_SIZE = 900
 
 
 def send_fragmented_message(channel: RTCDataChannel, message: str, event_id: str) -> None:
-    """Send a message over the data channel, fragmenting it if necessary.
+    """Send a message over the data channel, fragmenting it if necessary. Only used for legacy clients which don't use the binary transport (see `speaches.realtime.rtc.datachannel`).
 
     Args:
         channel: The RTCDataChannel to send the message on
@@ -122,38 +135,51 @@ def send_fragmented_message(channel: RTCDataChannel, message: str, event_id: str
         logger.info(f"Sent all {total_fragments} fragments")
 
 
-async def rtc_datachannel_sender(ctx: SessionContext, channel: RTCDataChannel) -> None:
+def send_event(ctx: SessionContext, channel: RTCDataChannel, event: Event, max_message_size: int) -> None:
+    message = ctx.pubsub.encode(event)
+    logger.debug(f"Processing {event.type} event message ({len(message)} bytes)")
+    if channel.protocol == BINARY_PROTOCOL:
+        for data in encode_binary_message(
+            message.encode("utf-8"),
+            max_message_size=max_message_size,
+            deflate_min_size=ctx.realtime_config.datachannel_deflate_min_size,
+        ):
+            channel.send(data)
+    else:
+        # The event ID is used to track the fragments of a message
+        send_fragmented_message(channel, message, event.event_id or generate_event_id())
+    logger.info(f"Sent {event.type} event message")
+
+
+async def rtc_datachannel_sender(ctx: SessionContext, channel: RTCDataChannel, max_message_size: int) -> None:
     logger.info("Sender task started")
-    q = ctx.pubsub.subscribe()
+    # NOTE: audio is delivered over the media track, so `response.audio.delta` events aren't even queued for this subscriber
+    # NOTE: the queue is unbounded as the peer must receive every server event
+    subscription = ctx.pubsub.subscribe(*(SERVER_EVENT_TYPES - {"response.audio.delta"}), maxsize=0)
 
     try:
         while True:
-            event = await q.get()
-            if event.type not in SERVER_EVENT_TYPES:
-                continue
-            server_event = server_event_type_adapter.validate_python(event)
-            if server_event.type == "response.audio.delta":
-                logger.debug("Skipping response.audio.delta event")
-                continue
-
-            # Get JSON representation of the event
-            message = server_event.model_dump_json()
-
-            # Generate a unique ID for this message (for tracking fragments)
-            event_id = str(event.event_id) if hasattr(event, "event_id") else generate_event_id()
-
-            # Send the message, fragmenting if necessary
-            logger.debug(f"Processing {event.type} event message ({len(message)} bytes)")
-            send_fragmented_message(channel, message, event_id)
-            logger.info(f"Sent {event.type} event message")
-
-    except BaseException:
+            event = await subscription.get()
+            send_event(ctx, channel, event, max_message_size)
+    except Exception:
         logger.exception("Sender task failed")
-        ctx.pubsub.subscribers.remove(q)
         raise
-
-
-def message_handler(ctx: SessionContext, message: str) -> None:
+    finally:
+        # NOTE: the task is cancelled once the peer connection is closed
+        ctx.pubsub.unsubscribe(subscription)
+
+
+def message_handler(ctx: SessionContext, message: str | bytes, decoder: BinaryMessageDecoder) -> None:
+    if isinstance(message, bytes):
+        try:
+            decoded_message = decoder.feed(message)
+        except ValueError as e:
+            ctx.pubsub.publish_nowait(ErrorEvent(error=Error(type="invalid_request_error", message=str(e))))
+            logger.exception("Received an invalid binary message")
+            return
+        if decoded_message is None:  # waiting for the rest of the fragments
+            return
+        message = decoded_message
     logger.info(f"Message received: {message}")
     try:
         event = client_event_type_adapter.validate_json(message)
@@ -168,57 +194,43 @@ def message_handler(ctx: SessionContext, message: str) -> None:
 
 
 async def audio_receiver(ctx: SessionContext, track: RemoteStreamTrack) -> None:
-    # Initialize buffer to store audio data
-    buffer = np.array([], dtype=np.int16)
+    # NOTE: a single resampler is used for the entire stream, so that its state carries over between frames. The audio is converted straight into the format of the input audio buffer (16kHz mono float32)
+    resampler = AudioResampler(format="flt", layout="mono", rate=INPUT_AUDIO_SAMPLE_RATE)
+    chunks: list[NDArray[np.float32]] = []
+    buffered_samples = 0
 
     while True:
-        frames = await track.recv()
-        # ensure that the received frames are of expected format
-        assert isinstance(frames, AudioFrame)
-        assert frames.sample_rate == 48000
-        assert frames.layout.name == "stereo"
-        assert frames.format.name == "s16"
-
-        resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
-        frames = resampler.resample(frames)
-
-        # Accumulate audio data
-        for frame in frames:
-            arr = frame.to_ndarray()
-            buffer = np.append(buffer, arr.flatten())  # Flatten and append to buffer
-
-            # When buffer reaches or exceeds target size, emit event
-            if len(buffer) >= MIN_BUFFER_SIZE:
-                # Convert to bytes and emit event
-                audio_bytes = buffer.tobytes()
-                assert len(audio_bytes) == len(buffer) * 2, "Audio sample width is not 2 bytes"
-                ctx.pubsub.publish_nowait(
-                    InputAudioBufferAppendEvent(
-                        type="input_audio_buffer.append",
-                        audio=base64.b64encode(audio_bytes).decode(),
-                    )
-                )
-
-                buffer = np.array([], dtype=np.int16)
-
-
-def datachannel_handler(ctx: SessionContext, channel: RTCDataChannel) -> None:
-    logger.info(f"Data channel created: {channel}")
-
-    # Send the session created event - use the fragmentation logic for consistency
-    session_created_event = SessionCreatedEvent(session=ctx.session)
-    session_message = session_created_event.model_dump_json()
-
-    # Send the session created event using our helper function
-    logger.debug(f"Sending session.created event message ({len(session_message)} bytes)")
-    send_fragmented_message(channel, session_message, str(session_created_event.event_id))
-    logger.info("Sent session.created event message")
+        frame = await track.recv()
+        assert isinstance(frame, AudioFrame)
+
+        for resampled_frame in resampler.resample(frame):
+            # NOTE: the resampler outputs `flt` frames, so this doesn't copy. It only narrows the type
+            chunk = resampled_frame.to_ndarray().reshape(-1).astype(np.float32, copy=False)
+            chunks.append(chunk)
+            buffered_samples += len(chunk)
+
+        if buffered_samples >= MIN_BUFFER_SIZE:
+            # NOTE: the audio bypasses `input_audio_buffer.append` (and the base64 encoding/decoding that comes with it) as WebRTC clients never see those events anyway
+            audio = np.concatenate(chunks)
+            if ctx.recorder is not None:
+                ctx.recorder.record_input_audio(audio, INPUT_AUDIO_SAMPLE_RATE)
+            append_input_audio(ctx, audio)
+            chunks.clear()
+            buffered_samples = 0
+
+
+def datachannel_handler(ctx: SessionContext, channel: RTCDataChannel, max_message_size: int) -> None:
+    logger.info(f"Data channel created: {channel} (protocol={channel.protocol!r}, max_message_size={max_message_size})")
+
+    # Send the session created event - use the same transport as every other event for consistency
+    send_event(ctx, channel, SessionCreatedEvent(session=ctx.session), max_message_size)
 
     # Start the data channel sender task
-    rtc_session_tasks[ctx.session.id].add(asyncio.create_task(rtc_datachannel_sender(ctx, channel)))
+    rtc_session_tasks[ctx.session.id].add(asyncio.create_task(rtc_datachannel_sender(ctx, channel, max_message_size)))
 
     # Set up the message handler
-    channel.on("message")(lambda message: message_handler(ctx, message))
+    decoder = BinaryMessageDecoder()
+    channel.on("message")(lambda message: message_handler(ctx, message, decoder))
 
     @channel.on("open")
     def _handle_datachannel_open(*args, **kwargs) -> None:  # noqa: ANN002
@@ -241,10 +253,26 @@ def datachannel_handler(ctx: SessionContext, channel: RTCDataChannel) -> None:
         logger.info(f"Data channel buffered amount low: {channel.id} (args={args}, kwargs={kwargs})")
 
 
-def iceconnectionstatechange_handler(_ctx: SessionContext, pc: RTCPeerConnection) -> None:
+def close_rtc_session(ctx: SessionContext, session_registry: SessionRegistry) -> None:
+    for task in rtc_session_tasks.pop(ctx.session.id, set()):
+        task.cancel()
+    session_registry.unregister(ctx.session.id)
+    if ctx.recorder is not None:
+        ctx.recorder.close()
+    ctx.cancel_background_work()
+    logger.info(f"Finished handling '{ctx.session.id}' session")
+
+
+def iceconnectionstatechange_handler(
+    ctx: SessionContext, pc: RTCPeerConnection, session_registry: SessionRegistry
+) -> None:
     logger.info(f"ICE connection state changed to {pc.iceConnectionState}")
     if pc.iceConnectionState in ["failed", "closed"]:
         logger.info("Peer connection closed")
+        close_rtc_session(ctx, session_registry)
+        if pc.iceConnectionState == "failed":
+            close_task = asyncio.create_task(pc.close())
+            close_task.add_done_callback(task_done_callback)
 
 
 def track_handler(ctx: SessionContext, track: RemoteStreamTrack) -> None:
@@ -259,20 +287,24 @@ def track_handler(ctx: SessionContext, track: RemoteStreamTrack) -> None:
 async def realtime_webrtc(
     request: Request,
     model: Annotated[str, Query(...)],
+    transcription_service: TranscriptionServiceDependency,
+    completion_client: CompletionClientDependency,
+    speech_service: SpeechServiceDependency,
     config: ConfigDependency,
-    transcription_client: TranscriptionClientDependency,
+    session_registry: SessionRegistryDependency,
 ) -> Response:
-    completion_client = AsyncOpenAI(
-        base_url=f"http://{config.host}:{config.port}/v1",
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-    ).chat.completions
     ctx = SessionContext(
-        transcription_client=transcription_client,
+        transcription_service=transcription_service,
         completion_client=completion_client,
+        speech_service=speech_service,
         session=create_session_object_configuration(model),
+        realtime_config=config.realtime,
+        transport="webrtc",
     )
     rtc_session_tasks[ctx.session.id] = set()
+    if config.realtime.recordings_directory is not None:
+        ctx.recorder = SessionRecorder(ctx.pubsub, config.realtime.recordings_directory, ctx.session)
+        rtc_session_tasks[ctx.session.id].add(asyncio.create_task(ctx.recorder.run()))
 
     # TODO: handle both application/sdp and application/json
     sdp = (await request.body()).decode("utf-8")
@@ -286,8 +318,9 @@ async def realtime_webrtc(
     rtc_configuration = RTCConfiguration(iceServers=[])
     pc = RTCPeerConnection(rtc_configuration)
 
-    pc.on("datachannel", lambda channel: datachannel_handler(ctx, channel))
-    pc.on("iceconnectionstatechange", lambda: iceconnectionstatechange_handler(ctx, pc))
+    max_message_size = negotiate_max_message_size(sdp)
+    pc.on("datachannel", lambda channel: datachannel_handler(ctx, channel, max_message_size))
+    pc.on("iceconnectionstatechange", lambda: iceconnectionstatechange_handler(ctx, pc, session_registry))
     pc.on("track", lambda track: track_handler(ctx, track))
     pc.on(
         "icegatheringstatechange",
@@ -332,5 +365,7 @@ async def realtime_webrtc(
     logger.info(f"Setting local description took {time.perf_counter() - start:.3f} seconds")
 
     rtc_session_tasks[ctx.session.id].add(asyncio.create_task(event_listener(ctx)))
+    # NOTE: closing the peer connection triggers `iceconnectionstatechange_handler`, which cleans up the session
+    session_registry.register(ctx, close=pc.close)
 
     return Response(content=pc.localDescription.sdp, media_type="text/plain charset=utf-8")
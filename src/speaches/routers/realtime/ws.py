@@ -1,15 +1,18 @@
 import asyncio
 import logging
+import time
 
 from fastapi import (
     APIRouter,
     WebSocket,
 )
-from openai import AsyncOpenAI
 
 from speaches.dependencies import (
+    CompletionClientDependency,
     ConfigDependency,
-    TranscriptionClientDependency,
+    SessionRegistryDependency,
+    SpeechServiceDependency,
+    TranscriptionServiceDependency,
 )
 from speaches.realtime.context import SessionContext
 from speaches.realtime.conversation_event_router import event_router as conversation_event_router
@@ -18,11 +21,12 @@ from speaches.realtime.input_audio_buffer_event_router import (
     event_router as input_audio_buffer_event_router,
 )
 from speaches.realtime.message_manager import WsServerMessageManager
+from speaches.realtime.recorder import SessionRecorder
 from speaches.realtime.response_event_router import event_router as response_event_router
 from speaches.realtime.session import OPENAI_REALTIME_SESSION_DURATION_SECONDS, create_session_object_configuration
 from speaches.realtime.session_event_router import event_router as session_event_router
 from speaches.realtime.utils import task_done_callback
-from speaches.types.realtime import SessionCreatedEvent
+from speaches.types.realtime import CLIENT_EVENT_TYPES, SessionCreatedEvent
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +44,8 @@ async def event_listener(ctx: SessionContext) -> None:
         async with asyncio.TaskGroup() as tg:
             async for event in ctx.pubsub.poll():
                 # logger.debug(f"Received event: {event.type}")
+                if event.type in CLIENT_EVENT_TYPES:
+                    ctx.last_activity_at = time.monotonic()
 
                 task = tg.create_task(event_router.dispatch(ctx, event))
                 task.add_done_callback(task_done_callback)
@@ -54,31 +60,61 @@ async def event_listener(ctx: SessionContext) -> None:
 async def realtime(
     ws: WebSocket,
     model: str,
+    transcription_service: TranscriptionServiceDependency,
+    completion_client: CompletionClientDependency,
+    speech_service: SpeechServiceDependency,
     config: ConfigDependency,
-    transcription_client: TranscriptionClientDependency,
+    session_registry: SessionRegistryDependency,
+    binary_audio: bool = False,
 ) -> None:
+    """Realtime API over WebSocket.
+
+    When `binary_audio` is set, audio is sent and received as raw bytes (in the session's audio formats) in binary frames instead of base64 within JSON events. See `speaches.realtime.binary_frames` for the frame layout.
+    """
     await ws.accept()
     logger.info("Accepted websocket connection")
 
-    completion_client = AsyncOpenAI(
-        base_url=f"http://{config.host}:{config.port}/v1",
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-    ).chat.completions
     ctx = SessionContext(
-        transcription_client=transcription_client,
+        transcription_service=transcription_service,
         completion_client=completion_client,
+        speech_service=speech_service,
         session=create_session_object_configuration(model),
+        realtime_config=config.realtime,
+        transport="websocket",
     )
-    message_manager = WsServerMessageManager(ctx.pubsub)
-    async with asyncio.TaskGroup() as tg:
-        event_listener_task = tg.create_task(event_listener(ctx), name="event_listener")
-        async with asyncio.timeout(OPENAI_REALTIME_SESSION_DURATION_SECONDS):
-            mm_task = asyncio.create_task(message_manager.run(ws))
-            # HACK: a tiny delay to ensure the message_manager.run() task is started. Otherwise, the `SessionCreatedEvent` will not be sent, as it's published before the `sender` task subscribes to the pubsub.
-            await asyncio.sleep(0.001)
-            ctx.pubsub.publish_nowait(SessionCreatedEvent(session=ctx.session))
-            await mm_task
-        event_listener_task.cancel()
+    message_manager = WsServerMessageManager(ctx.pubsub, binary_audio=binary_audio, turn_tracker=ctx.turn_tracker)
+    closed_by_server = False
+    recorder_task: asyncio.Task[None] | None = None
+    try:
+        async with asyncio.TaskGroup() as tg:
+            event_listener_task = tg.create_task(event_listener(ctx), name="event_listener")
+            if config.realtime.recordings_directory is not None:
+                ctx.recorder = SessionRecorder(ctx.pubsub, config.realtime.recordings_directory, ctx.session)
+                recorder_task = tg.create_task(ctx.recorder.run(), name="recorder")
+            async with asyncio.timeout(OPENAI_REALTIME_SESSION_DURATION_SECONDS):
+                mm_task = asyncio.create_task(message_manager.run(ws))
+
+                async def close() -> None:
+                    nonlocal closed_by_server
+                    closed_by_server = True
+                    mm_task.cancel()
+
+                session_registry.register(ctx, close=close)
+                # HACK: a tiny delay to ensure the message_manager.run() task is started. Otherwise, the `SessionCreatedEvent` will not be sent, as it's published before the `sender` task subscribes to the pubsub.
+                await asyncio.sleep(0.001)
+                ctx.pubsub.publish_nowait(SessionCreatedEvent(session=ctx.session))
+                try:
+                    await mm_task
+                except asyncio.CancelledError:
+                    if not closed_by_server:
+                        raise
+                    # NOTE: the session was closed by the server (see `SessionRegistry`)
+                    await ws.close()
+            event_listener_task.cancel()
+            if recorder_task is not None:
+                recorder_task.cancel()
+    finally:
+        ctx.cancel_background_work()
+        session_registry.unregister(ctx.session.id)
 
     logger.info(f"Finished handling '{ctx.session.id}' session")
@@ -1,13 +1,23 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from functools import partial
+import itertools
 import logging
-from typing import Literal
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
 from huggingface_hub.utils._cache_manager import _scan_cached_repo
-from pydantic import BaseModel, Field
+import openai
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
 from speaches.audio import convert_audio_format
-from speaches.dependencies import KokoroModelManagerDependency, PiperModelManagerDependency
+from speaches.dependencies import (
+    ConfigDependency,
+    KokoroModelManagerDependency,
+    PiperModelManagerDependency,
+    SpeechServiceDependency,
+)
 from speaches.executors.kokoro import utils as kokoro_utils
 from speaches.executors.piper import utils as piper_utils
 from speaches.hf_utils import (
@@ -16,7 +26,9 @@ from speaches.hf_utils import (
     get_model_repo_path,
 )
 from speaches.model_aliases import ModelId
-from speaches.text_utils import strip_emojis, strip_markdown_emphasis
+from speaches.services.speech import SpeechService, synthesize_with_early_first_chunk
+from speaches.text_utils import AdaptiveChunker, split_leading_fragment, strip_emojis, strip_markdown_emphasis
+from speaches.utils import pipelined_stream
 
 # https://platform.openai.com/docs/api-reference/audio/createSpeech#audio-createspeech-response_format
 DEFAULT_RESPONSE_FORMAT = "mp3"
@@ -33,6 +45,10 @@ UNSUPORTED_RESPONSE_FORMATS = ("opus", "aac")
 
 MIN_SAMPLE_RATE = 8000
 MAX_SAMPLE_RATE = 48000
+DEFAULT_STREAM_SAMPLE_RATE = 24000
+
+# NOTE: only formats without headers can be sent as a continuous stream of chunks
+type StreamResponseFormat = Literal["pcm", "mp3"]
 
 
 logger = logging.getLogger(__name__)
@@ -51,6 +67,9 @@ class CreateSpeechRequestBody(BaseModel):
     """The speed of the generated audio. 1.0 is the default. Different models have different supported speed ranges."""
     sample_rate: int | None = Field(None, ge=MIN_SAMPLE_RATE, le=MAX_SAMPLE_RATE)
     """Desired sample rate to convert the generated audio to. If not provided, the model's default sample rate will be used."""
+    # NOTE: this is a custom field, not part of the OpenAI API
+    early_first_chunk: bool = False
+    """Synthesize a short leading fragment of the input (split at a clause boundary) on its own before the rest of it, so that the first audio is produced sooner when the input starts with a long sentence."""
 
 
 # https://platform.openai.com/docs/api-reference/audio/createSpeech
@@ -96,12 +115,13 @@ async def synthesize(  # noqa: C901, PLR0912
                     detail=f"Voice '{body.voice}' is not supported. Supported voices: {kokoro_utils.VOICES}",
                 )
         with kokoro_model_manager.load_model(body.model) as tts:
-            audio_generator = kokoro_utils.generate_audio(
-                tts,
-                body.input,
-                body.voice,
-                speed=body.speed,
-                sample_rate=body.sample_rate,
+            synthesize = partial(
+                kokoro_utils.generate_audio, tts, voice=body.voice, speed=body.speed, sample_rate=body.sample_rate
+            )
+            audio_generator = (
+                synthesize_with_early_first_chunk(body.input, synthesize)
+                if body.early_first_chunk
+                else synthesize(body.input)
             )
             # these file formats can't easily be streamed because they have headers and/or metadata
             if body.response_format in SUPPORTED_NON_STREAMABLE_RESPONSE_FORMATS:
@@ -127,8 +147,11 @@ async def synthesize(  # noqa: C901, PLR0912
         # TODO: maybe check voice
         with piper_model_manager.load_model(body.model) as piper_tts:
             # TODO: async generator
-            audio_generator = piper_utils.generate_audio(
-                piper_tts, body.input, speed=body.speed, sample_rate=body.sample_rate
+            texts = split_leading_fragment(body.input) if body.early_first_chunk else (body.input,)
+            audio_generator = itertools.chain.from_iterable(
+                piper_utils.generate_audio(piper_tts, text, speed=body.speed, sample_rate=body.sample_rate)
+                for text in texts
+                if len(text) > 0
             )
             # these file formats can't easily be streamed because they have headers and/or metadata
             if body.response_format in SUPPORTED_NON_STREAMABLE_RESPONSE_FORMATS:
@@ -150,3 +173,197 @@ async def synthesize(  # noqa: C901, PLR0912
             status_code=404,
             detail=f"Model '{body.model}' is not supported. If you think this is a mistake, please open an issue.",
         )
+
+
+class TextMessage(BaseModel):
+    """Text to synthesize. It may be any part of the text (e.g. a single token), it's chunked into sentences server-side."""
+
+    type: Literal["text"]
+    text: str
+
+
+class FlushMessage(BaseModel):
+    """Synthesize all of the text received so far, even if it doesn't end with a complete sentence. An `audio.done` message is sent once all of its audio has been sent."""
+
+    type: Literal["flush"]
+
+
+class CancelMessage(BaseModel):
+    """Discard all of the text received so far and stop synthesizing it. A `cancelled` message is sent once done, no audio of the discarded text is sent after it."""
+
+    type: Literal["cancel"]
+
+
+type SpeechStreamClientMessage = Annotated[TextMessage | FlushMessage | CancelMessage, Field(discriminator="type")]
+speech_stream_client_message_adapter: TypeAdapter[SpeechStreamClientMessage] = TypeAdapter(SpeechStreamClientMessage)
+
+
+class SpeechStream:
+    """Synthesizes text which is received incrementally.
+
+    The text is chunked with an `AdaptiveChunker` and the chunks are synthesized as soon as they are complete. Each flush closes the current chunker and starts a new one, so the text is split into segments (`segments`) whose audio is produced in order.
+    """
+
+    def __init__(
+        self,
+        speech_service: SpeechService,
+        *,
+        model: str,
+        voice: str,
+        speed: float,
+        sample_rate: int,
+        synthesis_concurrency: int,
+    ) -> None:
+        self.speech_service = speech_service
+        self.model = model
+        self.voice = voice
+        self.speed = speed
+        self.sample_rate = sample_rate
+        self.synthesis_concurrency = synthesis_concurrency
+        self.segments: asyncio.Queue[AdaptiveChunker] = asyncio.Queue()
+        self.chunker = AdaptiveChunker()
+        self.segments.put_nowait(self.chunker)
+
+    def add_text(self, text: str) -> None:
+        self.chunker.add_token(text)
+
+    def flush(self) -> None:
+        self.chunker.close()
+        self.chunker = AdaptiveChunker()
+        self.segments.put_nowait(self.chunker)
+
+    def synthesize_chunk(self, chunk: str) -> AsyncGenerator[bytes]:
+        return self.speech_service.synthesize_stream(
+            chunk, model=self.model, voice=self.voice, speed=self.speed, sample_rate=self.sample_rate
+        )
+
+    async def clean_chunks(self, chunker: AdaptiveChunker) -> AsyncGenerator[str]:
+        async for chunk in chunker:
+            chunk_clean = strip_markdown_emphasis(strip_emojis(chunk)).strip()
+            if len(chunk_clean) > 0:
+                yield chunk_clean
+
+    def segment_audio_stream(self, chunker: AdaptiveChunker) -> AsyncGenerator[bytes]:
+        # NOTE: upcoming chunks are synthesized while the audio of the current one is being sent
+        return pipelined_stream(
+            self.clean_chunks(chunker), self.synthesize_chunk, max_concurrency=self.synthesis_concurrency
+        )
+
+
+async def send_speech_stream_audio(
+    ws: WebSocket, speech_stream: SpeechStream, response_format: StreamResponseFormat
+) -> None:
+    while True:
+        chunker = await speech_stream.segments.get()
+        try:
+            async for pcm_bytes in speech_stream.segment_audio_stream(chunker):
+                if response_format == "pcm":
+                    await ws.send_bytes(pcm_bytes)
+                else:
+                    await ws.send_bytes(
+                        await asyncio.to_thread(
+                            convert_audio_format, pcm_bytes, speech_stream.sample_rate, response_format
+                        )
+                    )
+        # NOTE: `ValueError` is raised by the in-process speech service (e.g. when the voice isn't supported)
+        except (openai.APIStatusError, ValueError) as e:
+            logger.exception("Speech synthesis failed")
+            await ws.send_json({"type": "error", "message": str(e)})
+            # the rest of the segment is skipped, but its end is still signaled
+            async for _ in chunker:
+                pass
+        await ws.send_json({"type": "audio.done"})
+
+
+async def receive_speech_stream_message(ws: WebSocket) -> SpeechStreamClientMessage | None:
+    """Receive the next valid client message. Invalid messages are answered with an error. `None` is returned once the client has disconnected."""
+    while True:
+        ws_message = await ws.receive()
+        if ws_message["type"] == "websocket.disconnect":
+            return None
+        if ws_message.get("text") is None:
+            await ws.send_json({"type": "error", "message": "Only text messages are accepted"})
+            continue
+        try:
+            return speech_stream_client_message_adapter.validate_json(ws_message["text"])
+        except ValidationError as e:
+            await ws.send_json({"type": "error", "message": str(e)})
+
+
+@router.websocket("/v1/audio/speech/stream")
+async def synthesize_stream(  # noqa: C901
+    ws: WebSocket,
+    speech_service: SpeechServiceDependency,
+    config: ConfigDependency,
+    model: ModelId,
+    voice: str,
+    response_format: StreamResponseFormat = "pcm",
+    speed: float = 1.0,
+    sample_rate: Annotated[int, Query(ge=MIN_SAMPLE_RATE, le=MAX_SAMPLE_RATE)] = DEFAULT_STREAM_SAMPLE_RATE,
+) -> None:
+    """Synthesize text which is sent incrementally (e.g. as it's being generated by a language model).
+
+    The client sends JSON messages (see `TextMessage`, `FlushMessage` and `CancelMessage`). The audio is sent back in binary messages as soon as each chunk of text is synthesized, as raw 16-bit little-endian mono PCM at `sample_rate` or as MP3 frames. JSON messages are sent to signal the end of a flushed segment (`{"type": "audio.done"}`), a completed cancellation (`{"type": "cancelled"}`) and errors (`{"type": "error", "message": ...}`).
+
+    The model is kept loaded for the duration of the connection.
+    """
+    await ws.accept()
+    try:
+        model_context = speech_service.keep_model_loaded(model)
+    except ValueError as e:
+        await ws.send_json({"type": "error", "message": str(e)})
+        await ws.close()
+        return
+
+    def create_speech_stream() -> SpeechStream:
+        return SpeechStream(
+            speech_service,
+            model=model,
+            voice=voice,
+            speed=speed,
+            sample_rate=sample_rate,
+            synthesis_concurrency=config.speech_stream_synthesis_concurrency,
+        )
+
+    with model_context:
+        speech_stream = create_speech_stream()
+        sender_task = asyncio.create_task(send_speech_stream_audio(ws, speech_stream, response_format))
+        receive_task: asyncio.Task[SpeechStreamClientMessage | None] | None = None
+        try:
+            # NOTE: the sender runs until it's cancelled, so it's only done before that if it failed
+            while not sender_task.done():
+                receive_task = asyncio.create_task(receive_speech_stream_message(ws))
+                await asyncio.wait([receive_task, sender_task], return_when=asyncio.FIRST_COMPLETED)
+                if not receive_task.done():
+                    break
+                message = receive_task.result()
+                match message:
+                    case None:
+                        logger.info("Speech stream client disconnected")
+                        return
+                    case TextMessage():
+                        speech_stream.add_text(message.text)
+                    case FlushMessage():
+                        speech_stream.flush()
+                    case CancelMessage():
+                        sender_task.cancel()
+                        # NOTE: `asyncio.wait` doesn't raise, the sender may have failed before it got cancelled
+                        await asyncio.wait([sender_task])
+                        if not sender_task.cancelled():
+                            break
+                        speech_stream = create_speech_stream()
+                        await ws.send_json({"type": "cancelled"})
+                        sender_task = asyncio.create_task(send_speech_stream_audio(ws, speech_stream, response_format))
+            error = sender_task.exception()
+            if isinstance(error, WebSocketDisconnect):
+                logger.info("Speech stream client disconnected")
+                return
+            logger.error("Speech stream sender failed", exc_info=error)
+            await ws.send_json({"type": "error", "message": f"Speech synthesis failed: {error}"})
+            await ws.close(code=status.WS_1011_INTERNAL_ERROR)
+        except WebSocketDisconnect:
+            logger.info("Speech stream client disconnected")
+        finally:
+            sender_task.cancel()
+            if receive_task is not None:
+                receive_task.cancel()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AbstractContextManager, nullcontext
+from functools import lru_cache, partial
+import logging
+from typing import TYPE_CHECKING, Literal, Protocol
+
+from huggingface_hub.utils._cache_manager import _scan_cached_repo
+
+from speaches.executors.kokoro import utils as kokoro_utils
+from speaches.executors.piper import utils as piper_utils
+from speaches.hf_utils import (
+    MODEL_CARD_DOESNT_EXISTS_ERROR_MESSAGE,
+    get_model_card_data_from_cached_repo_info,
+    get_model_repo_path,
+)
+from speaches.model_aliases import resolve_model_id_alias
+from speaches.text_utils import split_leading_fragment
+from speaches.utils import pipelined_stream
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+    from openai.resources.audio import AsyncSpeech
+
+    from speaches.executors.kokoro.model_manager import KokoroModelManager
+    from speaches.executors.piper.model_manager import PiperModelManager
+
+# https://platform.openai.com/docs/api-reference/audio/createSpeech#audio-createspeech-voice
+OPENAI_SUPPORTED_SPEECH_VOICE_NAMES = ("alloy", "ash", "ballad", "coral", "echo", "sage", "shimmer", "verse")
+
+logger = logging.getLogger(__name__)
+
+type SpeechExecutor = Literal["kokoro", "piper"]
+
+
+@lru_cache
+def get_speech_executor(model_id: str) -> SpeechExecutor:
+    """Determine which executor should be used for the model. The result is cached as scanning the model repository is relatively slow."""
+    model_repo_path = get_model_repo_path(model_id)
+    if model_repo_path is None:
+        raise ValueError(
+            f"Model '{model_id}' is not installed locally. You can download the model using `POST /v1/models`"
+        )
+    cached_repo_info = _scan_cached_repo(model_repo_path)
+    model_card_data = get_model_card_data_from_cached_repo_info(cached_repo_info)
+    if model_card_data is None:
+        raise ValueError(MODEL_CARD_DOESNT_EXISTS_ERROR_MESSAGE.format(model_id=model_id))
+    if kokoro_utils.hf_model_filter.passes_filter(model_card_data):
+        return "kokoro"
+    elif piper_utils.hf_model_filter.passes_filter(model_card_data):
+        return "piper"
+    raise ValueError(f"Model '{model_id}' is not supported. If you think this is a mistake, please open an issue.")
+
+
+def synthesize_with_early_first_chunk(
+    text: str, synthesize: Callable[[str], AsyncIterator[bytes]]
+) -> AsyncGenerator[bytes, None]:
+    """Synthesize a short leading fragment of the text (split at a clause boundary, see `split_leading_fragment`) on its own, followed by the rest of it.
+
+    The time to the first audio grows with the length of the text being synthesized (e.g. Kokoro phonemizes the whole text and synthesizes its first batch before producing any audio), so this bounds it regardless of how long the first sentence is. The rest of the text is synthesized while the audio of the fragment is being consumed.
+    """
+
+    async def fragments() -> AsyncGenerator[str, None]:
+        for fragment in split_leading_fragment(text):
+            if len(fragment) > 0:
+                yield fragment
+
+    return pipelined_stream(fragments(), synthesize, max_concurrency=2)
+
+
+class SpeechService(Protocol):
+    """Synthesizes speech and streams it back as raw 16-bit little-endian mono PCM."""
+
+    def synthesize_stream(
+        self,
+        text: str,
+        *,
+        model: str,
+        voice: str,
+        speed: float = 1.0,
+        sample_rate: int | None = None,
+        early_first_chunk: bool = False,
+    ) -> AsyncGenerator[bytes, None]:
+        """When `early_first_chunk` is set, a short leading fragment of the text is synthesized on its own first (see `synthesize_with_early_first_chunk`)."""
+        ...
+
+    def keep_model_loaded(self, model: str) -> AbstractContextManager[object]:
+        """Keep the model loaded while the returned context manager is entered, so that it isn't unloaded (and reloaded) between syntheses."""
+        ...
+
+
+class LocalSpeechService:
+    """Runs the synthesis in-process using the Kokoro and Piper model managers."""
+
+    def __init__(self, kokoro_model_manager: KokoroModelManager, piper_model_manager: PiperModelManager) -> None:
+        self.kokoro_model_manager = kokoro_model_manager
+        self.piper_model_manager = piper_model_manager
+
+    async def _kokoro_synthesize_stream(
+        self, text: str, *, model: str, voice: str, speed: float, sample_rate: int | None
+    ) -> AsyncGenerator[bytes, None]:
+        if speed < 0.5 or speed > 2.0:
+            raise ValueError(f"Speed must be between 0.5 and 2.0, got {speed}")
+        if voice not in [v.name for v in kokoro_utils.VOICES]:
+            if voice not in OPENAI_SUPPORTED_SPEECH_VOICE_NAMES:
+                raise ValueError(f"Voice '{voice}' is not supported. Supported voices: {kokoro_utils.VOICES}")
+            logger.warning(
+                f"Voice '{voice}' is not supported by the model '{model}'. It will be replaced with '{kokoro_utils.VOICES[0].name}'."
+            )
+            voice = kokoro_utils.VOICES[0].name
+        with self.kokoro_model_manager.load_model(model) as tts:
+            async for audio_bytes in kokoro_utils.generate_audio(
+                tts, text, voice, speed=speed, sample_rate=sample_rate
+            ):
+                yield audio_bytes
+
+    async def _piper_synthesize_stream(
+        self, text: str, *, model: str, speed: float, sample_rate: int | None
+    ) -> AsyncGenerator[bytes, None]:
+        if speed < 0.25 or speed > 4.0:
+            raise ValueError(f"Speed must be between 0.25 and 4.0, got {speed}")
+        with self.piper_model_manager.load_model(model) as piper_tts:
+            audio_generator = piper_utils.generate_audio(piper_tts, text, speed=speed, sample_rate=sample_rate)
+            # NOTE: piper's generator is blocking, so each chunk is produced in a worker thread
+            while (audio_bytes := await asyncio.to_thread(next, audio_generator, None)) is not None:
+                yield audio_bytes
+
+    def keep_model_loaded(self, model: str) -> AbstractContextManager[object]:
+        model = resolve_model_id_alias(model)
+        match get_speech_executor(model):
+            case "kokoro":
+                return self.kokoro_model_manager.load_model(model)
+            case "piper":
+                return self.piper_model_manager.load_model(model)
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        *,
+        model: str,
+        voice: str,
+        speed: float = 1.0,
+        sample_rate: int | None = None,
+        early_first_chunk: bool = False,
+    ) -> AsyncGenerator[bytes, None]:
+        model = resolve_model_id_alias(model)
+        match get_speech_executor(model):
+            case "kokoro":
+                synthesize = partial(
+                    self._kokoro_synthesize_stream, model=model, voice=voice, speed=speed, sample_rate=sample_rate
+                )
+            case "piper":
+                synthesize = partial(self._piper_synthesize_stream, model=model, speed=speed, sample_rate=sample_rate)
+        audio_generator = synthesize_with_early_first_chunk(text, synthesize) if early_first_chunk else synthesize(text)
+        async for audio_bytes in audio_generator:
+            yield audio_bytes
+
+
+class HttpSpeechService:
+    """Streams the audio from a (remote) `/v1/audio/speech` endpoint. Only meant to be used when `loopback_host_url` is set."""
+
+    def __init__(self, speech_client: AsyncSpeech) -> None:
+        self.speech_client = speech_client
+
+    def keep_model_loaded(self, model: str) -> AbstractContextManager[object]:  # noqa: ARG002
+        # NOTE: the models are managed by the server behind `speech_client`
+        return nullcontext()
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        *,
+        model: str,
+        voice: str,
+        speed: float = 1.0,
+        sample_rate: int | None = None,
+        early_first_chunk: bool = False,
+    ) -> AsyncGenerator[bytes, None]:
+        extra_body: dict[str, object] = {}
+        if sample_rate is not None:
+            extra_body["sample_rate"] = sample_rate
+        if early_first_chunk:
+            extra_body["early_first_chunk"] = True
+        async with self.speech_client.with_streaming_response.create(
+            input=text,
+            model=model,
+            voice=voice,  # pyright: ignore[reportArgumentType]
+            response_format="pcm",
+            speed=speed,
+            extra_body=extra_body or None,
+        ) as res:
+            # NOTE: HTTP chunk boundaries aren't aligned to 16-bit samples, so a trailing odd byte is carried over
+            remainder = b""
+            async for chunk in res.iter_bytes():
+                audio_bytes = remainder + chunk
+                aligned_size = len(audio_bytes) - len(audio_bytes) % 2
+                remainder = audio_bytes[aligned_size:]
+                if aligned_size > 0:
+                    yield audio_bytes[:aligned_size]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+from io import BytesIO
+import logging
+from typing import TYPE_CHECKING, Protocol
+
+from faster_whisper.transcribe import BatchedInferencePipeline
+import numpy as np
+from openai import NotGiven
+import soundfile as sf
+
+from speaches.api_types import TranscriptionSegment
+from speaches.hf_utils import get_model_repo_path
+from speaches.model_aliases import resolve_model_id_alias
+from speaches.text_utils import segments_to_text
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+    from openai.resources.audio import AsyncTranscriptions
+
+    from speaches.config import WhisperConfig
+    from speaches.executors.whisper.model_manager import WhisperModelManager
+
+SAMPLE_RATE = 16000  # the sample rate expected by `faster-whisper`
+
+logger = logging.getLogger(__name__)
+
+
+def to_float32_audio(audio: NDArray[np.float32] | NDArray[np.int16]) -> NDArray[np.float32]:
+    if audio.dtype == np.int16:
+        return audio.astype(np.float32) / 32768.0
+    assert audio.dtype == np.float32, audio.dtype
+    return audio  # pyright: ignore[reportReturnType]
+
+
+class TranscriptionService(Protocol):
+    """Transcribes 16kHz mono audio that is already in memory."""
+
+    async def transcribe(
+        self,
+        audio: NDArray[np.float32] | NDArray[np.int16],
+        *,
+        model: str,
+        language: str | None = None,
+        prompt: str | None = None,
+    ) -> str: ...
+
+
+class LocalTranscriptionService:
+    """Runs the transcription in-process using the Whisper model manager. No encoding, multipart or decoding round trip is involved."""
+
+    def __init__(self, model_manager: WhisperModelManager, whisper_config: WhisperConfig, vad_filter: bool) -> None:
+        self.model_manager = model_manager
+        self.whisper_config = whisper_config
+        self.vad_filter = vad_filter
+
+    def _transcribe(self, audio: NDArray[np.float32], model: str, language: str | None, prompt: str | None) -> str:
+        with self.model_manager.load_model(model) as whisper:
+            whisper_model = BatchedInferencePipeline(model=whisper) if self.whisper_config.use_batched_mode else whisper
+            segments, _transcription_info = whisper_model.transcribe(
+                audio,
+                task="transcribe",
+                language=language,
+                initial_prompt=prompt,
+                vad_filter=self.vad_filter,
+            )
+            # NOTE: `segments` is a lazy generator, it must be consumed while the model is still loaded
+            return segments_to_text(TranscriptionSegment.from_faster_whisper_segments(segments))
+
+    async def transcribe(
+        self,
+        audio: NDArray[np.float32] | NDArray[np.int16],
+        *,
+        model: str,
+        language: str | None = None,
+        prompt: str | None = None,
+    ) -> str:
+        model = resolve_model_id_alias(model)
+        if model not in self.model_manager.loaded_models and get_model_repo_path(model) is None:
+            raise ValueError(
+                f"Model '{model}' is not installed locally. You can download the model using `POST /v1/models`"
+            )
+        # NOTE: inference is blocking, so it's offloaded to a thread to avoid stalling the event loop
+        return await asyncio.to_thread(self._transcribe, to_float32_audio(audio), model, language, prompt)
+
+
+class HttpTranscriptionService:
+    """Sends the audio to a (remote) `/v1/audio/transcriptions` endpoint. Only meant to be used when `loopback_host_url` is set."""
+
+    def __init__(self, transcription_client: AsyncTranscriptions) -> None:
+        self.transcription_client = transcription_client
+
+    async def transcribe(
+        self,
+        audio: NDArray[np.float32] | NDArray[np.int16],
+        *,
+        model: str,
+        language: str | None = None,
+        prompt: str | None = None,
+    ) -> str:
+        file = BytesIO()
+        sf.write(file, audio, samplerate=SAMPLE_RATE, subtype="PCM_16", endian="LITTLE", format="wav")
+        file.seek(0)
+        return await self.transcription_client.create(
+            file=file,
+            model=model,
+            response_format="text",
+            language=language or NotGiven(),
+            prompt=prompt or NotGiven(),
+        )
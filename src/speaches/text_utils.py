@@ -140,6 +140,210 @@ class SentenceChunker:
                 await self._new_token_event.wait()
 
 
+# NOTE: ASCII sentence and clause endings only end a chunk when followed by whitespace, which rules out decimals ("3.14"), thousands separators ("1,000"), times ("12:30") and the like. CJK punctuation isn't followed by whitespace, so it always ends a chunk
+ASCII_SENTENCE_ENDINGS = frozenset(".!?")
+CJK_SENTENCE_ENDINGS = frozenset("。！？…")
+ASCII_CLAUSE_ENDINGS = frozenset(",;:")
+CJK_CLAUSE_ENDINGS = frozenset("，、；：")
+# closing quotes and brackets that directly follow a sentence or clause ending belong to the chunk being ended
+CLOSING_PUNCTUATION = frozenset("\"')]}”’»」』）】〉》")
+# lowercase words which, when followed by a ".", don't end a sentence
+ABBREVIATIONS = frozenset(
+    (
+        *("mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "e.g", "i.e", "etc", "approx", "fig", "inc"),
+        *("ltd", "gen", "col", "lt", "sgt", "capt", "gov", "sen", "rev", "hon", "pres", "dept", "ave", "blvd"),
+        # months, as in "Jan. 5, 2020"
+        *("jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec"),
+    )
+)
+# NOTE: a CJK character takes roughly as long to speak as three latin characters, so it's weighted accordingly when measuring the length of a chunk
+CJK_CHARACTER_WEIGHT = 3
+FIRST_CHUNK_MIN_LENGTH = 8
+MIN_CHUNK_LENGTH = 40
+CLAUSE_CHUNK_MIN_LENGTH = 100
+MAX_CHUNK_LENGTH = 200
+LEADING_FRAGMENT_MAX_LENGTH = 40
+
+
+def is_cjk_character(char: str) -> bool:
+    code_point = ord(char)
+    return (
+        0x3000 <= code_point <= 0x30FF  # CJK symbols and punctuation, hiragana and katakana
+        or 0x3400 <= code_point <= 0x4DBF  # CJK unified ideographs extension A
+        or 0x4E00 <= code_point <= 0x9FFF  # CJK unified ideographs
+        or 0xAC00 <= code_point <= 0xD7AF  # hangul syllables
+        or 0xF900 <= code_point <= 0xFAFF  # CJK compatibility ideographs
+        or 0xFF00 <= code_point <= 0xFFEF  # halfwidth and fullwidth forms (e.g. "，")
+    )
+
+
+class AdaptiveChunker:
+    """A text chunker that yields a short first chunk to minimize the time to first audio, followed by larger chunks.
+
+    The first chunk ends at the first sentence or clause boundary once it's at least `first_chunk_min_length` long. Subsequent chunks end at a sentence boundary once they are at least `min_chunk_length` long, at a clause boundary once they are at least `clause_chunk_min_length` long, or (when no boundary has been found) at the last whitespace once they reach `max_chunk_length`. Lengths are measured in characters, with CJK characters weighted by `CJK_CHARACTER_WEIGHT`.
+
+    Tokens are only buffered until a chunk is yielded and every character is examined once, so the cost of adding a token doesn't grow with the length of the text.
+
+    Implements the TextChunker protocol.
+    """
+
+    def __init__(
+        self,
+        *,
+        first_chunk_min_length: int = FIRST_CHUNK_MIN_LENGTH,
+        min_chunk_length: int = MIN_CHUNK_LENGTH,
+        clause_chunk_min_length: int = CLAUSE_CHUNK_MIN_LENGTH,
+        max_chunk_length: int = MAX_CHUNK_LENGTH,
+    ) -> None:
+        self._first_chunk_min_length = first_chunk_min_length
+        self._min_chunk_length = min_chunk_length
+        self._clause_chunk_min_length = clause_chunk_min_length
+        self._max_chunk_length = max_chunk_length
+        self._tokens: list[str] = []
+        self._is_closed = False
+        self._new_token_event = asyncio.Event()
+        self._buffer = ""
+        """Text of the chunk being built."""
+        self._scan_index = 0
+        """Index of the first character of `_buffer` which hasn't been examined yet."""
+        self._length = 0
+        """Weighted length of `_buffer[:_scan_index]`."""
+        self._last_whitespace_index = -1
+        self._is_first_chunk = True
+        self._is_complete = False
+        """Whether `_buffer` holds all of the remaining text."""
+
+    def add_token(self, token: str) -> None:
+        """Add a token (text chunk) to the chunker."""
+        if self._is_closed:
+            raise RuntimeError("Cannot add tokens to a closed AdaptiveChunker")  # noqa: EM101
+
+        self._tokens.append(token)
+        self._new_token_event.set()
+
+    def close(self) -> None:
+        """Close the chunker, preventing further token additions."""
+        self._is_closed = True
+        self._new_token_event.set()
+
+    def _is_abbreviation(self, period_index: int) -> bool:
+        word_start = period_index
+        while word_start > 0 and not self._buffer[word_start - 1].isspace() and self._buffer[word_start - 1] != "(":
+            word_start -= 1
+        word = self._buffer[word_start:period_index]
+        # NOTE: a single uppercase letter is most likely an initial (e.g. "J. R. R. Tolkien")
+        return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper())
+
+    def _boundary_end(self, index: int) -> int | None:  # noqa: PLR0911
+        """If the character at `index` ends a sentence or a clause, return the index at which the chunk would end. Returns -1 when the character isn't a boundary and `None` when it can't be determined until more text arrives."""
+        char = self._buffer[index]
+        if char == "\n":
+            return index + 1
+        is_ascii_ending = char in ASCII_SENTENCE_ENDINGS or char in ASCII_CLAUSE_ENDINGS
+        if not is_ascii_ending and char not in CJK_SENTENCE_ENDINGS and char not in CJK_CLAUSE_ENDINGS:
+            return -1
+        end = index + 1
+        while end < len(self._buffer) and self._buffer[end] in CLOSING_PUNCTUATION:
+            end += 1
+        if end == len(self._buffer):
+            return end if self._is_complete else None
+        if not is_ascii_ending:
+            return end
+        if not self._buffer[end].isspace():
+            return -1
+        if char == "." and end == index + 1 and self._is_abbreviation(index):
+            return -1
+        return end
+
+    def _find_chunk_end(self) -> int | None:
+        while self._scan_index < len(self._buffer):
+            index = self._scan_index
+            char = self._buffer[index]
+            boundary_end = self._boundary_end(index)
+            if boundary_end is None:
+                return None  # wait for the text following the boundary
+            self._scan_index += 1
+            self._length += CJK_CHARACTER_WEIGHT if is_cjk_character(char) else 1
+            if char.isspace():
+                self._last_whitespace_index = index
+            if boundary_end != -1:
+                is_sentence_end = char not in ASCII_CLAUSE_ENDINGS and char not in CJK_CLAUSE_ENDINGS
+                if self._is_first_chunk:
+                    if self._length >= self._first_chunk_min_length:
+                        return boundary_end
+                elif self._length >= (self._min_chunk_length if is_sentence_end else self._clause_chunk_min_length):
+                    return boundary_end
+            if self._length >= self._max_chunk_length:
+                return self._last_whitespace_index + 1 if self._last_whitespace_index > 0 else index + 1
+        return None
+
+    def _take_chunk(self, end: int) -> str:
+        chunk = self._buffer[:end]
+        self._buffer = self._buffer[end:]
+        # NOTE: the remaining text is examined again, which only happens after a forced split at whitespace
+        self._scan_index = 0
+        self._length = 0
+        self._last_whitespace_index = -1
+        self._is_first_chunk = False
+        return chunk
+
+    async def __aiter__(self) -> AsyncGenerator[str]:
+        while True:
+            # NOTE: no tokens can be added once closed, so all of the text is in the buffer after this
+            self._is_complete = self._is_closed
+            if len(self._tokens) > 0:
+                self._buffer += "".join(self._tokens)
+                self._tokens.clear()
+
+            while (chunk_end := self._find_chunk_end()) is not None:
+                chunk = self._take_chunk(chunk_end)
+                if chunk.strip():
+                    yield chunk
+
+            if self._is_complete:
+                if self._buffer.strip():
+                    yield self._buffer
+                return
+
+            # Wait for more content
+            self._new_token_event.clear()
+            await self._new_token_event.wait()
+
+
+def split_leading_fragment(
+    text: str, *, min_length: int = FIRST_CHUNK_MIN_LENGTH, max_length: int = LEADING_FRAGMENT_MAX_LENGTH
+) -> tuple[str, str]:
+    """Split the text into a short leading fragment and the rest of it.
+
+    The fragment ends at the first sentence or clause boundary once it's at least `min_length` long, or (when no boundary has been found) at the last whitespace before it exceeds `max_length`. Text that isn't longer than `max_length` isn't split, and is returned as the fragment with an empty rest. Lengths are measured like in `AdaptiveChunker`.
+    """
+    if sum(CJK_CHARACTER_WEIGHT if is_cjk_character(char) else 1 for char in text) <= max_length:
+        return text, ""
+    length = 0
+    last_whitespace_index = -1
+    for index, char in enumerate(text):
+        length += CJK_CHARACTER_WEIGHT if is_cjk_character(char) else 1
+        if length > max_length:
+            end = last_whitespace_index + 1 if last_whitespace_index > 0 else index
+            break
+        if char.isspace():
+            last_whitespace_index = index
+        is_boundary = char in CJK_SENTENCE_ENDINGS or char in CJK_CLAUSE_ENDINGS
+        if (char in ASCII_SENTENCE_ENDINGS or char in ASCII_CLAUSE_ENDINGS) and index + 1 < len(text):
+            is_boundary = text[index + 1].isspace()
+        if is_boundary and length >= min_length:
+            end = index + 1
+            while end < len(text) and text[end] in CLOSING_PUNCTUATION:
+                end += 1
+            break
+    else:
+        return text, ""
+    fragment, rest = text[:end].rstrip(), text[end:].lstrip()
+    if len(fragment) == 0 or len(rest) == 0:
+        return text, ""
+    return fragment, rest
+
+
 def strip_emojis(text: str) -> str:
     # Get all emoji unicode characters
     emoji_pattern = re.compile(
@@ -0,0 +1,91 @@
+"""Storage of the transcripts of the audio generated by `/v1/chat/completions`.
+
+Follow-up requests reference the generated audio by its id (`message.audio.id`) instead of resending the transcript, so the transcript needs to be looked up by whichever worker process handles the follow-up request. `InMemoryTranscriptStore` is only visible to the process that generated the audio, while `SqliteTranscriptStore` is shared by all of the processes on the same host.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Protocol
+
+from cachetools import TTLCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# NOTE: expired and excess transcripts are deleted once every this many writes rather than on every write
+SQLITE_EVICTION_INTERVAL = 100
+
+
+class TranscriptStore(Protocol):
+    """Implementations may block, so the methods are called from a worker thread (`asyncio.to_thread`) rather than the event loop thread."""
+
+    def get(self, audio_id: str) -> str | None:
+        """Return the transcript of the audio, or `None` if it's unknown or has expired."""
+        ...
+
+    def set(self, audio_id: str, transcript: str) -> None: ...
+
+
+class InMemoryTranscriptStore:
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self._cache = TTLCache[str, str](maxsize=maxsize, ttl=ttl_seconds)
+
+    def get(self, audio_id: str) -> str | None:
+        return self._cache.get(audio_id)
+
+    def set(self, audio_id: str, transcript: str) -> None:
+        self._cache[audio_id] = transcript
+
+
+class SqliteTranscriptStore:
+    """Keeps the transcripts in a SQLite database, so that they are shared by all of the worker processes using the same file.
+
+    Lookups are a single primary key query. The database is in WAL mode, so reads aren't blocked by writes from other processes.
+    """
+
+    def __init__(self, path: Path, maxsize: int, ttl_seconds: float) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE: autocommit mode (`isolation_level=None`), every statement is its own transaction
+        self._connection = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (audio_id TEXT PRIMARY KEY, transcript TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS transcripts_expires_at ON transcripts (expires_at)")
+
+    def get(self, audio_id: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT transcript FROM transcripts WHERE audio_id = ? AND expires_at > ?", (audio_id, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, audio_id: str, transcript: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO transcripts (audio_id, transcript, expires_at) VALUES (?, ?, ?)",
+                (audio_id, transcript, time.time() + self.ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % SQLITE_EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._connection.execute("DELETE FROM transcripts WHERE expires_at <= ?", (time.time(),))
+        # the transcripts closest to expiring are the oldest ones
+        self._connection.execute(
+            "DELETE FROM transcripts WHERE audio_id IN (SELECT audio_id FROM transcripts ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def close(self) -> None:
+        self._connection.close()
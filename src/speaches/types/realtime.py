@@ -1,5 +1,6 @@
+import base64
 import logging
-from typing import Annotated, Any, Literal
+from typing import Annotated, Any, Literal, Self
 
 from openai.types.beta.realtime import (
     ConversationCreatedEvent as OpenAIConversationCreatedEvent,
@@ -10,10 +11,10 @@ from openai.types.beta.realtime import (
 from openai.types.beta.realtime import (
     ConversationItemDeleteEvent,
     ConversationItemTruncateEvent,
-    InputAudioBufferAppendEvent,
     InputAudioBufferClearEvent,
     InputAudioBufferCommitEvent,
     RateLimitsUpdatedEvent,
+    RealtimeResponseStatus,
     ResponseCancelEvent,
     ResponseCreateEvent,
 )
@@ -29,6 +30,9 @@ from openai.types.beta.realtime import (
 from openai.types.beta.realtime import (
     ErrorEvent as OpenAIErrorEvent,
 )
+from openai.types.beta.realtime import (
+    InputAudioBufferAppendEvent as OpenAIInputAudioBufferAppendEvent,
+)
 from openai.types.beta.realtime import (
     InputAudioBufferClearedEvent as OpenAIInputAudioBufferClearedEvent,
 )
@@ -63,7 +67,7 @@ from openai.types.beta.realtime import (
     ResponseTextDoneEvent as OpenAIResponseTextDoneEvent,
 )
 from openai.types.beta.realtime.error_event import Error
-from pydantic import BaseModel, Discriminator, Field, model_validator
+from pydantic import BaseModel, Discriminator, Field, PrivateAttr, model_validator
 from pydantic.type_adapter import TypeAdapter
 
 from speaches.realtime.utils import generate_event_id, generate_item_id
@@ -207,6 +211,7 @@ class ResponseOutputItemDoneEvent(BaseModel):
 class RealtimeResponse(BaseModel):
     id: str
     status: Literal["completed", "cancelled", "failed", "incomplete"]
+    status_details: RealtimeResponseStatus | None = None
     output: list[ServerConversationItem]
     modalities: list[Literal["text", "audio"]]
     object: Literal["realtime.response"] = "realtime.response"
@@ -228,10 +233,13 @@ class ResponseDoneEvent(BaseModel):
 # Same as openai.types.beta.realtime.session_update_event.SessionTurnDetection but with all the fields made non-nullable
 class TurnDetection(BaseModel):
     create_response: bool
+    interrupt_response: bool = True
     prefix_padding_ms: int
     silence_duration_ms: int
     threshold: float = Field(..., ge=0.0, le=1.0)
     type: Literal["server_vad"] = "server_vad"
+    # NOTE: `speculative_silence_duration_ms` is a custom field not present in the OpenAI API. When set (and shorter than `silence_duration_ms`), the transcription and the chat completion request are started speculatively once this much silence has been detected. They get cancelled if the user resumes speaking before `silence_duration_ms` elapses.
+    speculative_silence_duration_ms: int | None = Field(default=None, ge=0)
 
 
 class InputAudioTranscription(BaseModel):
@@ -241,6 +249,7 @@ class InputAudioTranscription(BaseModel):
 
 
 type AudioFormat = Literal["pcm16", "g711_ulaw", "g711_alaw"]
+type PcmSampleRate = Literal[8000, 16000, 24000, 48000]
 type Modality = Literal["text", "audio"]
 
 
@@ -275,22 +284,44 @@ class Response(BaseModel):
     max_response_output_tokens: int | Literal["inf"]
     modalities: list[Modality]
     output_audio_format: AudioFormat
+    # NOTE: `output_audio_sample_rate` is a custom field not present in the OpenAI API. See `Session.output_audio_sample_rate`
+    output_audio_sample_rate: PcmSampleRate = 24000
     temperature: float  # TODO: should there be lower and upper bounds?
     tool_choice: ToolChoice
     tools: list[Tool]
     voice: str
 
+    @classmethod
+    def from_session(cls, session: "Session") -> Self:
+        # NOTE: this happens for every response, so the (already validated) fields are shared rather than dumped and re-validated. This is safe as `session.update` replaces the session instead of mutating it. `input` is left empty as the conversation's chat messages are used instead (see `Conversation.chat_messages`)
+        return cls.model_construct(
+            conversation="auto",
+            input=[],
+            instructions=session.instructions,
+            max_response_output_tokens=session.max_response_output_tokens,
+            modalities=session.modalities,
+            output_audio_format=session.output_audio_format,
+            output_audio_sample_rate=session.output_audio_sample_rate,
+            temperature=session.temperature,
+            tool_choice=session.tool_choice,
+            tools=session.tools,
+            voice=session.voice,
+        )
+
 
 # TODO: which defaults should be set (if any)?
 class Session(BaseModel):
     id: str  # TODO: should this be auto-generated?
     input_audio_format: AudioFormat
+    # NOTE: `input_audio_sample_rate` and `output_audio_sample_rate` are custom fields not present in the OpenAI API, where `pcm16` audio is always 24kHz. They only apply to `pcm16` (G.711 audio is always 8kHz) and can't be changed in WebRTC sessions
+    input_audio_sample_rate: PcmSampleRate = 24000
     input_audio_transcription: InputAudioTranscription  # NOTE: according to the spec None is a valid value here, but in this implementation it would be impossible to do anything without a transcription model
     instructions: str
     max_response_output_tokens: int | Literal["inf"]
     modalities: list[Modality]
     model: str
     output_audio_format: AudioFormat
+    output_audio_sample_rate: PcmSampleRate = 24000
     temperature: float  # TODO: should there be lower and upper bounds?
     tool_choice: ToolChoice
     tools: list[Tool]
@@ -301,12 +332,14 @@ class Session(BaseModel):
 
 class PartialSession(BaseModel):
     input_audio_format: AudioFormat | NotGiven = NOT_GIVEN
+    input_audio_sample_rate: PcmSampleRate | NotGiven = NOT_GIVEN
     input_audio_transcription: InputAudioTranscription | NotGiven = NOT_GIVEN
     instructions: str | NotGiven = NOT_GIVEN
     max_response_output_tokens: int | Literal["inf"] | NotGiven = NOT_GIVEN
     modalities: list[Modality] | NotGiven = NOT_GIVEN
     model: str | NotGiven = NOT_GIVEN
     output_audio_format: AudioFormat | NotGiven = NOT_GIVEN
+    output_audio_sample_rate: PcmSampleRate | NotGiven = NOT_GIVEN
     temperature: float | NotGiven = NOT_GIVEN
     tool_choice: ToolChoice | NotGiven = NOT_GIVEN
     tools: list[Tool] | NotGiven = NOT_GIVEN
@@ -343,6 +376,23 @@ class InputAudioBufferCommittedEvent(BaseModel):
 # The following classes are the same as the ones in openai.types.beta.realtime but with fields assigned some default values. This is to reduce the amount of boilerplate code when creating these events.
 
 
+class InputAudioBufferAppendEvent(OpenAIInputAudioBufferAppendEvent):
+    type: Literal["input_audio_buffer.append"] = "input_audio_buffer.append"
+
+    # NOTE: set when the audio was received in a binary WebSocket frame (see `speaches.realtime.binary_frames`). In that case `audio` is left empty and the base64 encoding/decoding is skipped entirely. Like `audio`, it's in the session's `input_audio_format`
+    _audio_bytes: bytes | memoryview | None = PrivateAttr(default=None)
+
+    @classmethod
+    def from_audio_bytes(cls, audio: bytes | memoryview, event_id: str | None = None) -> Self:
+        event = cls(audio="", event_id=event_id)
+        event._audio_bytes = audio
+        return event
+
+    @property
+    def audio_bytes(self) -> bytes | memoryview:
+        return self._audio_bytes if self._audio_bytes is not None else base64.b64decode(self.audio)
+
+
 class InputAudioBufferSpeechStartedEvent(OpenAIInputAudioBufferSpeechStartedEvent):
     type: Literal["input_audio_buffer.speech_started"] = "input_audio_buffer.speech_started"
     event_id: str = Field(default_factory=generate_event_id)
@@ -470,6 +520,19 @@ class ResponseAudioDeltaEvent(OpenAIResponseAudioDeltaEvent):
     content_index: int = 0
     output_index: int = 0
 
+    # NOTE: the raw audio (in the session's `output_audio_format`) is kept around so that consumers which don't need base64 (binary WebSocket frames, WebRTC) don't have to decode `delta`
+    _audio_bytes: bytes | None = PrivateAttr(default=None)
+
+    @classmethod
+    def from_audio_bytes(cls, audio: bytes, *, item_id: str, response_id: str) -> Self:
+        event = cls(item_id=item_id, response_id=response_id, delta=base64.b64encode(audio).decode("utf-8"))
+        event._audio_bytes = audio
+        return event
+
+    @property
+    def audio_bytes(self) -> bytes:
+        return self._audio_bytes if self._audio_bytes is not None else base64.b64decode(self.delta)
+
 
 class ResponseAudioDoneEvent(OpenAIResponseAudioDoneEvent):
     type: Literal["response.audio.done"] = "response.audio.done"
@@ -557,6 +620,17 @@ type ResponseServerEvent = (
     | ResponseDoneEvent
 )
 
+
+# NOTE: a custom event not present in the OpenAI API. Only sent when `RealtimeConfig.turn_timings_event` is enabled
+class TurnTimingsEvent(BaseModel):
+    type: Literal["speaches.turn.timings"] = "speaches.turn.timings"
+    event_id: str = Field(default_factory=generate_event_id)
+    item_id: str
+    response_id: str | None
+    timings_ms: dict[str, float]
+    """Milliseconds from the start of the turn until each of the stages that the turn went through."""
+
+
 # https://platform.openai.com/docs/guides/realtime/overview#events
 CLIENT_EVENT_TYPES = {
     "session.update",
@@ -598,6 +672,7 @@ SERVER_EVENT_TYPES = {
     "response.function_call_arguments.delta",
     "response.function_call_arguments.done",
     "rate_limits.updated",
+    "speaches.turn.timings",
 }
 
 ClientEvent = Annotated[
@@ -613,7 +688,8 @@ ServerEvent = Annotated[
     | ConversationServerEvent
     | ResponseServerEvent
     | ErrorEvent
-    | RateLimitsUpdatedEvent,
+    | RateLimitsUpdatedEvent
+    | TurnTimingsEvent,
     Discriminator("type"),
 ]
 
@@ -0,0 +1,101 @@
+"""The HTTP client used to talk to the upstream chat completion API.
+
+A single client is shared by the whole application (see `speaches.dependencies.get_upstream_client`), so that connections are kept alive and reused across requests and realtime sessions instead of every one of them paying for the DNS lookup and the TCP and TLS handshakes.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+from speaches import metrics
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable
+
+    from speaches.config import Config
+
+active_requests_counter = metrics.up_down_counter(
+    "speaches.upstream.requests.active",
+    description="Requests to the chat completion API that are in progress (including reading the streamed response). Being close to `CHAT_COMPLETION_MAX_CONNECTIONS` means that requests are connection-bound.",
+)
+created_connections_counter = metrics.counter(
+    "speaches.upstream.connections.created",
+    description="Connections opened to the chat completion API. Should stay flat once warmed up if connections are being reused.",
+)
+connection_wait_histogram = metrics.histogram(
+    "speaches.upstream.connection.wait_duration",
+    description="Time between a request to the chat completion API being issued and it being sent over a connection. Includes waiting for a free connection in the pool and establishing a new connection.",
+)
+
+
+class _ActiveResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]) -> None:
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Records the connection pool metrics defined in this module."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        sent = False
+        closed = False
+        parent_trace = request.extensions.get("trace")
+
+        # https://www.encode.io/httpcore/extensions/#trace
+        async def trace(event_name: str, info: dict[str, Any]) -> None:
+            nonlocal sent
+            if event_name == "connection.connect_tcp.complete":
+                created_connections_counter.add()
+            elif event_name.endswith(".send_request_headers.started") and not sent:
+                sent = True
+                connection_wait_histogram.record((time.perf_counter() - start) * 1000)
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        def on_close() -> None:
+            nonlocal closed
+            if not closed:
+                closed = True
+                active_requests_counter.add(-1)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        active_requests_counter.add(1)
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            on_close()
+            raise
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _ActiveResponseStream(response.stream, on_close)
+        return response
+
+
+def create_upstream_http_client(config: Config) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=InstrumentedTransport(
+            http2=config.chat_completion_http2,
+            limits=httpx.Limits(
+                max_connections=config.chat_completion_max_connections,
+                max_keepalive_connections=config.chat_completion_max_keepalive_connections,
+                keepalive_expiry=config.chat_completion_keepalive_expiry_seconds,
+            ),
+        ),
+        timeout=httpx.Timeout(
+            config.chat_completion_timeout_seconds, connect=config.chat_completion_connect_timeout_seconds
+        ),
+    )
@@ -1,3 +1,5 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterable, AsyncIterator, Callable
 from datetime import UTC, datetime
 import os
 from typing import Any
@@ -51,3 +53,59 @@ def format_api_proxy_error(exc: "APIProxyError", context: str = "") -> str:
         f"Debug: {exc.debug}\nContext: {context}\nTimestamp: {exc.timestamp}" if debug_mode and exc.debug else ""
     )
     return f"[ERROR] {user_message}\nSuggestions: {', '.join(suggestions)}" + (f"\n{debug_info}" if debug_info else "")
+
+
+class _StreamEnd:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error = error
+
+
+async def pipelined_stream[T, R](  # noqa: C901
+    items: AsyncIterable[T], create_stream: Callable[[T], AsyncIterator[R]], *, max_concurrency: int
+) -> AsyncGenerator[R]:
+    """Yield the output of `create_stream(item)` for every item, in order.
+
+    Streams for upcoming items are started as soon as the items arrive, with at most `max_concurrency` streams being either in progress or waiting to be yielded. The output of the first stream is yielded as soon as it's produced, while the output of the ones after it is buffered until their turn comes. An exception raised by a stream (or by `items`) is re-raised once the output preceding it has been yielded.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    outputs = asyncio.Queue[asyncio.Queue[R | _StreamEnd] | _StreamEnd]()
+    tasks: set[asyncio.Task[None]] = set()
+
+    async def run_stream(item: T, output: asyncio.Queue[R | _StreamEnd]) -> None:
+        try:
+            async for value in create_stream(item):
+                output.put_nowait(value)
+        except Exception as e:  # noqa: BLE001
+            output.put_nowait(_StreamEnd(e))
+        else:
+            output.put_nowait(_StreamEnd())
+
+    async def dispatch() -> None:
+        try:
+            async for item in items:
+                # NOTE: released once the stream's output has been fully yielded
+                await semaphore.acquire()
+                output = asyncio.Queue[R | _StreamEnd]()
+                outputs.put_nowait(output)
+                task = asyncio.create_task(run_stream(item, output))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except Exception as e:  # noqa: BLE001
+            outputs.put_nowait(_StreamEnd(e))
+        else:
+            outputs.put_nowait(_StreamEnd())
+
+    dispatch_task = asyncio.create_task(dispatch())
+    try:
+        while not isinstance(output := await outputs.get(), _StreamEnd):
+            while not isinstance(value := await output.get(), _StreamEnd):
+                yield value
+            if value.error is not None:
+                raise value.error
+            semaphore.release()
+        if output.error is not None:
+            raise output.error
+    finally:
+        dispatch_task.cancel()
+        for task in tasks:
+            task.cancel()
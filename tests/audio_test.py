@@ -0,0 +1,74 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+
+import pytest
+
+from speaches.audio import packetize_audio
+
+SAMPLE_RATE = 1000  # 2 bytes per millisecond
+
+
+@dataclass
+class Pause:
+    seconds: float
+
+
+async def audio_stream(chunks: list[bytes | Pause | Exception]) -> AsyncGenerator[bytes]:
+    """Yield the `bytes` chunks, sleeping for the `Pause` ones and raising the `Exception` ones."""
+    for chunk in chunks:
+        if isinstance(chunk, Pause):
+            await asyncio.sleep(chunk.seconds)
+        elif isinstance(chunk, Exception):
+            raise chunk
+        else:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_packetize_audio() -> None:
+    # tiny chunks are coalesced and large ones are split
+    packets = [
+        packet
+        async for packet in packetize_audio(
+            audio_stream([b"\x01" * 6, b"\x02" * 8, b"\x03" * 50, b"\x04" * 3]),
+            sample_rate=SAMPLE_RATE,
+            packet_duration_ms=10,
+        )
+    ]
+    assert [len(packet) for packet in packets] == [20, 20, 20, 7]
+    assert b"".join(packets) == b"\x01" * 6 + b"\x02" * 8 + b"\x03" * 50 + b"\x04" * 3
+
+
+@pytest.mark.asyncio
+async def test_packetize_audio_max_hold() -> None:
+    packets = [
+        packet
+        async for packet in packetize_audio(
+            audio_stream([b"\x01" * 25, Pause(0.1), b"\x02" * 40]),
+            sample_rate=SAMPLE_RATE,
+            packet_duration_ms=10,
+            max_hold_ms=20,
+        )
+    ]
+    # the partial packet isn't held for the whole 100ms pause, the trailing partial sample is kept
+    assert [len(packet) for packet in packets] == [20, 4, 20, 20, 1]
+    assert b"".join(packets) == b"\x01" * 25 + b"\x02" * 40
+
+
+@pytest.mark.asyncio
+async def test_packetize_audio_error() -> None:
+    packets: list[bytes] = []
+
+    async def collect_packets() -> None:
+        async for packet in packetize_audio(
+            audio_stream([b"\x01" * 30, ValueError("synthesis failed")]),
+            sample_rate=SAMPLE_RATE,
+            packet_duration_ms=10,
+        ):
+            packets.append(packet)  # noqa: PERF401
+
+    with pytest.raises(ValueError, match="synthesis failed"):
+        await collect_packets()
+    # the audio preceding the error is still yielded
+    assert [len(packet) for packet in packets] == [20, 10]
@@ -0,0 +1,120 @@
+import asyncio
+from collections.abc import AsyncGenerator
+import time
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletionChunk
+import pytest
+
+from speaches.routers.chat import AudioChatStream, CompletionCreateParamsBase
+from speaches.text_utils import AdaptiveChunker
+from speaches.transcript_store import InMemoryTranscriptStore
+
+TOKEN_DELAY_SECONDS = 0.02
+
+
+class FakeSpeechService:
+    def __init__(self) -> None:
+        self.synthesis_started_at: list[float] = []
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        *,
+        model: str,  # noqa: ARG002
+        voice: str,  # noqa: ARG002
+        speed: float = 1.0,  # noqa: ARG002
+        sample_rate: int | None = None,  # noqa: ARG002
+        early_first_chunk: bool = False,  # noqa: ARG002
+    ) -> AsyncGenerator[bytes]:
+        self.synthesis_started_at.append(time.perf_counter())
+        yield b"\x00\x00" * len(text)
+
+
+async def chat_completion_chunk_stream(chunks: list[dict | Exception]) -> AsyncGenerator[ChatCompletionChunk]:
+    for chunk in chunks:
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield ChatCompletionChunk.model_validate(
+            {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "llm", **chunk}
+        )
+        await asyncio.sleep(TOKEN_DELAY_SECONDS)
+
+
+def create_audio_chat_stream(
+    chunks: list[dict | Exception], speech_service: FakeSpeechService, transcript_store: InMemoryTranscriptStore
+) -> AudioChatStream:
+    body = CompletionCreateParamsBase.model_validate(
+        {
+            "model": "llm",
+            "messages": [{"role": "user", "content": "Hi"}],
+            "modalities": ["text", "audio"],
+            "audio": {"voice": "alloy", "format": "pcm16"},
+        }
+    )
+    return AudioChatStream(
+        chat_completion_chunk_stream(chunks),  # pyright: ignore[reportArgumentType]
+        speech_service,  # pyright: ignore[reportArgumentType]
+        AdaptiveChunker(),
+        body,
+        transcript_store,
+        transcript_ttl_seconds=60,
+    )
+
+
+@pytest.mark.asyncio
+async def test_audio_chat_completion_synthesizes_while_generating() -> None:
+    tokens = ["Hello there, how are you doing today? ", "I'm", " doing", " well,", " thanks", " for", " asking."]
+    chunks: list[dict | Exception] = [{"choices": [{"index": 0, "delta": {"content": token}}]} for token in tokens]
+    chunks.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    chunks.append({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 7, "total_tokens": 12}})
+    speech_service = FakeSpeechService()
+    transcript_store = InMemoryTranscriptStore(maxsize=10, ttl_seconds=60)
+    audio_chat_stream = create_audio_chat_stream(chunks, speech_service, transcript_store)
+
+    start = time.perf_counter()
+    chat_completion = await audio_chat_stream.chat_completion()
+    generation_duration = time.perf_counter() - start
+
+    transcript = "".join(tokens)
+    message = chat_completion.choices[0].message
+    assert message.content is None
+    assert message.audio is not None
+    assert message.audio.transcript == transcript
+    assert transcript_store.get(message.audio.id) == transcript
+    assert chat_completion.choices[0].finish_reason == "stop"
+    assert chat_completion.usage is not None
+    assert chat_completion.usage.total_tokens == 12
+    # the first sentence is synthesized long before the text generation finishes
+    assert speech_service.synthesis_started_at[0] - start < generation_duration / 2
+
+
+@pytest.mark.asyncio
+async def test_audio_chat_completion_without_choices() -> None:
+    chunks: list[dict | Exception] = [
+        {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 0, "total_tokens": 5}}
+    ]
+    audio_chat_stream = create_audio_chat_stream(
+        chunks, FakeSpeechService(), InMemoryTranscriptStore(maxsize=10, ttl_seconds=60)
+    )
+
+    chat_completion = await audio_chat_stream.chat_completion()
+
+    assert chat_completion.id.startswith("chatcmpl-")
+    assert chat_completion.choices[0].message.audio is None
+
+
+@pytest.mark.asyncio
+async def test_audio_chat_completion_upstream_error() -> None:
+    chunks: list[dict | Exception] = [
+        {"choices": [{"index": 0, "delta": {"content": "Hello there, how are you doing today? "}}]},
+        openai.APIConnectionError(request=httpx.Request("POST", "http://localhost/v1/chat/completions")),
+    ]
+    audio_chat_stream = create_audio_chat_stream(
+        chunks, FakeSpeechService(), InMemoryTranscriptStore(maxsize=10, ttl_seconds=60)
+    )
+
+    # the original error is raised rather than the `ExceptionGroup` of the task group
+    with pytest.raises(openai.APIConnectionError):
+        await audio_chat_stream.chat_completion()
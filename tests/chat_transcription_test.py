@@ -0,0 +1,94 @@
+import asyncio
+import base64
+from io import BytesIO
+
+from av.error import InvalidDataError
+from fastapi import HTTPException
+import numpy as np
+from numpy.typing import NDArray
+import pytest
+import soundfile as sf
+
+from speaches.routers.chat import transcribe_input_audio_parts
+from speaches.types.chat import ChatCompletionContentPartInputAudioParam
+
+
+def create_input_audio_part(audio: NDArray[np.float32]) -> ChatCompletionContentPartInputAudioParam:
+    file = BytesIO()
+    sf.write(file, audio, samplerate=16000, format="wav")
+    return ChatCompletionContentPartInputAudioParam.model_validate(
+        {"type": "input_audio", "input_audio": {"data": base64.b64encode(file.getvalue()).decode(), "format": "wav"}}
+    )
+
+
+class FakeTranscriptionService:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error = error
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+
+    async def transcribe(
+        self,
+        audio: NDArray[np.float32] | NDArray[np.int16],
+        *,
+        model: str,
+        language: str | None = None,  # noqa: ARG002
+        prompt: str | None = None,  # noqa: ARG002
+    ) -> str:
+        if self.error is not None:
+            raise self.error
+        self.calls += 1
+        call_number = self.calls
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return f"{model} transcript {call_number} of {len(audio)} samples"
+
+
+@pytest.mark.asyncio
+async def test_transcribe_input_audio_parts_concurrently_and_cached() -> None:
+    transcription_service = FakeTranscriptionService()
+    # NOTE: random audio so that transcripts cached by other tests aren't reused
+    rng = np.random.default_rng()
+    first_audio, second_audio, third_audio = (rng.uniform(-0.5, 0.5, 1600).astype(np.float32) for _ in range(3))
+    content_parts = [create_input_audio_part(audio) for audio in (first_audio, second_audio, first_audio, third_audio)]
+
+    transcripts = await transcribe_input_audio_parts(
+        transcription_service, content_parts, model="whisper-1", max_concurrency=2
+    )
+    assert transcription_service.calls == 3
+    assert transcription_service.max_running == 2
+    assert transcripts[0] == transcripts[2]
+    assert len(set(transcripts)) == 3
+    assert all(transcript.endswith("of 1600 samples") for transcript in transcripts)
+
+    assert (
+        await transcribe_input_audio_parts(
+            transcription_service, content_parts[:2], model="whisper-1", max_concurrency=2
+        )
+        == transcripts[:2]
+    )
+    assert transcription_service.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_transcribe_input_audio_parts_errors() -> None:
+    rng = np.random.default_rng()
+    content_parts = [create_input_audio_part(rng.uniform(-0.5, 0.5, 1600).astype(np.float32)) for _ in range(2)]
+    error = HTTPException(status_code=503, detail="Transcription model is unavailable")
+    # the original error is raised rather than the `ExceptionGroup` of the task group
+    with pytest.raises(HTTPException) as exc_info:
+        await transcribe_input_audio_parts(
+            FakeTranscriptionService(error), content_parts, model="whisper-1", max_concurrency=2
+        )
+    assert exc_info.value is error
+
+    malformed_content_part = ChatCompletionContentPartInputAudioParam.model_validate(
+        {"type": "input_audio", "input_audio": {"data": base64.b64encode(b"not audio").decode(), "format": "wav"}}
+    )
+    with pytest.raises(InvalidDataError):
+        await transcribe_input_audio_parts(
+            FakeTranscriptionService(), [malformed_content_part], model="whisper-1", max_concurrency=2
+        )
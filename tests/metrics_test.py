@@ -0,0 +1,35 @@
+import pytest
+
+from speaches.metrics import Counter, Histogram, UpDownCounter
+
+
+def test_counter() -> None:
+    counter = Counter("test.counter")
+    counter.add()
+    counter.add(2, {"outcome": "promoted"})
+    counter.add(1, {"outcome": "promoted"})
+
+    assert counter.snapshot()["values"] == {"": 1, "outcome=promoted": 3}
+
+
+def test_histogram() -> None:
+    histogram = Histogram("test.histogram", boundaries=(10.0, 100.0, 1000.0))
+    for value in range(1, 101):
+        histogram.record(value)
+
+    values = histogram.snapshot()["values"][""]
+    assert values["count"] == 100
+    assert values["sum"] == 5050
+    assert values["min"] == 1
+    assert values["max"] == 100
+    assert values["p50"] == pytest.approx(50, abs=1)
+    assert values["p99"] == pytest.approx(99, abs=1)
+
+
+def test_up_down_counter() -> None:
+    counter = UpDownCounter("test.up_down_counter")
+    counter.add(1)
+    counter.add(1)
+    counter.add(-1)
+
+    assert counter.snapshot()["values"] == {"": 1}
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from speaches.realtime.audio_format import audio_format_sample_rate, decode_audio, encode_audio
+from speaches.types.realtime import AudioFormat
+
+
+def test_encode_silence() -> None:
+    silence = np.zeros(4, dtype=np.int16).tobytes()
+    assert encode_audio(silence, "pcm16") == silence
+    assert encode_audio(silence, "g711_ulaw") == b"\xff" * 4
+    assert encode_audio(silence, "g711_alaw") == b"\xd5" * 4
+
+
+def test_decode_extremes() -> None:
+    assert decode_audio(b"\x00\x80", "g711_ulaw").tolist() == [-32124, 32124]
+    assert decode_audio(b"\x2a\xaa", "g711_alaw").tolist() == [-32256, 32256]
+
+
+@pytest.mark.parametrize("audio_format", ["g711_ulaw", "g711_alaw"])
+def test_g711_round_trip(audio_format: AudioFormat) -> None:
+    pcm16_audio = np.arange(-32768, 32768, 7, dtype=np.int16)
+    samples = pcm16_audio.astype(np.int32)
+    decoded = decode_audio(encode_audio(pcm16_audio.tobytes(), audio_format), audio_format).astype(np.int32)
+    # G.711 is logarithmic, so the quantization error grows with the magnitude of the sample
+    error = np.abs(decoded - samples)
+    assert np.all(error <= np.maximum(np.abs(samples) // 16, 16))
+    # re-encoding decoded audio is lossless
+    encoded = encode_audio(decoded.astype(np.int16).tobytes(), audio_format)
+    assert encode_audio(decode_audio(encoded, audio_format).tobytes(), audio_format) == encoded
+
+
+def test_audio_format_sample_rate() -> None:
+    assert audio_format_sample_rate("pcm16", 16000) == 16000
+    assert audio_format_sample_rate("g711_ulaw", 16000) == 8000
+    assert audio_format_sample_rate("g711_alaw", 48000) == 8000
@@ -0,0 +1,127 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from unittest.mock import Mock
+
+import pytest
+import pytest_asyncio
+
+from speaches.config import RealtimeConfig
+from speaches.realtime.context import SessionContext
+from speaches.realtime.rtc.audio_stream_track import FRAME_SIZE, PREBUFFER_FRAMES, AudioStreamTrack
+from speaches.realtime.session import create_session_object_configuration
+from speaches.types.realtime import (
+    InputAudioBufferSpeechStartedEvent,
+    RealtimeResponse,
+    ResponseAudioDeltaEvent,
+    ResponseAudioDoneEvent,
+    ResponseDoneEvent,
+)
+
+DELTA_AUDIO = b"\x01\x00" * 480
+SILENCE = bytes(FRAME_SIZE)
+
+
+@pytest_asyncio.fixture()
+async def track() -> AsyncGenerator[AudioStreamTrack]:
+    ctx = SessionContext(
+        transcription_service=Mock(),
+        completion_client=Mock(),
+        speech_service=Mock(),
+        session=create_session_object_configuration("model"),
+        realtime_config=RealtimeConfig(),
+    )
+    track = AudioStreamTrack(ctx)
+    await asyncio.sleep(0)  # let the track subscribe to the pubsub
+    yield track
+    track.stop()
+
+
+async def publish(
+    track: AudioStreamTrack, *events: ResponseAudioDeltaEvent | ResponseAudioDoneEvent | ResponseDoneEvent
+) -> None:
+    for event in events:
+        track.ctx.pubsub.publish_nowait(event)
+    await asyncio.sleep(0.01)  # let the track process the events
+
+
+def audio_delta(response_id: str, audio: bytes = DELTA_AUDIO) -> ResponseAudioDeltaEvent:
+    return ResponseAudioDeltaEvent.from_audio_bytes(audio, item_id="item_1", response_id=response_id)
+
+
+def buffered_audio(track: AudioStreamTrack) -> bytes:
+    return bytes(track._buffer)  # noqa: SLF001
+
+
+def next_frames(track: AudioStreamTrack, count: int) -> list[bytes]:
+    return [track._next_frame_data() for _ in range(count)]  # noqa: SLF001
+
+
+def frame_audio(frame_count: float) -> bytes:
+    """Non-silent audio in which every frame is distinct."""
+    size = int(frame_count * FRAME_SIZE)
+    return (bytes(range(1, 256)) * (size // 255 + 1))[:size]
+
+
+@pytest.mark.asyncio
+async def test_playback_starts_once_prebuffered(track: AudioStreamTrack) -> None:
+    audio = frame_audio(PREBUFFER_FRAMES)
+    await publish(track, audio_delta("resp_1", audio[:-FRAME_SIZE]))
+    assert next_frames(track, 2) == [SILENCE, SILENCE]
+
+    await publish(track, audio_delta("resp_1", audio[-FRAME_SIZE:]))
+    frames = next_frames(track, PREBUFFER_FRAMES + 1)
+    assert all(type(frame) is bytes for frame in frames)
+    assert b"".join(frames) == audio + SILENCE
+
+
+@pytest.mark.asyncio
+async def test_underrun_keeps_partial_frame(track: AudioStreamTrack) -> None:
+    audio = frame_audio(PREBUFFER_FRAMES + 0.5)
+    await publish(track, audio_delta("resp_1", audio))
+    assert b"".join(next_frames(track, PREBUFFER_FRAMES)) == audio[: PREBUFFER_FRAMES * FRAME_SIZE]
+
+    # the partial frame isn't sent until enough audio has been buffered again
+    assert next_frames(track, 1) == [SILENCE]
+    assert buffered_audio(track) == audio[PREBUFFER_FRAMES * FRAME_SIZE :]
+    await publish(track, audio_delta("resp_1"))
+    assert next_frames(track, 1) == [SILENCE]
+
+
+@pytest.mark.asyncio
+async def test_tail_is_padded_with_silence(track: AudioStreamTrack) -> None:
+    audio = frame_audio(1.5)
+    await publish(track, audio_delta("resp_1", audio), ResponseAudioDoneEvent(item_id="item_1", response_id="resp_1"))
+
+    # playback starts without waiting for the buffer to be filled, since no more audio is coming
+    frames = next_frames(track, 3)
+    assert frames[0] == audio[:FRAME_SIZE]
+    assert frames[1] == audio[FRAME_SIZE:] + SILENCE[: FRAME_SIZE // 2]
+    assert frames[2] == SILENCE
+    assert buffered_audio(track) == b""
+
+
+@pytest.mark.asyncio
+async def test_cancelled_response_audio_is_dropped(track: AudioStreamTrack) -> None:
+    await publish(track, audio_delta("resp_1"))
+    assert buffered_audio(track) == DELTA_AUDIO
+
+    cancelled_response = RealtimeResponse(id="resp_1", status="cancelled", output=[], modalities=["audio"])
+    await publish(track, ResponseDoneEvent(response=cancelled_response))
+    assert buffered_audio(track) == b""
+
+    # deltas of the cancelled response that were published before the cancellation took effect aren't buffered
+    await publish(track, audio_delta("resp_1"))
+    assert buffered_audio(track) == b""
+
+    await publish(track, audio_delta("resp_2"))
+    assert buffered_audio(track) == DELTA_AUDIO
+
+
+@pytest.mark.asyncio
+async def test_speech_started_flushes_audio(track: AudioStreamTrack) -> None:
+    await publish(track, audio_delta("resp_1"), audio_delta("resp_1"))
+    assert buffered_audio(track) == 2 * DELTA_AUDIO
+
+    track.ctx.pubsub.publish_nowait(InputAudioBufferSpeechStartedEvent(audio_start_ms=0, item_id="item_2"))
+    await publish(track, audio_delta("resp_1"))
+    assert buffered_audio(track) == b""
@@ -0,0 +1,99 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from speaches.config import RealtimeConfig
+from speaches.realtime.binary_frames import (
+    decode_input_audio_buffer_append_frame,
+    decode_response_audio_delta_frame,
+    encode_input_audio_buffer_append_frame,
+    encode_response_audio_delta_frame,
+)
+from speaches.realtime.context import SessionContext
+from speaches.realtime.input_audio_buffer_event_router import handle_input_audio_buffer_append
+from speaches.realtime.session import create_session_object_configuration
+from speaches.types.realtime import AudioFormat, ErrorEvent, ResponseAudioDeltaEvent
+
+
+def create_session_context(input_audio_format: AudioFormat) -> SessionContext:
+    session = create_session_object_configuration("model")
+    session.input_audio_format = input_audio_format
+    session.turn_detection = None
+    return SessionContext(
+        transcription_service=Mock(),
+        completion_client=Mock(),
+        speech_service=Mock(),
+        session=session,
+        realtime_config=RealtimeConfig(),
+    )
+
+
+def test_input_audio_buffer_append_frame_round_trip() -> None:
+    audio = np.arange(-100, 100, dtype=np.int16).tobytes()
+    frame = encode_input_audio_buffer_append_frame(audio, event_id="event_123")
+
+    event = decode_input_audio_buffer_append_frame(frame)
+
+    assert event.type == "input_audio_buffer.append"
+    assert event.event_id == "event_123"
+    assert event.audio == ""
+    assert bytes(event.audio_bytes) == audio
+
+
+def test_input_audio_buffer_append_frame_without_event_id() -> None:
+    event = decode_input_audio_buffer_append_frame(encode_input_audio_buffer_append_frame(b"\x01\x00"))
+
+    assert event.event_id is None
+    assert np.frombuffer(event.audio_bytes, dtype=np.int16).tolist() == [1]
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"",
+        b"\x02\x00\x00\x00",  # wrong kind
+        b"\x01\x05abc",  # id longer than the frame
+    ],
+)
+def test_invalid_input_audio_buffer_append_frame(frame: bytes) -> None:
+    with pytest.raises(ValueError):  # noqa: PT011
+        decode_input_audio_buffer_append_frame(frame)
+
+
+@pytest.mark.parametrize("audio_format", ["g711_ulaw", "g711_alaw"])
+def test_g711_input_audio_buffer_append_frame_with_odd_length(audio_format: AudioFormat) -> None:
+    ctx = create_session_context(audio_format)
+    errors = ctx.pubsub.subscribe("error")
+
+    # G.711 audio has a single byte per sample, so any number of bytes is valid
+    handle_input_audio_buffer_append(ctx, decode_input_audio_buffer_append_frame(b"\x01\x00" + b"\xff" * 801))
+
+    input_audio_buffer = next(iter(ctx.input_audio_buffers.values()))
+    assert input_audio_buffer.size == 1602  # 801 samples at 8kHz resampled to 16kHz
+    assert errors.empty()
+
+
+def test_pcm16_input_audio_buffer_append_frame_with_odd_length() -> None:
+    ctx = create_session_context("pcm16")
+    errors = ctx.pubsub.subscribe("error")
+
+    handle_input_audio_buffer_append(ctx, decode_input_audio_buffer_append_frame(b"\x01\x05event" + b"\x00" * 3))
+
+    input_audio_buffer = next(iter(ctx.input_audio_buffers.values()))
+    assert input_audio_buffer.size == 0
+    error = errors.get_nowait()
+    assert isinstance(error, ErrorEvent)
+    assert error.error.event_id == "event"
+
+
+def test_response_audio_delta_frame_round_trip() -> None:
+    audio = np.arange(0, 480, dtype=np.int16).tobytes()
+    event = ResponseAudioDeltaEvent.from_audio_bytes(audio, item_id="item_123", response_id="resp_123")
+
+    decoded_event = decode_response_audio_delta_frame(encode_response_audio_delta_frame(event))
+
+    assert decoded_event.item_id == "item_123"
+    assert decoded_event.response_id == "resp_123"
+    assert decoded_event.audio_bytes == audio
+    assert decoded_event.delta == event.delta
@@ -0,0 +1,71 @@
+from speaches.realtime.conversation_event_router import Conversation
+from speaches.realtime.pubsub import EventPubSub
+from speaches.types.realtime import (
+    ConversationItemContentInputAudio,
+    ConversationItemContentInputText,
+    ConversationItemFunctionCall,
+    ConversationItemFunctionCallOutput,
+    ConversationItemMessage,
+)
+
+
+def user_message(text: str) -> ConversationItemMessage:
+    return ConversationItemMessage(
+        role="user", status="completed", content=[ConversationItemContentInputText(type="input_text", text=text)]
+    )
+
+
+def test_chat_messages_are_cached_once_final() -> None:
+    conversation = Conversation(EventPubSub())
+    audio_content = ConversationItemContentInputAudio(type="input_audio", transcript=None)
+    audio_item = ConversationItemMessage(role="user", status="completed", content=[audio_content])
+    conversation.create_item(user_message("Hello"))
+    conversation.create_item(audio_item)
+
+    # the transcript isn't available yet
+    assert conversation.chat_messages() == [{"role": "user", "content": "Hello"}]
+    audio_content.transcript = "How are you?"
+    messages = conversation.chat_messages()
+    assert messages == [{"role": "user", "content": "Hello"}, {"role": "user", "content": "How are you?"}]
+    assert conversation.chat_messages()[1] is messages[1]
+
+    conversation.delete_item(audio_item.id)
+    assert conversation.chat_messages() == [{"role": "user", "content": "Hello"}]
+
+
+def test_chat_messages_with_pending_items() -> None:
+    conversation = Conversation(EventPubSub())
+    conversation.create_item(user_message("Hello"))
+    pending_item = user_message("World")
+
+    assert conversation.chat_messages(pending_item) == [
+        {"role": "user", "content": "Hello"},
+        {"role": "user", "content": "World"},
+    ]
+    assert pending_item.id not in conversation.items
+
+
+def test_chat_messages_truncation() -> None:
+    conversation = Conversation(EventPubSub(), max_chat_history_chars=10)
+    for text in ("aaaa", "bbbb", "cccc", "dddddddddddd"):
+        conversation.create_item(user_message(text))
+
+    # the most recent message is kept even though it's over the limit
+    assert conversation.chat_messages() == [{"role": "user", "content": "dddddddddddd"}]
+    conversation.create_item(user_message("ee"))
+    assert conversation.chat_messages() == [{"role": "user", "content": "ee"}]
+    conversation.create_item(user_message("ff"))
+    assert conversation.chat_messages() == [{"role": "user", "content": "ee"}, {"role": "user", "content": "ff"}]
+
+
+def test_chat_messages_truncation_drops_orphaned_tool_messages() -> None:
+    conversation = Conversation(EventPubSub(), max_chat_history_chars=20)
+    conversation.create_item(
+        ConversationItemFunctionCall(
+            status="completed", call_id="call_1", name="get_weather", arguments='{"city": "Paris"}'
+        )
+    )
+    conversation.create_item(ConversationItemFunctionCallOutput(status="completed", call_id="call_1", output="sunny"))
+    conversation.create_item(user_message("Thanks!"))
+
+    assert conversation.chat_messages() == [{"role": "user", "content": "Thanks!"}]
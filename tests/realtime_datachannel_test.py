@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from speaches.realtime.rtc.datachannel import (
+    FLAG_DEFLATE,
+    FLAG_MORE_FRAGMENTS,
+    BinaryMessageDecoder,
+    encode_binary_message,
+    negotiate_max_message_size,
+)
+
+OFFER_SDP = """v=0
+o=- 0 0 IN IP4 127.0.0.1
+s=-
+t=0 0
+a=group:BUNDLE 0
+m=application 9 UDP/DTLS/SCTP webrtc-datachannel
+c=IN IP4 0.0.0.0
+a=mid:0
+a=sctp-port:5000
+a=max-message-size:{max_message_size}
+"""
+
+
+@pytest.mark.parametrize(
+    ("max_message_size", "expected_max_message_size"),
+    [(1024, 1024), (262144, 65536), (0, 65536)],
+)
+def test_negotiate_max_message_size(max_message_size: int, expected_max_message_size: int) -> None:
+    assert negotiate_max_message_size(OFFER_SDP.format(max_message_size=max_message_size)) == expected_max_message_size
+
+
+def test_small_message_is_sent_as_is() -> None:
+    message = b'{"type":"response.done"}'
+    (data,) = encode_binary_message(message, max_message_size=65536, deflate_min_size=1024)
+
+    assert data[0] == 0
+    assert BinaryMessageDecoder().feed(data) == message
+
+
+def test_large_message_is_compressed_and_fragmented() -> None:
+    message = json.dumps({"type": "response.audio_transcript.done", "transcript": "hello world " * 1000}).encode()
+    fragments = encode_binary_message(message, max_message_size=64, deflate_min_size=1024)
+
+    assert len(fragments) > 1
+    assert all(len(fragment) <= 64 for fragment in fragments)
+    assert fragments[0][0] & FLAG_DEFLATE
+    assert all(fragment[0] & FLAG_MORE_FRAGMENTS for fragment in fragments[:-1])
+    assert not fragments[-1][0] & FLAG_MORE_FRAGMENTS
+
+    decoder = BinaryMessageDecoder()
+    decoded_messages = [decoder.feed(fragment) for fragment in fragments]
+    assert decoded_messages[:-1] == [None] * (len(fragments) - 1)
+    assert decoded_messages[-1] == message
+
+
+def test_compression_disabled() -> None:
+    message = b"a" * 4096
+    fragments = encode_binary_message(message, max_message_size=65536, deflate_min_size=None)
+
+    assert fragments == [b"\x00" + message]
+
+
+def test_invalid_compressed_message() -> None:
+    with pytest.raises(ValueError, match="decompress"):
+        BinaryMessageDecoder().feed(bytes((FLAG_DEFLATE,)) + b"not deflate")
@@ -0,0 +1,150 @@
+import asyncio
+from contextlib import aclosing
+
+from openai.types.beta.realtime import InputAudioBufferClearEvent, InputAudioBufferCommitEvent
+import pytest
+
+from speaches.realtime.message_manager import WsServerMessageManager
+from speaches.realtime.pubsub import EventPubSub
+from speaches.types.realtime import InputAudioBufferClearedEvent
+
+
+def test_subscribe_by_event_type() -> None:
+    pubsub = EventPubSub()
+    clear_subscription = pubsub.subscribe("input_audio_buffer.clear")
+    all_subscription = pubsub.subscribe()
+
+    clear_event = InputAudioBufferClearEvent(type="input_audio_buffer.clear")
+    commit_event = InputAudioBufferCommitEvent(type="input_audio_buffer.commit")
+    pubsub.publish_nowait(clear_event)
+    pubsub.publish_nowait(commit_event)
+
+    # events are shared between subscribers, not copied
+    assert clear_subscription.get_nowait() is clear_event
+    assert clear_subscription.empty()
+    assert all_subscription.get_nowait() is clear_event
+    assert all_subscription.get_nowait() is commit_event
+
+
+def test_unsubscribe() -> None:
+    pubsub = EventPubSub()
+    subscription = pubsub.subscribe("input_audio_buffer.clear")
+    pubsub.unsubscribe(subscription)
+
+    pubsub.publish_nowait(InputAudioBufferClearEvent(type="input_audio_buffer.clear"))
+
+    assert subscription.empty()
+    assert len(pubsub.subscribers_by_type) == 0
+
+
+def test_history_size() -> None:
+    events = [InputAudioBufferClearEvent(type="input_audio_buffer.clear") for _ in range(5)]
+
+    pubsub = EventPubSub()
+    for event in events:
+        pubsub.publish_nowait(event)
+    assert len(pubsub.events) == 0
+
+    pubsub = EventPubSub(history_size=2)
+    for event in events:
+        pubsub.publish_nowait(event)
+    assert list(pubsub.events) == events[-2:]
+
+    pubsub = EventPubSub(history_size=-1)
+    for event in events:
+        pubsub.publish_nowait(event)
+    assert list(pubsub.events) == events
+
+
+def test_overflow_drop_oldest() -> None:
+    pubsub = EventPubSub(max_queue_size=2, overflow_policy="drop_oldest")
+    subscription = pubsub.subscribe()
+    events = [InputAudioBufferClearEvent(type="input_audio_buffer.clear") for _ in range(3)]
+    for event in events:
+        pubsub.publish_nowait(event)
+
+    assert subscription.dropped_events == 1
+    assert subscription.get_nowait() is events[1]
+    assert subscription.get_nowait() is events[2]
+
+
+def test_overflow_drop_newest() -> None:
+    pubsub = EventPubSub(max_queue_size=2, overflow_policy="drop_newest")
+    subscription = pubsub.subscribe()
+    events = [InputAudioBufferClearEvent(type="input_audio_buffer.clear") for _ in range(3)]
+    for event in events:
+        pubsub.publish_nowait(event)
+
+    assert subscription.dropped_events == 1
+    assert subscription.get_nowait() is events[0]
+    assert subscription.get_nowait() is events[1]
+
+
+@pytest.mark.asyncio
+async def test_overflow_block() -> None:
+    pubsub = EventPubSub(max_queue_size=1, overflow_policy="block")
+    subscription = pubsub.subscribe()
+    pubsub.publish_nowait(InputAudioBufferClearEvent(type="input_audio_buffer.clear"))
+
+    with pytest.raises(asyncio.QueueFull):
+        pubsub.publish_nowait(InputAudioBufferClearEvent(type="input_audio_buffer.clear"))
+
+    publish_task = asyncio.create_task(pubsub.publish(InputAudioBufferClearEvent(type="input_audio_buffer.clear")))
+    await asyncio.sleep(0.01)
+    assert not publish_task.done()
+
+    await subscription.get()
+    await asyncio.wait_for(publish_task, timeout=1)
+    assert subscription.dropped_events == 0
+
+
+@pytest.mark.asyncio
+async def test_poll_is_unbounded() -> None:
+    pubsub = EventPubSub(max_queue_size=1)
+    events = [InputAudioBufferClearEvent(type="input_audio_buffer.clear") for _ in range(3)]
+    received = []
+
+    async def consume() -> None:
+        async with aclosing(pubsub.poll()) as poll:
+            async for event in poll:
+                received.append(event)
+                if len(received) == len(events):
+                    break
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.01)
+    for event in events:
+        pubsub.publish_nowait(event)
+    await asyncio.wait_for(task, timeout=1)
+
+    assert received == events
+    assert len(pubsub.subscribers) == 0
+
+
+class SlowWebSocket:
+    def __init__(self, expected_messages: int) -> None:
+        self.expected_messages = expected_messages
+        self.sent: list[str] = []
+        self.done = asyncio.Event()
+
+    async def send_text(self, data: str) -> None:
+        await asyncio.sleep(0.001)
+        self.sent.append(data)
+        if len(self.sent) == self.expected_messages:
+            self.done.set()
+
+
+@pytest.mark.asyncio
+async def test_slow_transport_receives_every_server_event() -> None:
+    pubsub = EventPubSub(max_queue_size=2, overflow_policy="drop_oldest")
+    events = [InputAudioBufferClearedEvent(event_id=f"event_{i}") for i in range(10)]
+    ws = SlowWebSocket(expected_messages=len(events))
+    sender_task = asyncio.create_task(WsServerMessageManager(pubsub).sender(ws))  # pyright: ignore[reportArgumentType]
+    await asyncio.sleep(0.01)
+
+    for event in events:
+        pubsub.publish_nowait(event)
+    await asyncio.wait_for(ws.done.wait(), timeout=1)
+    sender_task.cancel()
+
+    assert ws.sent == [pubsub.encode(event) for event in events]
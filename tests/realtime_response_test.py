@@ -0,0 +1,203 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+from openai.types.chat import ChatCompletionChunk
+import pytest
+
+from speaches.config import RealtimeConfig
+from speaches.realtime.context import SessionContext
+from speaches.realtime.conversation_event_router import Conversation
+from speaches.realtime.pubsub import EventPubSub
+from speaches.realtime.response_event_router import (
+    ResponseHandler,
+    handle_input_audio_buffer_speech_started,
+    handle_response_cancel_event,
+    handle_response_create_event,
+)
+from speaches.realtime.session import create_session_object_configuration
+from speaches.types.realtime import (
+    ErrorEvent,
+    InputAudioBufferSpeechStartedEvent,
+    Response,
+    ResponseAudioDeltaEvent,
+    ResponseCancelEvent,
+    ResponseCreateEvent,
+    ResponseDoneEvent,
+)
+
+TOKEN_DELAY_SECONDS = 0.01
+
+
+class FakeChunkStream:
+    def __init__(self, tokens: list[str], token_delay: float = 0) -> None:
+        self.tokens = iter(tokens)
+        self.token_delay = token_delay
+        self.closed = False
+
+    def __aiter__(self) -> "FakeChunkStream":
+        return self
+
+    async def __anext__(self) -> ChatCompletionChunk:
+        token = next(self.tokens, None)
+        if token is None:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.token_delay)
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "llm",
+                "choices": [{"index": 0, "delta": {"content": token}}],
+            }
+        )
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, tokens: list[str], token_delay: float = 0) -> None:
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.chunk_streams: list[FakeChunkStream] = []
+
+    async def create(self, **_kwargs: object) -> FakeChunkStream:
+        chunk_stream = FakeChunkStream(self.tokens, self.token_delay)
+        self.chunk_streams.append(chunk_stream)
+        return chunk_stream
+
+
+class FailingSpeechService:
+    async def synthesize_stream(self, _text: str, *, voice: str, **_kwargs: object) -> AsyncGenerator[bytes]:
+        raise ValueError(f"Voice '{voice}' is not supported")
+        yield b""
+
+
+class SlowSpeechService:
+    def __init__(self, chunks_per_sentence: int = 5) -> None:
+        self.chunks_per_sentence = chunks_per_sentence
+        self.cancelled = False
+
+    async def synthesize_stream(self, _text: str, **_kwargs: object) -> AsyncGenerator[bytes]:
+        try:
+            for _ in range(self.chunks_per_sentence):
+                yield b"\x00\x00" * 240
+                await asyncio.sleep(TOKEN_DELAY_SECONDS)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+# NOTE: more tokens (and audio) than can be generated before the response gets cancelled
+LONG_ANSWER_TOKENS = ["Hello there, how are you doing today? ", *(["word "] * 1000)]
+
+
+async def wait_for_audio_delta(pubsub: EventPubSub) -> ResponseAudioDeltaEvent:
+    subscription = pubsub.subscribe("response.audio.delta", maxsize=0)
+    try:
+        event = await asyncio.wait_for(subscription.get(), timeout=1)
+        assert isinstance(event, ResponseAudioDeltaEvent)
+        return event
+    finally:
+        pubsub.unsubscribe(subscription)
+
+
+def create_session_context(completion_client: FakeCompletions, speech_service: SlowSpeechService) -> SessionContext:
+    return SessionContext(
+        transcription_service=None,  # pyright: ignore[reportArgumentType]
+        completion_client=completion_client,  # pyright: ignore[reportArgumentType]
+        speech_service=speech_service,  # pyright: ignore[reportArgumentType]
+        session=create_session_object_configuration("model"),
+        realtime_config=RealtimeConfig(event_history_size=-1),
+    )
+
+
+def response_done_events(pubsub: EventPubSub) -> list[ResponseDoneEvent]:
+    return [event for event in pubsub.events if isinstance(event, ResponseDoneEvent)]
+
+
+@pytest.mark.asyncio
+async def test_speech_service_error_is_reported() -> None:
+    pubsub = EventPubSub(history_size=-1)
+    session = create_session_object_configuration("model")
+    response = ResponseHandler(
+        completion_client=FakeCompletions(["Hello there, how are you doing today?"]),  # pyright: ignore[reportArgumentType]
+        speech_service=FailingSpeechService(),  # pyright: ignore[reportArgumentType]
+        model="llm",
+        speech_model="tts-model",
+        configuration=Response.from_session(session),
+        conversation=Conversation(pubsub),
+        pubsub=pubsub,
+    )
+
+    with pytest.raises(ValueError, match="is not supported"):
+        await response.generate_response()
+
+    error_events = [event for event in pubsub.events if isinstance(event, ErrorEvent)]
+    assert len(error_events) == 1
+    assert error_events[0].error.message == f"ValueError: Voice '{session.voice}' is not supported"
+    response_done_event = pubsub.events[-1]
+    assert isinstance(response_done_event, ResponseDoneEvent)
+    assert response_done_event.response.status == "failed"
+
+
+@pytest.mark.asyncio
+async def test_cancel_during_streaming() -> None:
+    completion_client = FakeCompletions(LONG_ANSWER_TOKENS, token_delay=TOKEN_DELAY_SECONDS)
+    speech_service = SlowSpeechService(chunks_per_sentence=1000)
+    ctx = create_session_context(completion_client, speech_service)
+    create_task = asyncio.create_task(handle_response_create_event(ctx, ResponseCreateEvent(type="response.create")))
+    await wait_for_audio_delta(ctx.pubsub)
+    response = ctx.response
+    assert response is not None
+
+    handle_response_cancel_event(ctx, ResponseCancelEvent(type="response.cancel", response_id=response.id))
+    await asyncio.wait_for(create_task, timeout=1)
+
+    # the upstream chat completion stream is closed and the speech synthesis is stopped
+    assert completion_client.chunk_streams[0].closed
+    assert speech_service.cancelled
+    (response_done_event,) = response_done_events(ctx.pubsub)
+    assert response_done_event.response.status == "cancelled"
+    assert response_done_event.response.status_details is not None
+    assert response_done_event.response.status_details.reason == "client_cancelled"
+    assert ctx.response is None
+    # nothing is published for the response once it's done
+    assert ctx.pubsub.events[-1] is response_done_event
+
+
+def test_cancel_without_active_response() -> None:
+    ctx = create_session_context(FakeCompletions([]), SlowSpeechService())
+    event = ResponseCancelEvent(type="response.cancel")
+
+    handle_response_cancel_event(ctx, event)
+
+    (error_event,) = ctx.pubsub.events
+    assert isinstance(error_event, ErrorEvent)
+    assert error_event.error.event_id == event.event_id
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("interrupt_response", [True, False])
+async def test_speech_started_interrupts_response(interrupt_response: bool) -> None:
+    tokens = ["Hello there, how are you doing today? ", *(["word "] * 20)]
+    ctx = create_session_context(FakeCompletions(tokens, token_delay=TOKEN_DELAY_SECONDS), SlowSpeechService())
+    assert ctx.session.turn_detection is not None
+    ctx.session.turn_detection.interrupt_response = interrupt_response
+    create_task = asyncio.create_task(handle_response_create_event(ctx, ResponseCreateEvent(type="response.create")))
+    await asyncio.sleep(5 * TOKEN_DELAY_SECONDS)
+    assert ctx.response is not None
+
+    handle_input_audio_buffer_speech_started(
+        ctx, InputAudioBufferSpeechStartedEvent(audio_start_ms=0, item_id="item_1")
+    )
+    await asyncio.wait_for(create_task, timeout=1)
+
+    (response_done_event,) = response_done_events(ctx.pubsub)
+    if interrupt_response:
+        assert response_done_event.response.status == "cancelled"
+        assert response_done_event.response.status_details is not None
+        assert response_done_event.response.status_details.reason == "turn_detected"
+    else:
+        assert response_done_event.response.status == "completed"
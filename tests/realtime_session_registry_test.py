@@ -0,0 +1,112 @@
+import time
+from unittest.mock import AsyncMock, Mock
+
+import numpy as np
+import pytest
+
+from speaches.config import RealtimeConfig
+from speaches.realtime.context import SessionContext
+from speaches.realtime.input_audio_buffer import InputAudioBuffer
+from speaches.realtime.input_audio_buffer_event_router import handle_input_audio_buffer_committed
+from speaches.realtime.session import create_session_object_configuration
+from speaches.realtime.session_registry import (
+    SessionRegistry,
+    Transport,
+    release_input_audio_buffer,
+    session_memory_usage,
+)
+from speaches.types.realtime import ErrorEvent, InputAudioBufferAppendEvent, InputAudioBufferCommittedEvent
+
+
+def create_session_context(realtime_config: RealtimeConfig, transport: Transport = "websocket") -> SessionContext:
+    return SessionContext(
+        transcription_service=Mock(),
+        completion_client=Mock(),
+        speech_service=Mock(),
+        session=create_session_object_configuration("model"),
+        realtime_config=realtime_config,
+        transport=transport,
+    )
+
+
+def add_input_audio_buffer(ctx: SessionContext, samples: int) -> InputAudioBuffer:
+    input_audio_buffer = InputAudioBuffer(ctx.pubsub)
+    input_audio_buffer.append(np.zeros(samples, dtype=np.float32))
+    ctx.input_audio_buffers[input_audio_buffer.id] = input_audio_buffer
+    return input_audio_buffer
+
+
+def test_release_input_audio_buffer() -> None:
+    ctx = create_session_context(RealtimeConfig(retained_input_audio_buffers=1))
+    first_buffer = add_input_audio_buffer(ctx, 16000)
+    second_buffer = add_input_audio_buffer(ctx, 16000)
+    current_buffer = add_input_audio_buffer(ctx, 0)
+
+    release_input_audio_buffer(ctx, first_buffer.id)
+    assert first_buffer.id in ctx.input_audio_buffers
+    release_input_audio_buffer(ctx, second_buffer.id)
+    assert first_buffer.id not in ctx.input_audio_buffers
+    assert list(ctx.input_audio_buffers) == [next(iter(ctx.input_audio_buffers)), second_buffer.id, current_buffer.id]
+
+
+@pytest.mark.asyncio
+async def test_input_audio_buffer_is_released_when_transcription_fails() -> None:
+    ctx = create_session_context(RealtimeConfig())
+    ctx.transcription_service.transcribe = AsyncMock(side_effect=RuntimeError("Transcription crashed"))
+    committed_buffer = add_input_audio_buffer(ctx, 16000)
+    add_input_audio_buffer(ctx, 0)
+
+    with pytest.raises(RuntimeError, match="Transcription crashed"):
+        await handle_input_audio_buffer_committed(
+            ctx, InputAudioBufferCommittedEvent(previous_item_id=None, item_id=committed_buffer.id)
+        )
+
+    assert committed_buffer.id not in ctx.input_audio_buffers
+
+
+@pytest.mark.asyncio
+async def test_reap_idle_session() -> None:
+    registry = SessionRegistry(RealtimeConfig(session_idle_timeout_seconds=60))
+    idle_ctx = create_session_context(registry.config)
+    active_ctx = create_session_context(registry.config, transport="webrtc")
+    idle_close, active_close = AsyncMock(), AsyncMock()
+    registry.register(idle_ctx, close=idle_close)
+    registry.register(active_ctx, close=active_close)
+    idle_ctx.last_activity_at = time.monotonic() - 120
+    error_subscription = idle_ctx.pubsub.subscribe("error")
+
+    await registry.reap()
+
+    idle_close.assert_awaited_once()
+    active_close.assert_not_awaited()
+    error_event = error_subscription.get_nowait()
+    assert isinstance(error_event, ErrorEvent)
+    assert error_event.error.code == "session_idle_timeout"
+    # the session is closed only once, even if the transport hasn't unregistered it yet
+    await registry.reap()
+    idle_close.assert_awaited_once()
+
+    registry.unregister(idle_ctx.session.id)
+    registry.unregister(active_ctx.session.id)
+
+
+@pytest.mark.asyncio
+async def test_memory_limit_frees_event_history_before_closing() -> None:
+    registry = SessionRegistry(
+        RealtimeConfig(event_history_size=-1, max_session_memory_bytes=100_000, session_idle_timeout_seconds=None)
+    )
+    ctx = create_session_context(registry.config)
+    close = AsyncMock()
+    registry.register(ctx, close=close)
+    ctx.pubsub.publish_nowait(InputAudioBufferAppendEvent(audio="A" * 200_000))
+    assert session_memory_usage(ctx).event_history >= 200_000
+
+    await registry.reap()
+    close.assert_not_awaited()
+    assert session_memory_usage(ctx).total == 0
+
+    add_input_audio_buffer(ctx, 100_000)
+    await registry.reap()
+    close.assert_awaited_once()
+
+    registry.unregister(ctx.session.id)
@@ -0,0 +1,70 @@
+from speaches.realtime.pubsub import EventPubSub
+from speaches.realtime.turn_timings import TurnTracker, stage_latency_histogram
+from speaches.types.realtime import TurnTimingsEvent
+
+
+def turn_timings_events(pubsub: EventPubSub) -> list[TurnTimingsEvent]:
+    return [event for event in pubsub.events if isinstance(event, TurnTimingsEvent)]
+
+
+def recorded_count(stage: str) -> int:
+    values = stage_latency_histogram.snapshot()["values"]
+    return values[f"stage={stage}"]["count"] if f"stage={stage}" in values else 0
+
+
+def test_turn_is_reported_once_audio_is_sent() -> None:
+    pubsub = EventPubSub(history_size=-1)
+    tracker = TurnTracker(pubsub, emit_event=True)
+    speech_stopped_count = recorded_count("speech_stopped")
+
+    tracker.mark_item("speech_stopped", "item_1")
+    tracker.mark_item("committed", "item_1")
+    tracker.attach_response("resp_1", "item_1")
+    tracker.mark_response("llm_first_token", "resp_1")
+    tracker.mark_response("tts_first_audio", "resp_1")
+    tracker.response_done("resp_1", completed=True)
+    # the audio of the response hasn't been sent yet
+    assert turn_timings_events(pubsub) == []
+
+    tracker.mark_response("first_audio_sent", "resp_1")
+    (event,) = turn_timings_events(pubsub)
+    assert event.item_id == "item_1"
+    assert event.response_id == "resp_1"
+    assert list(event.timings_ms) == [
+        "speech_stopped",
+        "committed",
+        "llm_first_token",
+        "tts_first_audio",
+        "response_done",
+        "first_audio_sent",
+    ]
+    assert list(event.timings_ms.values()) == sorted(event.timings_ms.values())
+    assert recorded_count("speech_stopped") == speech_stopped_count + 1
+
+
+def test_stages_of_other_turns_are_ignored() -> None:
+    pubsub = EventPubSub(history_size=-1)
+    tracker = TurnTracker(pubsub, emit_event=True)
+
+    tracker.mark_item("speech_stopped", "item_1")
+    tracker.attach_response("resp_1")
+    tracker.mark_item("speech_stopped", "item_2")
+    tracker.mark_response("llm_first_token", "resp_1")
+    tracker.response_done("resp_1", completed=True)
+    assert tracker.turn is not None
+    assert tracker.turn.item_id == "item_2"
+    assert list(tracker.turn.timings_ms) == ["speech_stopped"]
+    assert turn_timings_events(pubsub) == []
+
+
+def test_event_is_optional() -> None:
+    pubsub = EventPubSub(history_size=-1)
+    tracker = TurnTracker(pubsub, emit_event=False)
+
+    tracker.mark_item("committed", "item_1")
+    tracker.attach_response("resp_1")
+    tracker.response_done("resp_1", completed=False)
+
+    assert tracker.turn is not None
+    assert tracker.turn.reported
+    assert turn_timings_events(pubsub) == []
@@ -0,0 +1,118 @@
+from collections.abc import AsyncGenerator
+from contextlib import AbstractContextManager, nullcontext
+
+from fastapi import FastAPI, WebSocketDisconnect, status
+from fastapi.testclient import TestClient
+import pytest
+
+from speaches.dependencies import get_config, get_speech_service
+from speaches.routers.speech import router as speech_router
+from tests.conftest import DEFAULT_CONFIG
+
+UNSUPPORTED_VOICE = "unsupported"
+BROKEN_VOICE = "broken"
+
+
+class FakeSpeechService:
+    def __init__(self) -> None:
+        self.synthesized_texts: list[str] = []
+        self.loaded_models: list[str] = []
+
+    def keep_model_loaded(self, model: str) -> AbstractContextManager[object]:
+        self.loaded_models.append(model)
+        return nullcontext()
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        *,
+        model: str,  # noqa: ARG002
+        voice: str,
+        speed: float = 1.0,  # noqa: ARG002
+        sample_rate: int | None = None,  # noqa: ARG002
+        early_first_chunk: bool = False,  # noqa: ARG002
+    ) -> AsyncGenerator[bytes]:
+        if voice == UNSUPPORTED_VOICE:
+            raise ValueError(f"Voice '{voice}' is not supported")
+        if voice == BROKEN_VOICE:
+            raise RuntimeError(f"Voice '{voice}' crashed the speech model")
+        self.synthesized_texts.append(text)
+        yield b"\x00\x00" * len(text)
+
+
+@pytest.fixture
+def speech_service() -> FakeSpeechService:
+    return FakeSpeechService()
+
+
+@pytest.fixture
+def client(speech_service: FakeSpeechService) -> TestClient:
+    app = FastAPI()
+    app.include_router(speech_router)
+    app.dependency_overrides[get_config] = lambda: DEFAULT_CONFIG
+    app.dependency_overrides[get_speech_service] = lambda: speech_service
+    return TestClient(app)
+
+
+def test_speech_stream_flush(client: TestClient, speech_service: FakeSpeechService) -> None:
+    with client.websocket_connect("/v1/audio/speech/stream?model=tts-model&voice=af_heart") as ws:
+        for token in ["Hello", " there", ", how are", " you doing today?", " I'm fine"]:
+            ws.send_json({"type": "text", "text": token})
+        ws.send_json({"type": "flush"})
+        audio = b""
+        while (message := ws.receive()).get("bytes") is not None:
+            audio += message["bytes"]
+        assert message["text"] == '{"type":"audio.done"}'
+
+    assert speech_service.loaded_models == ["tts-model"]
+    assert speech_service.synthesized_texts == ["Hello there,", "how are you doing today? I'm fine"]
+    assert len(audio) == 2 * sum(len(text) for text in speech_service.synthesized_texts)
+
+
+def test_speech_stream_cancel(client: TestClient, speech_service: FakeSpeechService) -> None:
+    with client.websocket_connect("/v1/audio/speech/stream?model=tts-model&voice=af_heart") as ws:
+        ws.send_json({"type": "text", "text": "This text is discarded"})
+        ws.send_json({"type": "cancel"})
+        assert ws.receive_json() == {"type": "cancelled"}
+        ws.send_json({"type": "text", "text": "Hi."})
+        ws.send_json({"type": "flush"})
+        assert ws.receive_bytes() == b"\x00\x00" * 3
+        assert ws.receive_json() == {"type": "audio.done"}
+
+    assert speech_service.synthesized_texts == ["Hi."]
+
+
+def test_speech_stream_errors(client: TestClient) -> None:
+    with client.websocket_connect(f"/v1/audio/speech/stream?model=tts-model&voice={UNSUPPORTED_VOICE}") as ws:
+        ws.send_json({"type": "unknown"})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "text", "text": "Hello there, how are you doing today?"})
+        ws.send_json({"type": "flush"})
+        assert ws.receive_json() == {"type": "error", "message": "Voice 'unsupported' is not supported"}
+        assert ws.receive_json() == {"type": "audio.done"}
+
+
+def test_speech_stream_binary_message(client: TestClient, speech_service: FakeSpeechService) -> None:
+    with client.websocket_connect("/v1/audio/speech/stream?model=tts-model&voice=af_heart") as ws:
+        ws.send_bytes(b'{"type": "text", "text": "Hi."}')
+        assert ws.receive_json() == {"type": "error", "message": "Only text messages are accepted"}
+        # the connection is still usable
+        ws.send_json({"type": "text", "text": "Hi."})
+        ws.send_json({"type": "flush"})
+        assert ws.receive_bytes() == b"\x00\x00" * 3
+        assert ws.receive_json() == {"type": "audio.done"}
+
+    assert speech_service.synthesized_texts == ["Hi."]
+
+
+def test_speech_stream_unexpected_error(client: TestClient) -> None:
+    with client.websocket_connect(f"/v1/audio/speech/stream?model=tts-model&voice={BROKEN_VOICE}") as ws:
+        ws.send_json({"type": "text", "text": "Hello there, how are you doing today?"})
+        ws.send_json({"type": "flush"})
+        assert ws.receive_json() == {
+            "type": "error",
+            "message": "Speech synthesis failed: Voice 'broken' crashed the speech model",
+        }
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            ws.receive_json()
+        assert exc_info.value.code == status.WS_1011_INTERNAL_ERROR
@@ -3,7 +3,9 @@ import asyncio
 import pytest
 
 from speaches.text_utils import (
+    AdaptiveChunker,
     EOFTextChunker,
+    split_leading_fragment,
     srt_format_timestamp,
     strip_markdown_emphasis,
     vtt_format_timestamp,
@@ -121,3 +123,93 @@ async def test_eof_text_chunker_closed_error() -> None:
 
     with pytest.raises(RuntimeError):
         chunker.add_token("This should fail")
+
+
+async def collect_adaptive_chunks(text: str, chunker: AdaptiveChunker | None = None, token_size: int = 3) -> list[str]:
+    # Feed the text a few characters at a time, as an LLM would
+    chunker = chunker or AdaptiveChunker()
+    results = []
+
+    async def collect_chunks() -> None:
+        async for chunk in chunker:
+            results.append(chunk)  # noqa: PERF401
+
+    task = asyncio.create_task(collect_chunks())
+    for i in range(0, len(text), token_size):
+        chunker.add_token(text[i : i + token_size])
+        await asyncio.sleep(0)
+    chunker.close()
+    await task
+
+    assert "".join(results) == text
+    return results
+
+
+@pytest.mark.asyncio
+async def test_adaptive_chunker_short_first_chunk() -> None:
+    results = await collect_adaptive_chunks(
+        "Hello there, how are you doing today? I am doing great, thanks for asking. What about you?"
+    )
+
+    assert results == [
+        "Hello there,",
+        " how are you doing today? I am doing great, thanks for asking.",
+        " What about you?",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_adaptive_chunker_cjk() -> None:
+    results = await collect_adaptive_chunks("你好，我是你的语音助手。今天天气很好，我们可以出去散步。你觉得怎么样？")
+
+    assert results == ["你好，", "我是你的语音助手。今天天气很好，我们可以出去散步。", "你觉得怎么样？"]
+
+
+@pytest.mark.asyncio
+async def test_adaptive_chunker_abbreviations_and_numbers() -> None:
+    text = 'He said "Stop." Dr. Smith paid $3.14 for 1,000 apples at 12:30 with J. R. Tolkien, e.g. the red ones. Ok. Gen. Lee left on Jan. 5, 2020. Bye.'
+    results = await collect_adaptive_chunks(text, AdaptiveChunker(min_chunk_length=1, clause_chunk_min_length=1000))
+
+    assert results == [
+        'He said "Stop."',
+        " Dr. Smith paid $3.14 for 1,000 apples at 12:30 with J. R. Tolkien, e.g. the red ones.",
+        " Ok.",
+        " Gen. Lee left on Jan. 5, 2020.",
+        " Bye.",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_adaptive_chunker_max_chunk_length() -> None:
+    results = await collect_adaptive_chunks("word " * 30, AdaptiveChunker(max_chunk_length=50))
+
+    assert all(len(chunk) <= 50 for chunk in results)
+    assert all(chunk.endswith(" ") for chunk in results)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_chunker_closed_error() -> None:
+    chunker = AdaptiveChunker()
+    chunker.close()
+
+    with pytest.raises(RuntimeError):
+        chunker.add_token("This should fail")
+
+
+def test_split_leading_fragment() -> None:
+    # short text isn't split
+    assert split_leading_fragment("Hello there, how are you?") == ("Hello there, how are you?", "")
+    # split at the first clause boundary past the minimum length, including the closing quote
+    assert split_leading_fragment('He said "yes, indeed." and then talked for a very long time about it.') == (
+        'He said "yes,',
+        'indeed." and then talked for a very long time about it.',
+    )
+    # without a boundary, split at the last whitespace before the maximum length
+    fragment, rest = split_leading_fragment("word " * 20, max_length=24)
+    assert fragment == "word word word word"
+    assert fragment + " " + rest == "word " * 20
+    # CJK clause endings aren't followed by whitespace
+    assert split_leading_fragment("今天天气很好，我们一起去公园散步吧，然后吃饭。") == (
+        "今天天气很好，",
+        "我们一起去公园散步吧，然后吃饭。",
+    )
@@ -0,0 +1,67 @@
+from pathlib import Path
+import time
+
+import pytest
+
+from speaches import transcript_store
+from speaches.transcript_store import InMemoryTranscriptStore, SqliteTranscriptStore
+
+
+def test_in_memory_transcript_store() -> None:
+    store = InMemoryTranscriptStore(maxsize=2, ttl_seconds=60)
+    store.set("audio_1", "Hello")
+    store.set("audio_2", "World")
+    store.set("audio_3", "!")
+
+    assert store.get("audio_1") is None
+    assert store.get("audio_2") == "World"
+    assert store.get("audio_3") == "!"
+
+
+def test_sqlite_transcript_store_is_shared(tmp_path: Path) -> None:
+    path = tmp_path / "transcripts.sqlite3"
+    store = SqliteTranscriptStore(path, maxsize=10, ttl_seconds=60)
+    other_process_store = SqliteTranscriptStore(path, maxsize=10, ttl_seconds=60)
+
+    store.set("audio_1", "Hello")
+    assert other_process_store.get("audio_1") == "Hello"
+    assert other_process_store.get("audio_2") is None
+
+    store.close()
+    other_process_store.close()
+
+
+def test_sqlite_transcript_store_eviction(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(transcript_store, "SQLITE_EVICTION_INTERVAL", 1)
+    store = SqliteTranscriptStore(tmp_path / "transcripts.sqlite3", maxsize=2, ttl_seconds=60)
+    for i in range(3):
+        store.set(f"audio_{i}", f"transcript {i}")
+        time.sleep(0.001)  # so that the expiry times are ordered
+
+    assert store.get("audio_0") is None
+    assert store.get("audio_1") == "transcript 1"
+    assert store.get("audio_2") == "transcript 2"
+
+    store.ttl_seconds = -1
+    store.set("audio_3", "transcript 3")
+    assert store.get("audio_3") is None
+    (count,) = store._connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()  # noqa: SLF001
+    assert count == 2
+
+    store.close()
+
+
+def test_sqlite_transcript_store_size_eviction(tmp_path: Path) -> None:
+    maxsize = 10
+    store = SqliteTranscriptStore(tmp_path / "transcripts.sqlite3", maxsize=maxsize, ttl_seconds=60)
+    writes = 2 * transcript_store.SQLITE_EVICTION_INTERVAL + 5
+    for i in range(writes):
+        store.set(f"audio_{i}", f"transcript {i}")
+
+    # the last eviction kept the newest `maxsize` transcripts, the ones written after it haven't been evicted yet
+    (count,) = store._connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()  # noqa: SLF001
+    assert count == maxsize + 5
+    assert store.get("audio_0") is None
+    assert all(store.get(f"audio_{i}") == f"transcript {i}" for i in range(writes - maxsize - 5, writes))
+
+    store.close()
@@ -0,0 +1,65 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from speaches.utils import pipelined_stream
+
+
+async def async_iter[T](items: list[T]) -> AsyncGenerator[T]:
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_pipelined_stream_preserves_order_and_overlaps() -> None:
+    started: list[int] = []
+    running = 0
+    max_running = 0
+
+    async def create_stream(delay: int) -> AsyncGenerator[str]:
+        nonlocal running, max_running
+        started.append(delay)
+        running += 1
+        max_running = max(max_running, running)
+        for i in range(2):
+            await asyncio.sleep(delay / 1000)
+            yield f"{delay}-{i}"
+        running -= 1
+
+    values = [value async for value in pipelined_stream(async_iter([30, 10, 20]), create_stream, max_concurrency=2)]
+
+    assert values == ["30-0", "30-1", "10-0", "10-1", "20-0", "20-1"]
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_pipelined_stream_yields_before_stream_finishes() -> None:
+    finish = asyncio.Event()
+
+    async def create_stream(item: str) -> AsyncGenerator[str]:
+        yield item
+        await finish.wait()
+
+    stream = pipelined_stream(async_iter(["a"]), create_stream, max_concurrency=1)
+    assert await anext(stream) == "a"
+    finish.set()
+    assert [value async for value in stream] == []
+
+
+@pytest.mark.asyncio
+async def test_pipelined_stream_raises_in_order() -> None:
+    async def create_stream(item: int) -> AsyncGenerator[int]:
+        if item == 2:
+            raise ValueError(item)
+        yield item
+
+    values = []
+
+    async def collect_values() -> None:
+        async for value in pipelined_stream(async_iter([1, 2, 3]), create_stream, max_concurrency=3):
+            values.append(value)  # noqa: PERF401
+
+    with pytest.raises(ValueError, match="2"):
+        await collect_values()
+    assert values == [1]